@@ -1,3 +1,4 @@
+import pytest
 import vcr
 
 # Query params added for time-limited pilot features. VCR's
@@ -8,3 +9,16 @@ vcr.default_vcr.filter_query_parameters = (
     *vcr.default_vcr.filter_query_parameters,
     "include_2026_pilots",
 )
+
+
+@pytest.fixture(autouse=True)
+def reset_devs_dc_breaker():
+    """
+    Stops upstream errors mocked in one test opening the DevsDC circuit
+    breaker for the tests after it
+    """
+    from elections.devs_dc_client import DEVS_DC_BREAKER
+
+    DEVS_DC_BREAKER.reset()
+    yield
+    DEVS_DC_BREAKER.reset()
@@ -116,3 +116,12 @@ ORG_ID_TO_MAYOR_NAME = {
     "WMCA": "Mayor of West Midlands Combined Authority",
     "YNYC": "Mayor of York and North Yorkshire Combined Authority",
 }
+
+
+ADMINISTRATIONS_JSON_BUCKET = "ee.public.data"
+ADMINISTRATIONS_JSON_PREFIX = "layers-of-state/administrations_json/"
+ADMINISTRATIONS_JSON_URL = (
+    "https://s3.eu-west-2.amazonaws.com/"
+    f"{ADMINISTRATIONS_JSON_BUCKET}/{ADMINISTRATIONS_JSON_PREFIX}"
+    "{admin_id}.json"
+)
@@ -1,18 +1,23 @@
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from functools import cached_property
 from typing import List, Optional
 from urllib.parse import urljoin
 
-import requests
 from administrations.constants import (
+    ADMINISTRATIONS_JSON_URL,
     ORG_ID_TO_MAYOR_NAME,
     POST_TYPE_TO_NAME,
     WEIGHT_MAP,
     PostTypes,
 )
-from core.utils import LastWord
+from administrations.store import (
+    cache_administration_data,
+    get_administrations_data,
+)
+from core.upstream import upstream_client
 from django.conf import settings
-from django.db.models.functions import Coalesce
 from django.template.loader import select_template
 from elections.models import PostElection
 
@@ -31,17 +36,24 @@ def get_weight(id_str, weight_map):
 
 
 class Administration:
-    def __init__(self, admin_id: str):
+    def __init__(self, admin_id: str, data: Optional[dict] = None):
         self.admin_id = admin_id
-        data = self.load_json(admin_id)
+        if data is None:
+            data = self.load_json(admin_id)
         self.data = data
         self.post_type = PostTypes.from_administration_data(data)
 
     def load_json(self, administration_id):
-        req = requests.get(
-            f"https://s3.eu-west-2.amazonaws.com/ee.public.data/layers-of-state/administrations_json/{self.admin_id}.json"
+        """
+        Fetches the JSON from S3. Only used for administrations that
+        haven't been imported locally yet.
+        """
+        req = upstream_client.get(
+            ADMINISTRATIONS_JSON_URL.format(admin_id=self.admin_id)
         )
-        return req.json()
+        data = req.json()
+        cache_administration_data(self.admin_id, data)
+        return data
 
     @property
     def administration_type(self):
@@ -162,13 +174,7 @@ class Administration:
         qs = self.ballot_obj.personpost_set.filter(elected=True).select_related(
             "party", "person"
         )
-        return (
-            qs.annotate(last_name=LastWord("person__name"))
-            .annotate(
-                name_for_ordering=Coalesce("person__sort_name", "last_name")
-            )
-            .order_by("name_for_ordering", "person__name")
-        )
+        return qs.order_by("person__name_for_ordering", "person__name")
 
     @cached_property
     def weight(self):
@@ -186,6 +192,13 @@ class Administration:
         return weight + weight_modifier
 
 
+# Used to fetch the JSON for each administration at the same time
+ADMINISTRATIONS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.UPSTREAM_POOL_MAXSIZE,
+    thread_name_prefix="administrations",
+)
+
+
 def sort_address(address_dict):
     address = address_dict["address"]
     match = re.match(r"(\d+)", address)
@@ -198,7 +211,23 @@ def sort_address(address_dict):
 
 
 class AdministrationsHelper:
-    def __init__(self, postcode: str, uprn: Optional[str] = None):
+    IGNORE_IDS = [
+        "O::LIV::mayor",
+        "O::TOB::mayor",
+        "O::BST::mayor",
+    ]
+
+    def __init__(
+        self,
+        postcode: str,
+        uprn: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        If `timeout` is given, a `TimeoutError` is raised when the
+        administrations can't all be loaded in that many seconds
+        """
+        deadline = time.monotonic() + timeout if timeout else None
         self.postcode = postcode
         self.address_picker = False
         self.addresses = []
@@ -211,21 +240,46 @@ class AdministrationsHelper:
             )
             return
         self.administration_ids = self.api_response["admin_ids"]
-        self.administrations: List[Administration] = []
-        IGNORE_IDS = [
-            "O::LIV::mayor",
-            "O::TOB::mayor",
-            "O::BST::mayor",
-        ]
-        for admin_id in self.administration_ids:
-            if admin_id in IGNORE_IDS:
-                continue
-            self.administrations.append(Administration(admin_id))
+        self.administrations: List[Administration] = self.load_administrations(
+            [
+                admin_id
+                for admin_id in self.administration_ids
+                if admin_id not in self.IGNORE_IDS
+            ],
+            deadline=deadline,
+        )
 
         self.administrations = sorted(
             self.administrations, key=lambda admin: admin.weight
         )
 
+    def load_administrations(self, admin_ids, deadline=None):
+        """
+        Builds an Administration for each ID. Most will have a local copy of
+        their JSON, the rest are fetched from S3 concurrently.
+        """
+        stored = get_administrations_data(admin_ids)
+        futures = [
+            ADMINISTRATIONS_EXECUTOR.submit(Administration, admin_id)
+            for admin_id in admin_ids
+            if admin_id not in stored
+        ]
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise TimeoutError(
+                f"Fetched {len(futures) - len(not_done)} of {len(futures)} "
+                f"administrations for {self.postcode} before the deadline"
+            )
+        return [
+            Administration(admin_id, data=data)
+            for admin_id, data in stored.items()
+        ] + [future.result() for future in futures]
+
     def get_api_response(self, postcode, uprn=None):
         params = {"auth_token": settings.DEVS_DC_API_KEY}
 
@@ -239,6 +293,6 @@ class AdministrationsHelper:
                 f"/api/v1/layers_of_state/postcode/{postcode}/{uprn}/",
             )
 
-        req = requests.get(url, params=params)
+        req = upstream_client.get(url, params=params)
         req.raise_for_status()
         return req.json()
@@ -0,0 +1,106 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from administrations.constants import (
+    ADMINISTRATIONS_JSON_BUCKET,
+    ADMINISTRATIONS_JSON_PREFIX,
+    ADMINISTRATIONS_JSON_URL,
+)
+from administrations.models import AdministrationData
+from botocore import UNSIGNED
+from botocore.config import Config
+from core.upstream import upstream_client
+from django.conf import settings
+
+
+class AdministrationsImporter:
+    """
+    Copies the administrations JSON published to S3 in to
+    AdministrationData. Files are only downloaded if their ETag has changed
+    since the last import.
+    """
+
+    BATCH_SIZE = 500
+
+    def __init__(self, stdout=sys.stdout, s3_client=None):
+        self.stdout = stdout
+        if not s3_client:
+            # The bucket is public, so there's no need to sign requests
+            s3_client = boto3.client(
+                "s3",
+                region_name="eu-west-2",
+                config=Config(signature_version=UNSIGNED),
+            )
+        self.s3_client = s3_client
+
+    def list_files(self):
+        """
+        Returns a dict of admin ID to ETag for every file in the dataset
+        """
+        files = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=ADMINISTRATIONS_JSON_BUCKET,
+            Prefix=ADMINISTRATIONS_JSON_PREFIX,
+        )
+        for page in pages:
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if not key.endswith(".json"):
+                    continue
+                admin_id = key[len(ADMINISTRATIONS_JSON_PREFIX) : -len(".json")]
+                files[admin_id] = obj["ETag"].strip('"')
+        return files
+
+    def fetch(self, admin_id):
+        req = upstream_client.get(
+            ADMINISTRATIONS_JSON_URL.format(admin_id=admin_id)
+        )
+        req.raise_for_status()
+        return req.json()
+
+    def save(self, admin_ids, files):
+        with ThreadPoolExecutor(
+            max_workers=settings.UPSTREAM_POOL_MAXSIZE
+        ) as executor:
+            data = executor.map(self.fetch, admin_ids)
+            objects = [
+                AdministrationData(
+                    admin_id=admin_id, data=json, etag=files[admin_id]
+                )
+                for admin_id, json in zip(admin_ids, data)
+            ]
+        AdministrationData.objects.bulk_create(
+            objects,
+            update_conflicts=True,
+            unique_fields=["admin_id"],
+            update_fields=["data", "etag", "modified"],
+        )
+
+    def import_objects(self):
+        files = self.list_files()
+        if not files:
+            # Don't delete everything we have if S3 had nothing to say
+            self.stdout.write("No administrations found, not importing\n")
+            return
+
+        existing = dict(
+            AdministrationData.objects.values_list("admin_id", "etag")
+        )
+        changed = [
+            admin_id
+            for admin_id, etag in files.items()
+            if existing.get(admin_id) != etag
+        ]
+        for start in range(0, len(changed), self.BATCH_SIZE):
+            self.save(changed[start : start + self.BATCH_SIZE], files)
+
+        deleted, _ = AdministrationData.objects.exclude(
+            admin_id__in=files.keys()
+        ).delete()
+
+        self.stdout.write(
+            f"{len(files)} administrations: updated {len(changed)}, "
+            f"deleted {deleted}\n"
+        )
@@ -0,0 +1,10 @@
+from administrations.importers import AdministrationsImporter
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Copy the layers of state administrations JSON from S3"
+
+    def handle(self, **options):
+        importer = AdministrationsImporter(stdout=self.stdout)
+        importer.import_objects()
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.15 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="AdministrationData",
+            fields=[
+                (
+                    "admin_id",
+                    models.CharField(
+                        max_length=255, primary_key=True, serialize=False
+                    ),
+                ),
+                ("data", models.JSONField()),
+                (
+                    "etag",
+                    models.CharField(
+                        blank=True,
+                        help_text="The S3 ETag of the file this was imported from",
+                        max_length=255,
+                    ),
+                ),
+                ("modified", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
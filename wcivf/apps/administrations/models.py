@@ -1 +1,20 @@
-# Create your models here.
+from django.db import models
+
+
+class AdministrationData(models.Model):
+    """
+    A local copy of the JSON published for each administration in the
+    layers of state dataset, kept up to date by `import_administrations`
+    """
+
+    admin_id = models.CharField(max_length=255, primary_key=True)
+    data = models.JSONField()
+    etag = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="The S3 ETag of the file this was imported from",
+    )
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.admin_id
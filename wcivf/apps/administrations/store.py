@@ -0,0 +1,83 @@
+"""
+Looks up the JSON for administrations from the local copy made by the
+`import_administrations` command, via a small in-process LRU cache.
+
+There are only a few thousand administrations and they rarely change, so
+most lookups are answered without touching the database or S3. Entries
+expire after `MAX_AGE` seconds so changes made by an import are picked up.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from administrations.models import AdministrationData
+
+
+class ExpiringLRUCache:
+    def __init__(self, maxsize, max_age):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.max_age)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+MAXSIZE = 5000
+MAX_AGE = 60 * 60
+
+ADMINISTRATIONS_CACHE = ExpiringLRUCache(maxsize=MAXSIZE, max_age=MAX_AGE)
+
+
+def get_administrations_data(admin_ids):
+    """
+    Returns a dict of admin ID to JSON for every ID we have a copy of. IDs
+    that aren't in the cache are looked up in the database in one query.
+    """
+    found = {}
+    missing = []
+    for admin_id in admin_ids:
+        data = ADMINISTRATIONS_CACHE.get(admin_id)
+        if data is None:
+            missing.append(admin_id)
+        else:
+            found[admin_id] = data
+
+    if missing:
+        stored = AdministrationData.objects.filter(
+            admin_id__in=missing
+        ).values_list("admin_id", "data")
+        for admin_id, data in stored:
+            ADMINISTRATIONS_CACHE.set(admin_id, data)
+            found[admin_id] = data
+    return found
+
+
+def cache_administration_data(admin_id, data):
+    """
+    Remembers JSON fetched from S3 for an administration we don't have a
+    local copy of yet
+    """
+    ADMINISTRATIONS_CACHE.set(admin_id, data)
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+from administrations.helpers import AdministrationsHelper
+from administrations.models import AdministrationData
+from administrations.store import ADMINISTRATIONS_CACHE
+
+
+@pytest.mark.django_db
+class TestAdministrationsHelper:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        ADMINISTRATIONS_CACHE.clear()
+        yield
+        ADMINISTRATIONS_CACHE.clear()
+
+    @pytest.fixture
+    def api_response(self, mocker):
+        return mocker.patch.object(
+            AdministrationsHelper,
+            "get_api_response",
+            return_value={
+                "address_picker": False,
+                "admin_ids": [
+                    "O::MAN::mayor",
+                    "O::LIV::mayor",
+                    "D::E05000001::local",
+                ],
+            },
+        )
+
+    def test_administrations_loaded(self, api_response, mocker):
+        administration = mocker.patch("administrations.helpers.Administration")
+        administration.return_value.weight = 1
+
+        helper = AdministrationsHelper("SW1A1AA")
+
+        assert administration.call_count == 2
+        called_ids = {call.args[0] for call in administration.call_args_list}
+        assert called_ids == {"O::MAN::mayor", "D::E05000001::local"}
+        assert len(helper.administrations) == 2
+
+    def test_stored_administrations_not_fetched(self, api_response, mocker):
+        AdministrationData.objects.create(
+            admin_id="O::MAN::mayor", data={"stored": True}
+        )
+        administration = mocker.patch("administrations.helpers.Administration")
+        administration.return_value.weight = 1
+
+        AdministrationsHelper("SW1A1AA")
+
+        administration.assert_has_calls(
+            [
+                mocker.call("O::MAN::mayor", data={"stored": True}),
+                mocker.call("D::E05000001::local"),
+            ],
+            any_order=True,
+        )
+        assert administration.call_count == 2
+
+    def test_administrations_loaded_concurrently(self, api_response, mocker):
+        barrier = threading.Barrier(2, timeout=1)
+
+        def load(admin_id):
+            # Only passes if both administrations are loading at once
+            barrier.wait()
+            return mocker.Mock(weight=1)
+
+        mocker.patch("administrations.helpers.Administration", side_effect=load)
+
+        helper = AdministrationsHelper("SW1A1AA", timeout=2)
+        assert len(helper.administrations) == 2
+
+    def test_timeout(self, api_response, mocker):
+        finish = threading.Event()
+        mocker.patch(
+            "administrations.helpers.Administration",
+            side_effect=lambda admin_id: finish.wait(1),
+        )
+
+        with pytest.raises(TimeoutError):
+            AdministrationsHelper("SW1A1AA", timeout=0.01)
+        finish.set()
@@ -0,0 +1,56 @@
+import pytest
+from administrations.models import AdministrationData
+from administrations.store import (
+    ADMINISTRATIONS_CACHE,
+    ExpiringLRUCache,
+    cache_administration_data,
+    get_administrations_data,
+)
+
+
+class TestExpiringLRUCache:
+    def test_least_recently_used_evicted(self):
+        cache = ExpiringLRUCache(maxsize=2, max_age=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self, freezer):
+        cache = ExpiringLRUCache(maxsize=2, max_age=60)
+        cache.set("a", 1)
+        freezer.tick(61)
+        assert cache.get("a") is None
+
+
+@pytest.mark.django_db
+class TestGetAdministrationsData:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        ADMINISTRATIONS_CACHE.clear()
+        yield
+        ADMINISTRATIONS_CACHE.clear()
+
+    def test_missing_ids_looked_up_once(self, django_assert_num_queries):
+        AdministrationData.objects.create(admin_id="O::MAN::mayor", data={})
+        AdministrationData.objects.create(admin_id="O::BIR::local", data={})
+
+        with django_assert_num_queries(1):
+            data = get_administrations_data(
+                ["O::MAN::mayor", "O::BIR::local", "O::FOO::local"]
+            )
+        assert data == {"O::MAN::mayor": {}, "O::BIR::local": {}}
+
+        with django_assert_num_queries(0):
+            data = get_administrations_data(["O::MAN::mayor"])
+        assert data == {"O::MAN::mayor": {}}
+
+    def test_fetched_data_cached(self, django_assert_num_queries):
+        cache_administration_data("O::MAN::mayor", {"fetched": True})
+        with django_assert_num_queries(0):
+            data = get_administrations_data(["O::MAN::mayor"])
+        assert data == {"O::MAN::mayor": {"fetched": True}}
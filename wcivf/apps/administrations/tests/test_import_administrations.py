@@ -0,0 +1,82 @@
+from io import StringIO
+
+import pytest
+from administrations.importers import AdministrationsImporter
+from administrations.models import AdministrationData
+
+
+@pytest.mark.django_db
+class TestAdministrationsImporter:
+    @pytest.fixture
+    def s3_client(self, mocker):
+        client = mocker.Mock()
+        client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Contents": [
+                    {
+                        "Key": "layers-of-state/administrations_json/O::MAN::mayor.json",
+                        "ETag": '"new"',
+                    },
+                    {
+                        "Key": "layers-of-state/administrations_json/O::BIR::local.json",
+                        "ETag": '"same"',
+                    },
+                    {
+                        "Key": "layers-of-state/administrations_json/",
+                        "ETag": '"dir"',
+                    },
+                ]
+            }
+        ]
+        return client
+
+    @pytest.fixture
+    def importer(self, s3_client, mocker):
+        importer = AdministrationsImporter(
+            stdout=StringIO(), s3_client=s3_client
+        )
+        mocker.patch.object(
+            importer,
+            "fetch",
+            side_effect=lambda admin_id: {"admin_id": admin_id},
+        )
+        return importer
+
+    def test_list_files(self, importer):
+        assert importer.list_files() == {
+            "O::MAN::mayor": "new",
+            "O::BIR::local": "same",
+        }
+
+    def test_import_only_fetches_changed_files(self, importer):
+        AdministrationData.objects.create(
+            admin_id="O::MAN::mayor", data={"old": True}, etag="old"
+        )
+        AdministrationData.objects.create(
+            admin_id="O::BIR::local", data={"old": True}, etag="same"
+        )
+        AdministrationData.objects.create(
+            admin_id="O::GONE::local", data={}, etag="gone"
+        )
+
+        importer.import_objects()
+
+        importer.fetch.assert_called_once_with("O::MAN::mayor")
+        assert dict(
+            AdministrationData.objects.values_list("admin_id", "data")
+        ) == {
+            "O::MAN::mayor": {"admin_id": "O::MAN::mayor"},
+            "O::BIR::local": {"old": True},
+        }
+        assert (
+            AdministrationData.objects.get(admin_id="O::MAN::mayor").etag
+            == "new"
+        )
+
+    def test_empty_listing_deletes_nothing(self, importer, s3_client):
+        s3_client.get_paginator.return_value.paginate.return_value = [{}]
+        AdministrationData.objects.create(admin_id="O::MAN::mayor", data={})
+
+        importer.import_objects()
+
+        assert AdministrationData.objects.count() == 1
@@ -2,6 +2,7 @@ from elections.models import VotingSystem
 from leaflets.api.serializers import LeafletSerializer
 from parties.models import Party
 from people.models import Person, PersonPost
+from people.snapshots import CandidacySnapshot
 from rest_framework import serializers
 
 
@@ -81,8 +82,8 @@ class PersonPostSerializer(serializers.HyperlinkedModelSerializer):
             return obj.list_position
         return None
 
-    def get_previous_party_affiliations(self, obj: PersonPost):
-        parties = obj.previous_party_affiliations.all()
+    def get_previous_party_affiliations(self, obj: CandidacySnapshot):
+        parties = obj.previous_party_affiliations
         if parties:
             return PartySerializer(parties, many=True, read_only=True).data
         return None
@@ -66,7 +66,7 @@ class BaseCandidatesAndElectionsViewSet(
 
         for postelection in postelections:
             candidates = []
-            personposts = self.people_for_ballot(postelection, compact=True)
+            personposts = self.people_for_ballot(postelection)
             for personpost in personposts:
                 candidates.append(
                     serializers.PersonPostSerializer(
@@ -0,0 +1,230 @@
+"""
+Cache headers and purging for the CDN in front of the site.
+
+Ballot, election, person and postcode pages are tagged with a
+`Surrogate-Key` header listing the objects they show, and a `Cache-Control`
+header that lets the CDN keep them for `CDN_CACHE_TTL` seconds.
+
+When an importer changes something it adds the keys for it to a queue with
+`queue_purge`, and `flush_cdn_purge_queue` sends them to the purger named by
+the `CDN_PURGER` setting.
+"""
+
+import uuid
+
+import boto3
+from core.models import QueuedPurge
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+BALLOT = "ballot"
+ELECTION = "election"
+PERSON = "person"
+POSTCODE = "postcode"
+
+
+def ballot_key(ballot_paper_id):
+    return f"{BALLOT}:{ballot_paper_id}"
+
+
+def election_key(slug):
+    return f"{ELECTION}:{slug}"
+
+
+def person_key(ynr_id):
+    return f"{PERSON}:{ynr_id}"
+
+
+def postcode_key(postcode):
+    return f"{POSTCODE}:{postcode.replace(' ', '').upper()}"
+
+
+def queue_purge(keys):
+    """
+    Adds keys to the purge queue. Keys that are already queued have their
+    `queued_at` time moved on, so a flush that's already running doesn't
+    remove them before the change that queued them again is purged.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    queued_at = timezone.now()
+    QueuedPurge.objects.bulk_create(
+        [QueuedPurge(key=key, queued_at=queued_at) for key in sorted(keys)],
+        update_conflicts=True,
+        unique_fields=["key"],
+        update_fields=["queued_at"],
+        batch_size=1000,
+    )
+
+
+def get_purger():
+    return import_string(settings.CDN_PURGER)()
+
+
+def flush_purge_queue(purger=None, batch_size=500):
+    """
+    Sends everything in the purge queue to `purger`, `batch_size` keys at a
+    time, and returns the number of keys flushed. If there are more keys
+    than the purger can handle it purges everything instead.
+    """
+    purger = purger or get_purger()
+    started = timezone.now()
+    queued = QueuedPurge.objects.filter(queued_at__lte=started)
+
+    if purger.max_keys is not None and queued.count() > purger.max_keys:
+        purger.purge_all()
+        count, _ = queued.delete()
+        return count
+
+    flushed = 0
+    while True:
+        batch = dict(
+            queued.order_by("queued_at", "pk").values_list("pk", "key")[
+                :batch_size
+            ]
+        )
+        if not batch:
+            return flushed
+        purger.purge(list(batch.values()))
+        queued.filter(pk__in=batch.keys()).delete()
+        flushed += len(batch)
+
+
+class BasePurger:
+    # The most keys to purge one at a time before purging everything
+    max_keys = None
+
+    def purge(self, keys):
+        raise NotImplementedError("Must be implemented on subclass")
+
+    def purge_all(self):
+        raise NotImplementedError("Must be implemented on subclass")
+
+
+class NoOpPurger(BasePurger):
+    def purge(self, keys):
+        pass
+
+    def purge_all(self):
+        pass
+
+
+class RecordingPurger(BasePurger):
+    """
+    Keeps a list of everything it's asked to purge, for use in tests
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys
+        self.purged = []
+        self.purged_all = False
+
+    def purge(self, keys):
+        self.purged.append(sorted(keys))
+
+    def purge_all(self):
+        self.purged_all = True
+
+
+class CloudFrontPurger(BasePurger):
+    """
+    CloudFront doesn't support surrogate keys, so ballot, election and
+    person keys are turned in to the paths of their pages and invalidated
+    by path. Postcode pages aren't invalidated, and expire after
+    `CDN_POSTCODE_CACHE_TTL` instead.
+    """
+
+    # CloudFront allows 3,000 paths to be invalidated at once, and a person
+    # key is two paths
+    max_keys = 1000
+
+    def __init__(self, distribution_id=None, client=None):
+        self.distribution_id = (
+            distribution_id or settings.CLOUDFRONT_DISTRIBUTION_ID
+        )
+        if not self.distribution_id:
+            raise ImproperlyConfigured(
+                "CLOUDFRONT_DISTRIBUTION_ID is needed to purge CloudFront"
+            )
+        self.client = client or boto3.client("cloudfront")
+
+    def get_paths(self, keys):
+        from elections.models import Election, PostElection
+        from people.models import Person
+
+        values = {BALLOT: set(), ELECTION: set(), PERSON: set()}
+        for key in keys:
+            key_type, _, value = key.partition(":")
+            if key_type in values:
+                values[key_type].add(value)
+
+        paths = set()
+        ballots = PostElection.objects.filter(
+            ballot_paper_id__in=values[BALLOT]
+        ).select_related("post")
+        paths.update(ballot.get_absolute_url() for ballot in ballots)
+        elections = Election.objects.filter(slug__in=values[ELECTION]).only(
+            "slug", "name"
+        )
+        paths.update(election.get_absolute_url() for election in elections)
+        people = Person.objects.filter(
+            ynr_id__in=[int(ynr_id) for ynr_id in values[PERSON]]
+        ).only("ynr_id", "name")
+        for person in people:
+            paths.add(person.get_absolute_url())
+            paths.add(reverse("person_view", args=[person.ynr_id]))
+        return sorted(paths)
+
+    def invalidate(self, paths):
+        self.client.create_invalidation(
+            DistributionId=self.distribution_id,
+            InvalidationBatch={
+                "Paths": {"Quantity": len(paths), "Items": paths},
+                "CallerReference": uuid.uuid4().hex,
+            },
+        )
+
+    def purge(self, keys):
+        paths = self.get_paths(keys)
+        if paths:
+            self.invalidate(paths)
+
+    def purge_all(self):
+        self.invalidate(["/*"])
+
+
+class SurrogateKeyMixin:
+    """
+    Adds `Surrogate-Key` and `Cache-Control` headers to successful GET
+    responses. Subclasses implement `get_surrogate_keys`.
+    """
+
+    def get_cdn_cache_ttl(self):
+        return settings.CDN_CACHE_TTL
+
+    def get_surrogate_keys(self):
+        raise NotImplementedError("Must be implemented on subclass")
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if request.method not in ("GET", "HEAD"):
+            return response
+        if response.status_code not in (200, 304):
+            return response
+
+        keys = self.get_surrogate_keys()
+        if keys:
+            response["Surrogate-Key"] = " ".join(keys)
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.CDN_BROWSER_CACHE_TTL,
+            s_maxage=self.get_cdn_cache_ttl(),
+            stale_while_revalidate=settings.CDN_STALE_WHILE_REVALIDATE,
+        )
+        return response
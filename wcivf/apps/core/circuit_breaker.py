@@ -0,0 +1,134 @@
+"""
+A circuit breaker for calls to an upstream API.
+
+Each worker process keeps its own breaker per upstream. Outcomes of the last
+`window` calls are recorded, with calls slower than `slow_call_seconds`
+counting as failures. Once at least `min_calls` have been made and the
+proportion that failed reaches `failure_rate`, the breaker opens.
+
+While open, `before_call` raises `CircuitOpenError` straight away rather
+than letting the call tie up the worker. After `reset_timeout` seconds a
+single trial call is let through: if it succeeds the breaker closes again,
+and if it fails the breaker stays open for another `reset_timeout`.
+"""
+
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Every breaker, by name, for `circuit_breaker_states`
+    instances = {}
+
+    def __init__(
+        self,
+        name,
+        window=20,
+        min_calls=10,
+        failure_rate=0.5,
+        slow_call_seconds=5.0,
+        reset_timeout=30.0,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_in_progress = False
+        self._metrics = {"opened": 0, "rejected": 0}
+        self._lock = threading.Lock()
+        self.instances[name] = self
+
+    def before_call(self):
+        """
+        Raises `CircuitOpenError` if the call shouldn't be made
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self._metrics["rejected"] += 1
+                    raise CircuitOpenError(self.name)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self.trial_in_progress:
+                    self._metrics["rejected"] += 1
+                    raise CircuitOpenError(self.name)
+                self.trial_in_progress = True
+
+    def record(self, succeeded, seconds):
+        """
+        Records the outcome of a call that `before_call` allowed
+        """
+        failed = not succeeded or seconds >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.trial_in_progress = False
+                if failed:
+                    self.open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                return
+
+            if self.state == OPEN:
+                # Another call opened the breaker while this one was running
+                return
+            self.outcomes.append(failed)
+            if self.should_open():
+                self.open()
+
+    def should_open(self):
+        if len(self.outcomes) < self.min_calls:
+            return False
+        return sum(self.outcomes) / len(self.outcomes) >= self.failure_rate
+
+    def open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self._metrics["opened"] += 1
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+            self.trial_in_progress = False
+            self.outcomes.clear()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.state == OPEN and (
+                time.monotonic() - self.opened_at < self.reset_timeout
+            )
+
+    def metrics(self):
+        """
+        The current state, and counters since this process started
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self.outcomes),
+                "recent_failures": sum(self.outcomes),
+                **self._metrics,
+            }
+
+
+def circuit_breaker_states():
+    return {
+        name: breaker.metrics()
+        for name, breaker in CircuitBreaker.instances.items()
+    }
@@ -42,15 +42,76 @@ def may_election_day_this_year():
     return first_thursday_in_may_for_year(datetime.now().year)
 
 
+INCODE_PATTERN = "[0-9][ABD-HJLNP-UW-Z]{2}"
+OUTCODE_PATTERN = (
+    "(?:[A-PR-UWYZ][0-9][0-9]?"
+    "|[A-PR-UWYZ][A-HK-Y][0-9][0-9]?"
+    "|[A-PR-UWYZ][0-9][A-HJKSTUW]"
+    "|[A-PR-UWYZ][A-HK-Y][0-9][ABEHMNPRVWXY])"
+)
+POSTCODE_REGEX = re.compile(
+    r"^(?:%s %s|GIR 0AA)$" % (OUTCODE_PATTERN, INCODE_PATTERN)
+)
+
+
 def clean_postcode(postcode):
     postcode = postcode.replace("+", "")
-    incode_pattern = "[0-9][ABD-HJLNP-UW-Z]{2}"
-    space_regex = re.compile(r" *(%s)$" % incode_pattern)
+    space_regex = re.compile(r" *(%s)$" % INCODE_PATTERN)
     return space_regex.sub(r" \1", postcode.upper())
 
 
+def is_valid_postcode(postcode):
+    """
+    Returns True if the postcode is in a valid UK format. This doesn't mean
+    the postcode exists, only that it's worth asking DevsDC about.
+    """
+    postcode = clean_postcode(" ".join(postcode.split()))
+    return bool(POSTCODE_REGEX.match(postcode))
+
+
 def twitter_username(url):
     """
     Returns username from a twitter url
     """
     return urlparse(url).path.strip("/")
+
+
+class IDBitmap:
+    """
+    A set of non-negative integer IDs, stored as one bit per ID.
+
+    For dense IDs like YNR person IDs this takes a few kilobytes, where a
+    `set` of the same IDs takes several megabytes.
+    """
+
+    def __init__(self, ids=()):
+        self.bits = bytearray()
+        for value in ids:
+            self.add(value)
+
+    def add(self, value):
+        index, bit = divmod(value, 8)
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index - len(self.bits) + 1))
+        self.bits[index] |= 1 << bit
+
+    def __contains__(self, value):
+        index, bit = divmod(value, 8)
+        return index < len(self.bits) and bool(self.bits[index] >> bit & 1)
+
+    def __iter__(self):
+        for index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield index * 8 + bit
+
+    def __len__(self):
+        return sum(byte.bit_count() for byte in self.bits)
+
+    def difference(self, other):
+        """
+        Returns a list of the IDs in this bitmap that aren't in `other`
+        """
+        return [value for value in self if value not in other]
@@ -0,0 +1,110 @@
+"""
+Reads pages of API results from a file without loading the whole page.
+
+YNR's pages of people are several megabytes of JSON, and `json.load` needs
+the text of the page and every parsed result in memory at once.
+`iter_json_object` reads the file in chunks and yields the top level keys
+and values of the object one at a time. The items in the `list_key` list
+are yielded one at a time too, so only one result is parsed at once.
+"""
+
+import json
+
+WHITESPACE = " \t\n\r"
+
+decoder = json.JSONDecoder()
+
+
+class JSONStreamReader:
+    def __init__(self, file, chunk_size=64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        """
+        Adds the next chunk of the file to the buffer, dropping anything
+        that's already been read. Returns False at the end of the file.
+        """
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, or "" at the end
+        of the file
+        """
+        while True:
+            while (
+                self.pos < len(self.buffer)
+                and self.buffer[self.pos] in WHITESPACE
+            ):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} but found {char!r} in JSON stream"
+            )
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decodes the next complete JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Assume the value carries on in the next chunk
+                if not self.read_more():
+                    raise
+                continue
+            if end == len(self.buffer) and not self.eof and self.read_more():
+                # A number might carry on in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self, list_key):
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key == list_key and self.peek() == "[":
+                self.pos += 1
+                if self.peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.value()
+                        if self.expect(",]") == "]":
+                            break
+            else:
+                yield key, self.value()
+            if self.expect(",}") == "}":
+                return
+
+
+def iter_json_object(file, list_key="results"):
+    """
+    Yields (key, value) for each key of the JSON object in `file`, except
+    that the list at `list_key` is yielded as (list_key, item) for each item
+    """
+    yield from JSONStreamReader(file).iter_object(list_key)
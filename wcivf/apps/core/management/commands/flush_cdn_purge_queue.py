@@ -0,0 +1,22 @@
+from core.cdn import flush_purge_queue, get_purger
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Send the pages queued for purging to the CDN"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            dest="batch_size",
+            type=int,
+            default=500,
+            help="How many keys to purge at once",
+        )
+
+    def handle(self, **options):
+        flushed = flush_purge_queue(
+            purger=get_purger(), batch_size=options["batch_size"]
+        )
+        self.stdout.write(f"Flushed {flushed} keys from the CDN purge queue")
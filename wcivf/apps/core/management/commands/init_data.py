@@ -5,6 +5,7 @@ from django.core.cache import cache
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from elections.constants import (
+    BALLOT_CANDIDATES_FRAGMENT_KEY_FMT,
     PEOPLE_FOR_BALLOT_KEY_FMT,
     POLLING_STATIONS_KEY_FMT,
     POSTCODE_TO_BALLOT_KEY_FMT,
@@ -27,6 +28,7 @@ class Command(BaseCommand):
                 ("import_parties",),
                 ("import_ballots",),
                 ("import_people",),
+                ("import_administrations",),
             ]
         else:
             commands = [("import_people", "--recently-updated")]
@@ -41,6 +43,7 @@ class Command(BaseCommand):
                 POLLING_STATIONS_KEY_FMT,
                 POSTCODE_TO_BALLOT_KEY_FMT,
                 PEOPLE_FOR_BALLOT_KEY_FMT,
+                BALLOT_CANDIDATES_FRAGMENT_KEY_FMT,
             ):
                 cache.delete_pattern(fmt.format("*"))
 
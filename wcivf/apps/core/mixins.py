@@ -1,6 +1,11 @@
 import csv
+import hashlib
+import time
 
 import requests
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import get_language
 from elections.models import PostElection
 
 
@@ -62,3 +67,57 @@ class ImportAdditionalElectionMixin(ReadFromUrlMixin):
             print(row)
             self.create_object(row=row)
             print("Created the object")
+
+
+class ConditionalGetMixin:
+    """
+    Adds an ETag and Last-Modified header to detail pages, and answers
+    requests with matching `If-None-Match` or `If-Modified-Since` headers
+    with a 304 before the object is loaded or the template is rendered.
+
+    Subclasses implement `get_validators`, which should make one cheap
+    query for values that change whenever the page does.
+
+    Not everything on a page has a modified timestamp we can check (parties,
+    manifestos and leaflets for example), so validators are also only good
+    for `validator_lifetime` seconds.
+    """
+
+    validator_lifetime = 60 * 60
+
+    def get_validators(self):
+        """
+        Returns a tuple of (version, last_modified) for the page, where
+        version is a tuple of values that change with the page and
+        last_modified is a datetime or None. Returns None if the object
+        doesn't exist, in which case the view carries on as normal.
+        """
+        raise NotImplementedError("Must be implemented on subclass")
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        version, last_modified = validators
+        # Start a new validator every `validator_lifetime` seconds
+        period_start = int(time.time() // self.validator_lifetime) * (
+            self.validator_lifetime
+        )
+        etag_source = "|".join(
+            str(part)
+            for part in (request.path, get_language(), period_start, *version)
+        )
+        etag = f'W/"{hashlib.md5(etag_source.encode("utf-8")).hexdigest()}"'
+        if last_modified:
+            last_modified = max(int(last_modified.timestamp()), period_start)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,16 @@
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedPurge(models.Model):
+    """
+    A surrogate key waiting to be purged from the CDN. Importers add keys
+    for the pages they change with `core.cdn.queue_purge` and
+    `flush_cdn_purge_queue` sends them to the CDN.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    queued_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.key
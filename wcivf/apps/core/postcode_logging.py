@@ -0,0 +1,381 @@
+"""
+Sends postcode lookup log entries from a background thread.
+
+`BufferedPostcodeLogger` wraps a `DCWidePostcodeLoggingClient` and has the
+same `entry_class`, `dc_product` and `log` attributes, so it can be used as
+`settings.POSTCODE_LOGGER` without any changes to `LogLookUpMixin`.
+
+`log` only puts the entry on a bounded in-process queue. A flusher thread
+takes entries off the queue and sends them in batches, whenever
+`batch_size` entries are waiting or `flush_interval` seconds have passed.
+A slow or broken logging backend never adds latency to the postcode page.
+
+If the queue is full, or a batch fails to send, entries are either dropped
+or, with `overflow="spill"`, appended to a file in `spill_dir` and sent
+once the backend has caught up. Spilled entries are stored as lines of
+JSON, and `spill_dir` is created with mode 0o700 and is only used if it
+belongs to this user and nobody else can access it.
+
+This module is imported by the settings, so mustn't import Django.
+"""
+
+import atexit
+import dataclasses
+import datetime
+import enum
+import json
+import logging
+import os
+import queue
+import stat
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_SPILL = "spill"
+SPILL_SUFFIX = ".spill"
+
+
+class BufferedPostcodeLogger:
+    def __init__(
+        self,
+        client,
+        max_queue_size=10000,
+        batch_size=100,
+        flush_interval=5.0,
+        overflow=OVERFLOW_DROP,
+        spill_dir=None,
+        max_spill_bytes=50 * 1024 * 1024,
+    ):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_SPILL):
+            raise ValueError(f"Unknown overflow behaviour: {overflow}")
+        if overflow == OVERFLOW_SPILL and not spill_dir:
+            raise ValueError("spill_dir is needed to spill entries to disk")
+        self.client = client
+        self.entry_class = client.entry_class
+        self.dc_product = client.dc_product
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.max_spill_bytes = max_spill_bytes
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self._metrics = {
+            "queued": 0,
+            "sent": 0,
+            "batches": 0,
+            "failed": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "last_flush_seconds": 0.0,
+        }
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def record(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self._metrics[name] += value
+
+    def metrics(self):
+        """
+        A snapshot of the counters since this process started
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["queue_size"] = self.queue.qsize()
+        return metrics
+
+    @property
+    def spill_path(self):
+        return self.spill_dir / f"postcode-log-{os.getpid()}{SPILL_SUFFIX}"
+
+    def ensure_started(self):
+        """
+        Starts the flusher the first time something is logged in each
+        process, as threads don't survive the web server forking workers
+        """
+        pid = os.getpid()
+        if self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # Anything queued belongs to the parent process
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self.run, name="postcode-logger", daemon=True
+            )
+            self._thread.start()
+
+    def log(self, entry):
+        self.ensure_started()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.handle_unsent([entry])
+            return
+        self.record(queued=1)
+
+    def handle_unsent(self, entries):
+        if self.overflow == OVERFLOW_SPILL and self.spill(entries):
+            self.record(spilled=len(entries))
+        else:
+            self.record(dropped=len(entries))
+
+    def spill_dir_is_private(self):
+        """
+        Creates `spill_dir` if needed, and checks that it's a directory that
+        belongs to this user and that nobody else can read or write to.
+        Otherwise someone else could plant entries for us to send.
+        """
+        try:
+            self.spill_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            dir_stat = os.lstat(self.spill_dir)
+        except OSError:
+            logger.warning("Couldn't create postcode log spill directory")
+            return False
+        if (
+            not stat.S_ISDIR(dir_stat.st_mode)
+            or dir_stat.st_uid != os.getuid()
+            or dir_stat.st_mode & 0o077
+        ):
+            logger.warning(
+                "Not using postcode log spill directory %s, as it isn't a "
+                "directory that only this user can access",
+                self.spill_dir,
+            )
+            return False
+        return True
+
+    def encode_value(self, value):
+        """
+        Turns the values in log entries that JSON can't store into objects
+        that `decode_value` turns back
+        """
+        if isinstance(value, enum.Enum):
+            return {"dc_product": value.value}
+        if isinstance(value, datetime.datetime):
+            return {"datetime": value.isoformat()}
+        raise TypeError(f"Can't spill {type(value).__name__} to disk")
+
+    def decode_value(self, obj):
+        if list(obj) == ["dc_product"]:
+            return self.dc_product(obj["dc_product"])
+        if list(obj) == ["datetime"]:
+            return datetime.datetime.fromisoformat(obj["datetime"])
+        return obj
+
+    def spill(self, entries):
+        """
+        Appends entries to this process's spill file, one line of JSON each.
+        Returns False if the file is already at `max_spill_bytes` or can't be
+        written to.
+        """
+        with self._spill_lock:
+            if not self.spill_dir_is_private():
+                return False
+            try:
+                lines = [
+                    json.dumps(
+                        {
+                            field.name: getattr(entry, field.name)
+                            for field in dataclasses.fields(entry)
+                        },
+                        default=self.encode_value,
+                    )
+                    + "\n"
+                    for entry in entries
+                ]
+            except TypeError:
+                logger.warning("Couldn't spill postcode log", exc_info=True)
+                return False
+            try:
+                path = self.spill_path
+                if path.exists() and path.stat().st_size > (
+                    self.max_spill_bytes
+                ):
+                    return False
+                fd = os.open(
+                    path,
+                    os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_NOFOLLOW,
+                    0o600,
+                )
+                with open(fd, "a", encoding="utf-8") as spill_file:
+                    spill_file.writelines(lines)
+            except OSError:
+                logger.warning("Couldn't spill postcode log", exc_info=True)
+                return False
+        return True
+
+    def claim_spill_files(self):
+        """
+        Returns the spill files this process should send: its own, and any
+        left behind by processes that have exited. Each file is renamed
+        first so nothing else writes to or claims it.
+        """
+        if not self.spill_dir_is_private():
+            return []
+        claimed = []
+        for path in self.spill_dir.glob(f"postcode-log-*{SPILL_SUFFIX}"):
+            try:
+                pid = int(path.name[len("postcode-log-") : -len(SPILL_SUFFIX)])
+            except ValueError:
+                continue
+            if pid != os.getpid() and process_is_running(pid):
+                continue
+            sending = path.with_suffix(f".{os.getpid()}.sending")
+            with self._spill_lock:
+                try:
+                    path.rename(sending)
+                except FileNotFoundError:
+                    continue
+            claimed.append(sending)
+        return claimed
+
+    def read_spill_file(self, path):
+        """
+        Returns the entries in a claimed spill file, or an empty list if the
+        file doesn't belong to this user or can't be read
+        """
+        entries = []
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+            with open(fd, encoding="utf-8", errors="replace") as spill_file:
+                if os.fstat(spill_file.fileno()).st_uid != os.getuid():
+                    logger.warning(
+                        "Ignoring spill file %s owned by another user", path
+                    )
+                    return []
+                for line in spill_file:
+                    try:
+                        entries.append(
+                            self.entry_class(
+                                **json.loads(
+                                    line, object_hook=self.decode_value
+                                )
+                            )
+                        )
+                    except (TypeError, ValueError):
+                        logger.warning("Skipping bad line in %s", path)
+        except OSError:
+            logger.warning("Couldn't read spill file %s", path, exc_info=True)
+            return []
+        return entries
+
+    def send_spilled(self):
+        failed = False
+        for path in self.claim_spill_files():
+            entries = self.read_spill_file(path)
+            path.unlink(missing_ok=True)
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start : start + self.batch_size]
+                if failed:
+                    # Spill everything else again, and try on the next flush
+                    self.handle_unsent(batch)
+                elif not self.send(batch):
+                    failed = True
+
+    def send(self, entries):
+        """
+        Sends one batch, using the client's batch API where it has one.
+        Returns False if the batch failed.
+        """
+        start = time.monotonic()
+        try:
+            log_batch = getattr(self.client, "log_batch", None)
+            if log_batch is not None:
+                log_batch(entries)
+            else:
+                for entry in entries:
+                    self.client.log(entry)
+        except Exception:
+            logger.warning(
+                "Failed to send %s postcode log entries",
+                len(entries),
+                exc_info=True,
+            )
+            self.record(failed=len(entries))
+            self.handle_unsent(entries)
+            return False
+        with self._lock:
+            self._metrics["sent"] += len(entries)
+            self._metrics["batches"] += 1
+            self._metrics["last_flush_seconds"] = time.monotonic() - start
+        return True
+
+    def next_batch(self, timeout):
+        """
+        Waits up to `timeout` seconds for a full batch, and returns whatever
+        has been queued by then
+        """
+        deadline = time.monotonic() + timeout
+        batch = []
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    entry = self.queue.get(timeout=remaining)
+                else:
+                    entry = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(entry)
+        return batch
+
+    def flush(self, timeout=0):
+        """
+        Sends everything queued, then anything spilled to disk if the
+        backend is keeping up. Returns False if a batch failed.
+        """
+        while True:
+            batch = self.next_batch(timeout)
+            if not batch:
+                break
+            if not self.send(batch):
+                return False
+            timeout = 0
+            if len(batch) < self.batch_size:
+                break
+        if self.spill_dir and self.queue.qsize() < self.queue.maxsize // 2:
+            self.send_spilled()
+        return True
+
+    def run(self):
+        while True:
+            try:
+                if not self.flush(timeout=self.flush_interval):
+                    # Give the backend a chance to recover
+                    time.sleep(self.flush_interval)
+            except Exception:
+                # Never let the flusher die
+                logger.exception("Postcode log flusher failed")
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        """
+        Sends anything still queued when the process exits
+        """
+        if self._pid != os.getpid():
+            return
+        while not self.queue.empty():
+            if not self.flush():
+                break
+
+
+def process_is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
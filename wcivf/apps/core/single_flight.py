@@ -0,0 +1,127 @@
+"""
+Coalesces identical work that misses the cache in several workers at once.
+
+When a popular postcode isn't cached, every worker that gets a request for
+it would otherwise call DevsDC and build the same candidate snapshots.
+`SingleFlight` uses `cache.add` as a lock shared by every worker (Redis in
+production): the first worker to miss a key does the work and caches the
+result, and the others poll the cache until it appears.
+
+Waiting is bounded by `SINGLE_FLIGHT_WAIT_TIMEOUT`. If the result hasn't
+appeared by then, or the worker doing the work gives up its lock without
+caching anything, the waiting worker does the work itself.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class SingleFlight:
+    # Every instance, by name, for `single_flight_metrics`
+    instances = {}
+
+    def __init__(self, name, poll_interval=0.05):
+        self.name = name
+        self.poll_interval = poll_interval
+        self._metrics = {
+            "computed": 0,
+            "coalesced": 0,
+            "timed_out": 0,
+            "seconds_waiting": 0.0,
+        }
+        self._lock = threading.Lock()
+        self.instances[name] = self
+
+    def record(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self._metrics[name] += value
+
+    def metrics(self):
+        """
+        A snapshot of the counters since this process started
+        """
+        with self._lock:
+            return dict(self._metrics)
+
+    def lock_key(self, key):
+        return f"{key}_in_flight"
+
+    def run(self, key, compute):
+        """
+        Returns `compute()`, or the value another worker running it for the
+        same key puts in the cache. `compute` must cache its result against
+        `key` as well as returning it.
+        """
+        return self.run_many([key], lambda keys: {key: compute()})[key]
+
+    def run_many(self, keys, compute_many):
+        """
+        Returns a dict of key to value for every key in `keys`.
+
+        `compute_many` is called with the keys no other worker is working on,
+        and must cache and return a dict of their values. The rest are read
+        from the cache once the worker that's working on them has finished.
+        """
+        leading = [
+            key
+            for key in keys
+            if cache.add(
+                self.lock_key(key),
+                True,
+                timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+            )
+        ]
+        following = [key for key in keys if key not in leading]
+        values = {}
+        if leading:
+            try:
+                values.update(compute_many(leading))
+            finally:
+                cache.delete_many([self.lock_key(key) for key in leading])
+            self.record(computed=len(leading))
+
+        if following:
+            found = self.wait(following)
+            values.update(found)
+            missing = [key for key in following if key not in found]
+            self.record(coalesced=len(found), timed_out=len(missing))
+            if missing:
+                values.update(compute_many(missing))
+        return values
+
+    def wait(self, keys):
+        """
+        Polls the cache for `keys` until they're all there, their locks have
+        been released or `SINGLE_FLIGHT_WAIT_TIMEOUT` has passed. Returns the
+        ones that were found.
+        """
+        start = time.monotonic()
+        deadline = start + settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+        lock_keys = {self.lock_key(key): key for key in keys}
+        found = {}
+        waiting = set(keys)
+        while True:
+            cached = cache.get_many([*waiting, *lock_keys])
+            for key in list(waiting):
+                if key in cached:
+                    found[key] = cached[key]
+                    waiting.discard(key)
+                elif self.lock_key(key) not in cached:
+                    # The worker doing the work failed, so stop waiting
+                    waiting.discard(key)
+            if not waiting or time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+        self.record(seconds_waiting=time.monotonic() - start)
+        return found
+
+
+def single_flight_metrics():
+    return {
+        name: instance.metrics()
+        for name, instance in SingleFlight.instances.items()
+    }
@@ -0,0 +1,202 @@
+import pytest
+from core.cdn import (
+    CloudFrontPurger,
+    NoOpPurger,
+    RecordingPurger,
+    ballot_key,
+    election_key,
+    flush_purge_queue,
+    person_key,
+    postcode_key,
+    queue_purge,
+)
+from core.models import QueuedPurge
+from django.core.management import call_command
+from django.utils import timezone
+from elections.tests.factories import ElectionFactory, PostElectionFactory
+from people.tests.factories import PersonFactory
+
+
+def test_keys():
+    assert ballot_key("local.foo.bar.2024-05-02") == (
+        "ballot:local.foo.bar.2024-05-02"
+    )
+    assert election_key("local.2024-05-02") == "election:local.2024-05-02"
+    assert person_key(123) == "person:123"
+    assert postcode_key("sw1a 1aa") == "postcode:SW1A1AA"
+
+
+@pytest.mark.django_db
+class TestPurgeQueue:
+    def test_queue_purge(self):
+        queue_purge(["person:1", "person:2", "person:1"])
+        queue_purge([])
+
+        assert sorted(QueuedPurge.objects.values_list("key", flat=True)) == [
+            "person:1",
+            "person:2",
+        ]
+
+    def test_queueing_again_updates_queued_at(self):
+        queue_purge(["person:1"])
+        first = QueuedPurge.objects.get().queued_at
+
+        queue_purge(["person:1"])
+
+        assert QueuedPurge.objects.get().queued_at > first
+
+    def test_flush_in_batches(self):
+        queue_purge(["person:1", "person:2", "person:3"])
+        purger = RecordingPurger()
+
+        assert flush_purge_queue(purger, batch_size=2) == 3
+
+        assert sorted(sum(purger.purged, [])) == [
+            "person:1",
+            "person:2",
+            "person:3",
+        ]
+        assert len(purger.purged) == 2
+        assert not purger.purged_all
+        assert not QueuedPurge.objects.exists()
+
+    def test_flush_purges_everything_over_max_keys(self):
+        queue_purge(["person:1", "person:2", "person:3"])
+        purger = RecordingPurger(max_keys=2)
+
+        assert flush_purge_queue(purger) == 3
+
+        assert purger.purged_all
+        assert purger.purged == []
+        assert not QueuedPurge.objects.exists()
+
+    def test_flush_keeps_keys_queued_after_it_started(self):
+        queue_purge(["person:1"])
+        QueuedPurge.objects.update(
+            queued_at=timezone.now() + timezone.timedelta(minutes=1)
+        )
+
+        assert flush_purge_queue(RecordingPurger()) == 0
+        assert QueuedPurge.objects.exists()
+
+    def test_flush_keeps_keys_if_purge_fails(self, mocker):
+        queue_purge(["person:1"])
+        purger = NoOpPurger()
+        mocker.patch.object(purger, "purge", side_effect=ValueError)
+
+        with pytest.raises(ValueError):
+            flush_purge_queue(purger)
+        assert QueuedPurge.objects.exists()
+
+    def test_command(self, mocker):
+        queue_purge(["person:1"])
+        purger = RecordingPurger()
+        mocker.patch(
+            "core.management.commands.flush_cdn_purge_queue.get_purger",
+            return_value=purger,
+        )
+
+        call_command("flush_cdn_purge_queue")
+
+        assert purger.purged == [["person:1"]]
+
+
+@pytest.mark.django_db
+class TestCloudFrontPurger:
+    @pytest.fixture
+    def client(self, mocker):
+        return mocker.MagicMock()
+
+    @pytest.fixture
+    def purger(self, client):
+        return CloudFrontPurger(distribution_id="ABC123", client=client)
+
+    def test_purge_paths(self, purger, client):
+        ballot = PostElectionFactory(
+            ballot_paper_id="local.sheffield.ecclesall.2024-05-02",
+            post__label="Ecclesall",
+        )
+        PersonFactory(ynr_id=123, name="Jane Smith")
+
+        purger.purge(
+            [
+                ballot_key(ballot.ballot_paper_id),
+                election_key(ballot.election.slug),
+                person_key(123),
+                postcode_key("S11 8QD"),
+                person_key(999),
+            ]
+        )
+
+        client.create_invalidation.assert_called_once()
+        kwargs = client.create_invalidation.call_args.kwargs
+        assert kwargs["DistributionId"] == "ABC123"
+        assert kwargs["InvalidationBatch"]["Paths"] == {
+            "Quantity": 4,
+            "Items": sorted(
+                [
+                    ballot.get_absolute_url(),
+                    ballot.election.get_absolute_url(),
+                    "/person/123/jane-smith",
+                    "/person/123/",
+                ]
+            ),
+        }
+
+    def test_nothing_to_purge(self, purger, client):
+        purger.purge([postcode_key("S11 8QD")])
+        client.create_invalidation.assert_not_called()
+
+    def test_purge_all(self, purger, client):
+        purger.purge_all()
+        kwargs = client.create_invalidation.call_args.kwargs
+        assert kwargs["InvalidationBatch"]["Paths"]["Items"] == ["/*"]
+
+
+@pytest.mark.django_db
+class TestSurrogateKeyHeaders:
+    def test_ballot_page(self, client):
+        ballot = PostElectionFactory(
+            election__election_date="2017-03-23",
+        )
+
+        response = client.get(ballot.get_absolute_url())
+
+        assert response["Surrogate-Key"] == ballot_key(ballot.ballot_paper_id)
+        cache_control = response["Cache-Control"]
+        assert "public" in cache_control
+        assert "s-maxage=3600" in cache_control
+        assert "stale-while-revalidate=600" in cache_control
+
+    def test_not_modified_ballot_page(self, client):
+        ballot = PostElectionFactory(
+            election__election_date="2017-03-23",
+        )
+        url = ballot.get_absolute_url()
+        etag = client.get(url)["ETag"]
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert response["Surrogate-Key"] == ballot_key(ballot.ballot_paper_id)
+
+    def test_election_page(self, client):
+        election = ElectionFactory()
+
+        response = client.get(election.get_absolute_url())
+
+        assert response["Surrogate-Key"] == election_key(election.slug)
+
+    def test_person_page(self, client):
+        person = PersonFactory()
+
+        response = client.get(person.get_absolute_url())
+
+        assert response["Surrogate-Key"] == person_key(person.ynr_id)
+
+    def test_not_found(self, client):
+        response = client.get("/person/404/")
+
+        assert response.status_code == 404
+        assert "Surrogate-Key" not in response
+        assert "Cache-Control" not in response
@@ -0,0 +1,94 @@
+import pytest
+from core.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from django.urls import reverse
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(
+        "test",
+        window=4,
+        min_calls=4,
+        failure_rate=0.5,
+        slow_call_seconds=1,
+        reset_timeout=30,
+    )
+
+
+def make_calls(breaker, *outcomes, seconds=0.1):
+    for succeeded in outcomes:
+        breaker.before_call()
+        breaker.record(succeeded=succeeded, seconds=seconds)
+
+
+class TestCircuitBreaker:
+    def test_stays_closed_below_failure_rate(self, breaker):
+        make_calls(breaker, True, True, True, False)
+        assert breaker.state == CLOSED
+
+    def test_needs_min_calls_to_open(self, breaker):
+        make_calls(breaker, False, False, False)
+        assert breaker.state == CLOSED
+
+    def test_opens_on_failure_rate(self, breaker):
+        make_calls(breaker, True, True, False, False)
+
+        assert breaker.state == OPEN
+        assert breaker.is_open
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        metrics = breaker.metrics()
+        assert metrics["opened"] == 1
+        assert metrics["rejected"] == 1
+
+    def test_slow_calls_count_as_failures(self, breaker):
+        make_calls(breaker, True, True, True, True, seconds=2)
+        assert breaker.state == OPEN
+
+    def test_only_recent_calls_count(self, breaker):
+        make_calls(breaker, False, True, True, True, False)
+        assert breaker.state == CLOSED
+
+    def test_trial_call_closes(self, breaker, freezer):
+        make_calls(breaker, False, False, False, False)
+        freezer.tick(31)
+
+        breaker.before_call()
+        assert breaker.state == HALF_OPEN
+        # Only one trial call at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record(succeeded=True, seconds=0.1)
+        assert breaker.state == CLOSED
+        breaker.before_call()
+
+    def test_failed_trial_call_reopens(self, breaker, freezer):
+        make_calls(breaker, False, False, False, False)
+        freezer.tick(31)
+
+        breaker.before_call()
+        breaker.record(succeeded=False, seconds=0.1)
+
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        assert breaker.metrics()["opened"] == 2
+
+    def test_reset(self, breaker):
+        make_calls(breaker, False, False, False, False)
+        breaker.reset()
+        assert breaker.state == CLOSED
+        breaker.before_call()
+
+
+def test_status_check_state(client):
+    response = client.get(reverse("status_check_view"))
+
+    assert response.json()["circuit_breakers"]["devs_dc"]["state"] == CLOSED
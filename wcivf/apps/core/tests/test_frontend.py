@@ -13,13 +13,16 @@ import vcr
 from dateutil.utils import today
 from dc_utils.tests.helpers import validate_html_str
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 from django.test.utils import override_settings
 from django.urls import reverse
+from elections.models import PostElection
 from elections.tests.factories import (
     ElectionFactory,
     PostElectionFactory,
 )
+from freezegun import freeze_time
 from parties.tests.factories import PartyFactory
 from people.tests.factories import (
     PersonPostWithPartyFactory,
@@ -181,3 +184,43 @@ class TestHomePageView(TestCase):
         )
         req = self.client.get("/")
         self.assertContains(req, "ref.foo.date")
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "home-page-tests",
+            }
+        }
+    )
+    def test_upcoming_elections_cached(self):
+        cache.clear()
+        election = ElectionFactory(
+            election_date=today() + timedelta(days=1),
+            current=True,
+            any_non_by_elections=False,
+        )
+        PostElectionFactory(
+            election=election,
+            ballot_paper_id="local.foo.bar.by.date",
+            post__ynr_id="bar",
+        )
+        self.assertContains(self.client.get("/"), "local.foo.bar.by.date")
+
+        PostElectionFactory(
+            election=election,
+            ballot_paper_id="local.foo.baz.by.date",
+            post__ynr_id="baz",
+        )
+        with self.assertNumQueries(0):
+            req = self.client.get("/")
+        self.assertNotContains(req, "local.foo.baz.by.date")
+
+        # Refreshed by import_ballots
+        PostElection.objects.cache_home_page_upcoming_ballots()
+        self.assertContains(self.client.get("/"), "local.foo.baz.by.date")
+
+        # Rebuilt the day after the election
+        with freeze_time(today() + timedelta(days=2)):
+            req = self.client.get("/")
+        self.assertNotContains(req, "Upcoming Elections")
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+from core.helpers import IDBitmap
+from core.json_stream import JSONStreamReader, iter_json_object
+
+PAGE = {
+    "count": 123456,
+    "next": "https://example.com/people-000002.json",
+    "previous": None,
+    "results": [
+        {"id": 1, "name": "Jo Bloggs", "candidacies": [{"elected": True}]},
+        {"id": 2, "name": "Zoë Smith", "score": 1.5e3, "tags": []},
+    ],
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_iter_json_object(chunk_size):
+    file = io.StringIO(json.dumps(PAGE, indent=2))
+    reader = JSONStreamReader(file, chunk_size=chunk_size)
+
+    assert list(reader.iter_object("results")) == [
+        ("count", 123456),
+        ("next", "https://example.com/people-000002.json"),
+        ("previous", None),
+        ("results", PAGE["results"][0]),
+        ("results", PAGE["results"][1]),
+    ]
+
+
+def test_iter_json_object_only_reads_what_it_needs():
+    file = io.StringIO(json.dumps(PAGE))
+    file.read = lambda size, read=file.read: read(10)
+
+    pairs = iter_json_object(file)
+    assert next(pairs) == ("count", 123456)
+    assert file.tell() < len(json.dumps(PAGE)) / 2
+
+
+def test_iter_json_object_empty_list():
+    file = io.StringIO('{"results": [], "next": null}')
+
+    assert list(iter_json_object(file)) == [("next", None)]
+
+
+def test_iter_json_object_invalid():
+    file = io.StringIO('{"results": [{"id": 1}')
+
+    with pytest.raises(ValueError):
+        list(iter_json_object(file))
+
+
+class TestIDBitmap:
+    def test_contains(self):
+        bitmap = IDBitmap([0, 9, 200000])
+
+        assert 9 in bitmap
+        assert 200000 in bitmap
+        assert 8 not in bitmap
+        assert 300000 not in bitmap
+        assert len(bitmap) == 3
+        assert list(bitmap) == [0, 9, 200000]
+        assert len(bitmap.bits) == 25001
+
+    def test_difference(self):
+        existing = IDBitmap([1, 2, 3, 100])
+        seen = IDBitmap([2, 100, 101])
+
+        assert existing.difference(seen) == [1, 3]
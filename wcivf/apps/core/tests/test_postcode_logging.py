@@ -0,0 +1,300 @@
+import datetime
+import enum
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass
+
+import pytest
+from core.postcode_logging import BufferedPostcodeLogger
+from django.urls import reverse
+
+
+@dataclass
+class Entry:
+    postcode: str
+
+
+class FakeClient:
+    entry_class = Entry
+    dc_product = "WCIVF"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def log_batch(self, entries):
+        if self.fail:
+            raise ValueError("Logging backend is down")
+        self.batches.append(list(entries))
+
+
+class FakeClientWithoutBatches:
+    entry_class = Entry
+    dc_product = "WCIVF"
+
+    def __init__(self):
+        self.entries = []
+
+    def log(self, entry):
+        self.entries.append(entry)
+
+
+def entries(count):
+    return [Entry(postcode=f"SW1A {n}AA") for n in range(count)]
+
+
+class Product(enum.Enum):
+    wcivf = "WCIVF"
+
+
+@dataclass
+class TimestampedEntry:
+    postcode: str
+    dc_product: Product
+    timestamp: datetime.datetime
+
+
+class FakeClientWithEnum(FakeClient):
+    entry_class = TimestampedEntry
+    dc_product = Product
+
+
+class PlantedPayload:
+    unpickled = False
+
+    def __reduce__(self):
+        return (PlantedPayload.mark_unpickled, ())
+
+    @staticmethod
+    def mark_unpickled():
+        PlantedPayload.unpickled = True
+
+
+@pytest.fixture
+def no_flusher(mocker):
+    """
+    Stops the background flusher starting, so tests can flush by hand
+    """
+    mocker.patch.object(BufferedPostcodeLogger, "ensure_started")
+
+
+class TestBufferedPostcodeLogger:
+    def test_has_client_attributes(self):
+        logger = BufferedPostcodeLogger(FakeClient())
+        assert logger.entry_class is Entry
+        assert logger.dc_product == "WCIVF"
+
+    def test_log_only_queues(self, no_flusher):
+        client = FakeClient()
+        logger = BufferedPostcodeLogger(client)
+
+        for entry in entries(3):
+            logger.log(entry)
+
+        assert client.batches == []
+        assert logger.metrics()["queued"] == 3
+        assert logger.metrics()["queue_size"] == 3
+
+    def test_flush_in_batches(self, no_flusher):
+        client = FakeClient()
+        logger = BufferedPostcodeLogger(client, batch_size=2)
+        for entry in entries(5):
+            logger.log(entry)
+
+        assert logger.flush()
+
+        assert [len(batch) for batch in client.batches] == [2, 2, 1]
+        metrics = logger.metrics()
+        assert metrics["sent"] == 5
+        assert metrics["batches"] == 3
+        assert metrics["queue_size"] == 0
+
+    def test_client_without_batch_api(self, no_flusher):
+        client = FakeClientWithoutBatches()
+        logger = BufferedPostcodeLogger(client)
+        for entry in entries(2):
+            logger.log(entry)
+
+        logger.flush()
+
+        assert client.entries == entries(2)
+
+    def test_drops_when_queue_full(self, no_flusher):
+        client = FakeClient()
+        logger = BufferedPostcodeLogger(client, max_queue_size=2)
+        for entry in entries(3):
+            logger.log(entry)
+
+        logger.flush()
+
+        assert client.batches == [entries(2)]
+        assert logger.metrics()["dropped"] == 1
+
+    def test_failed_batch_dropped(self, no_flusher):
+        logger = BufferedPostcodeLogger(FakeClient(fail=True))
+        logger.log(Entry(postcode="SW1A 1AA"))
+
+        assert not logger.flush()
+
+        metrics = logger.metrics()
+        assert metrics["failed"] == 1
+        assert metrics["dropped"] == 1
+        assert metrics["sent"] == 0
+
+    @pytest.fixture
+    def spill_dir(self, tmp_path):
+        return tmp_path / "spill"
+
+    def test_spills_to_disk_and_sends_later(self, no_flusher, spill_dir):
+        client = FakeClient(fail=True)
+        logger = BufferedPostcodeLogger(
+            client,
+            max_queue_size=2,
+            overflow="spill",
+            spill_dir=spill_dir,
+        )
+        for entry in entries(3):
+            logger.log(entry)
+        assert logger.metrics()["spilled"] == 1
+
+        # The backend is down, so the queued entries are spilled too
+        assert not logger.flush()
+        assert logger.metrics()["spilled"] == 3
+        assert list(spill_dir.iterdir()) == [logger.spill_path]
+        assert spill_dir.stat().st_mode & 0o777 == 0o700
+
+        client.fail = False
+        assert logger.flush()
+
+        assert sorted(sum(client.batches, []), key=str) == entries(3)
+        assert logger.metrics()["sent"] == 3
+        assert list(spill_dir.iterdir()) == []
+
+    def test_sends_files_left_by_exited_processes(
+        self, no_flusher, spill_dir, mocker
+    ):
+        client = FakeClient()
+        logger = BufferedPostcodeLogger(
+            client, overflow="spill", spill_dir=spill_dir
+        )
+        logger.spill(entries(1))
+        (spill_dir / "postcode-log-1.spill").write_bytes(
+            logger.spill_path.read_bytes()
+        )
+        (spill_dir / "postcode-log-2.spill").write_bytes(b"")
+        mocker.patch(
+            "core.postcode_logging.process_is_running",
+            side_effect=lambda pid: pid == 2,
+        )
+
+        logger.flush()
+
+        assert client.batches == [entries(1), entries(1)]
+        assert [path.name for path in spill_dir.iterdir()] == [
+            "postcode-log-2.spill"
+        ]
+
+    def test_spilled_entries_keep_their_types(self, no_flusher, spill_dir):
+        client = FakeClientWithEnum()
+        logger = BufferedPostcodeLogger(
+            client, overflow="spill", spill_dir=spill_dir
+        )
+        entry = TimestampedEntry(
+            postcode="SW1A 1AA",
+            dc_product=Product.wcivf,
+            timestamp=datetime.datetime(2024, 5, 2, 12, 30),
+        )
+        logger.spill([entry])
+        assert json.loads(logger.spill_path.read_text()) == {
+            "postcode": "SW1A 1AA",
+            "dc_product": {"dc_product": "WCIVF"},
+            "timestamp": {"datetime": "2024-05-02T12:30:00"},
+        }
+
+        logger.flush()
+
+        assert client.batches == [[entry]]
+
+    def test_planted_spill_file_not_unpickled(
+        self, no_flusher, spill_dir, mocker
+    ):
+        client = FakeClient()
+        logger = BufferedPostcodeLogger(
+            client, overflow="spill", spill_dir=spill_dir
+        )
+        assert logger.spill_dir_is_private()
+        (spill_dir / "postcode-log-1.spill").write_bytes(
+            pickle.dumps(PlantedPayload())
+        )
+        mocker.patch(
+            "core.postcode_logging.process_is_running", return_value=False
+        )
+
+        logger.flush()
+
+        assert not PlantedPayload.unpickled
+        assert client.batches == []
+        assert list(spill_dir.iterdir()) == []
+
+    def test_shared_spill_dir_not_used(self, no_flusher, spill_dir, mocker):
+        spill_dir.mkdir(mode=0o777)
+        spill_dir.chmod(0o777)
+        (spill_dir / "postcode-log-1.spill").write_text(
+            json.dumps({"postcode": "SW1A 1AA"}) + "\n"
+        )
+        mocker.patch(
+            "core.postcode_logging.process_is_running", return_value=False
+        )
+        client = FakeClient(fail=True)
+        logger = BufferedPostcodeLogger(
+            client, overflow="spill", spill_dir=spill_dir
+        )
+        logger.log(Entry(postcode="SW1A 2AA"))
+
+        assert not logger.flush()
+        client.fail = False
+        logger.flush()
+
+        # Nothing was read from or written to the directory
+        assert client.batches == []
+        assert logger.metrics()["dropped"] == 1
+        assert [path.name for path in spill_dir.iterdir()] == [
+            "postcode-log-1.spill"
+        ]
+
+    def test_spill_dir_owned_by_another_user_not_used(
+        self, no_flusher, spill_dir, mocker
+    ):
+        logger = BufferedPostcodeLogger(
+            FakeClient(), overflow="spill", spill_dir=spill_dir
+        )
+        mocker.patch("os.getuid", return_value=os.getuid() + 1)
+
+        assert not logger.spill_dir_is_private()
+        assert not logger.spill(entries(1))
+
+    def test_spill_needs_a_directory(self):
+        with pytest.raises(ValueError):
+            BufferedPostcodeLogger(FakeClient(), overflow="spill")
+
+    def test_background_flusher(self):
+        client = FakeClient()
+        logger = BufferedPostcodeLogger(client, flush_interval=0.01)
+
+        logger.log(Entry(postcode="SW1A 1AA"))
+
+        for _ in range(100):
+            if client.batches:
+                break
+            time.sleep(0.01)
+        assert client.batches == [[Entry(postcode="SW1A 1AA")]]
+
+
+def test_status_check_metrics(client, settings):
+    settings.POSTCODE_LOGGER = BufferedPostcodeLogger(FakeClient())
+
+    response = client.get(reverse("status_check_view"))
+
+    assert response.json()["postcode_logger"]["queued"] == 0
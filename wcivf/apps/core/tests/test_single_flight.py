@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+from core.single_flight import SingleFlight, single_flight_metrics
+from django.core.cache import cache
+from django.urls import reverse
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "single-flight-tests",
+        }
+    }
+    settings.SINGLE_FLIGHT_WAIT_TIMEOUT = 1
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def flight():
+    return SingleFlight("test", poll_interval=0.01)
+
+
+def compute_and_cache(keys):
+    values = {key: f"value for {key}" for key in keys}
+    cache.set_many(values)
+    return values
+
+
+class TestSingleFlight:
+    def test_computes_when_not_in_flight(self, flight, mocker):
+        compute = mocker.Mock(side_effect=compute_and_cache)
+
+        assert flight.run_many(["a", "b"], compute) == {
+            "a": "value for a",
+            "b": "value for b",
+        }
+
+        compute.assert_called_once_with(["a", "b"])
+        assert flight.metrics()["computed"] == 2
+        assert cache.get(flight.lock_key("a")) is None
+
+    def test_run(self, flight):
+        assert flight.run("a", lambda: "value") == "value"
+
+    def test_waits_for_other_worker(self, flight, mocker):
+        cache.add(flight.lock_key("a"), True)
+        compute = mocker.Mock(side_effect=compute_and_cache)
+
+        def other_worker():
+            cache.set("a", "from other worker")
+            cache.delete(flight.lock_key("a"))
+
+        timer = threading.Timer(0.05, other_worker)
+        timer.start()
+        values = flight.run_many(["a", "b"], compute)
+        timer.join()
+
+        assert values == {"a": "from other worker", "b": "value for b"}
+        compute.assert_called_once_with(["b"])
+        metrics = flight.metrics()
+        assert metrics["coalesced"] == 1
+        assert metrics["computed"] == 1
+        assert metrics["seconds_waiting"] > 0
+
+    def test_computes_after_timeout(self, flight, mocker, settings):
+        settings.SINGLE_FLIGHT_WAIT_TIMEOUT = 0.05
+        cache.add(flight.lock_key("a"), True)
+        compute = mocker.Mock(side_effect=compute_and_cache)
+
+        assert flight.run("a", lambda: compute(["a"])["a"]) == "value for a"
+
+        compute.assert_called_once()
+        assert flight.metrics()["timed_out"] == 1
+
+    def test_stops_waiting_when_other_worker_fails(self, flight, settings):
+        settings.SINGLE_FLIGHT_WAIT_TIMEOUT = 10
+        cache.add(flight.lock_key("a"), True)
+        timer = threading.Timer(
+            0.05, lambda: cache.delete(flight.lock_key("a"))
+        )
+        timer.start()
+
+        assert flight.run("a", lambda: "value") == "value"
+        timer.join()
+        assert flight.metrics()["seconds_waiting"] < 10
+
+    def test_lock_released_on_error(self, flight):
+        def fail():
+            raise ValueError("Upstream is down")
+
+        with pytest.raises(ValueError):
+            flight.run("a", fail)
+
+        assert cache.get(flight.lock_key("a")) is None
+
+
+def test_status_check_metrics(client):
+    SingleFlight("status_check_test")
+
+    response = client.get(reverse("status_check_view"))
+
+    assert response.json()["single_flight"]["status_check_test"] == {
+        "computed": 0,
+        "coalesced": 0,
+        "timed_out": 0,
+        "seconds_waiting": 0.0,
+    }
+    assert "status_check_test" in single_flight_metrics()
@@ -0,0 +1,79 @@
+import pytest
+import requests
+from core.upstream import BudgetedRetry, RetryBudget, UpstreamHTTPClient
+from urllib3.exceptions import MaxRetryError
+
+
+@pytest.fixture
+def client():
+    return UpstreamHTTPClient(
+        connect_timeout=1, read_timeout=2, max_retries=2, backoff_factor=0
+    )
+
+
+class TestRetryBudget:
+    def test_withdraw_until_empty(self):
+        budget = RetryBudget(min_tokens=2)
+        assert budget.withdraw()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+    def test_deposits_refill_budget(self):
+        budget = RetryBudget(ratio=0.5, min_tokens=0)
+        assert not budget.withdraw()
+        budget.deposit()
+        budget.deposit()
+        assert budget.withdraw()
+
+    def test_deposits_are_capped(self):
+        budget = RetryBudget(ratio=5, min_tokens=0, max_tokens=1)
+        budget.deposit()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+
+class TestUpstreamHTTPClient:
+    def test_session_mounts_retrying_adapter(self, client):
+        adapter = client.session.get_adapter("https://example.com/")
+        assert isinstance(adapter.max_retries, BudgetedRetry)
+        assert adapter.max_retries.total == 2
+        assert adapter.max_retries.client is client
+
+    def test_default_timeout_applied(self, client, mocker):
+        request = mocker.patch.object(client.session, "request")
+        request.return_value.status_code = 200
+
+        client.get("https://example.com/foo/")
+        client.get("https://example.com/foo/", timeout=30)
+
+        assert request.call_args_list[0].kwargs["timeout"] == (1, 2)
+        assert request.call_args_list[1].kwargs["timeout"] == 30
+
+    def test_metrics_per_host(self, client, mocker):
+        request = mocker.patch.object(client.session, "request")
+        request.return_value.status_code = 200
+        client.get("https://example.com/foo/")
+        request.return_value.status_code = 503
+        client.get("https://example.com/bar/")
+        request.side_effect = requests.ConnectionError
+        with pytest.raises(requests.ConnectionError):
+            client.get("https://example.org/")
+
+        metrics = client.metrics()
+        assert metrics["example.com"]["requests"] == 2
+        assert metrics["example.com"]["errors"] == 1
+        assert metrics["example.org"]["requests"] == 1
+        assert metrics["example.org"]["errors"] == 1
+
+    def test_retry_spends_budget(self, client, mocker):
+        pool = mocker.Mock(host="example.com")
+        retry = client.retry
+        client.budget_for("example.com").tokens = 1
+
+        retry = retry.increment("GET", "/", error=None, _pool=pool)
+        assert client.metrics()["example.com"]["retries"] == 1
+        with pytest.raises(MaxRetryError):
+            retry.increment("GET", "/", error=None, _pool=pool)
+
+    def test_new_retry_keeps_client(self, client):
+        assert client.retry.new(total=1).client is client
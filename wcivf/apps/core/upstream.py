@@ -0,0 +1,171 @@
+"""
+A shared HTTP client for talking to our upstream APIs (EE, YNR, DevsDC and
+the public S3 buckets).
+
+Using a single `requests.Session` means connections to each host are kept
+alive and pooled rather than paying for a new TCP and TLS handshake on every
+call. Every request gets a connect and read timeout so a slow upstream can't
+pin a worker, and idempotent requests are retried with jittered backoff.
+
+Retries are limited per host by a `RetryBudget`: each request adds a fraction
+of a token and each retry spends a whole one. When an upstream is healthy
+this is never noticed, but during an outage it stops every worker from
+multiplying the load on it.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+
+class RetryBudget:
+    """
+    A token bucket shared by all requests to one host
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=3, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class BudgetedRetry(Retry):
+    """
+    A urllib3 `Retry` that also has to spend from the client's retry budget
+    for the host before each retry
+    """
+
+    def __init__(self, *args, client=None, **kwargs):
+        self.client = client
+        super().__init__(*args, **kwargs)
+
+    def new(self, **kw):
+        kw.setdefault("client", self.client)
+        return super().new(**kw)
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        # This raises MaxRetryError itself once the retry limit is reached
+        new_retry = super().increment(method, url, *args, **kwargs)
+        pool = kwargs.get("_pool")
+        if self.client is not None and pool is not None:
+            if not self.client.budget_for(pool.host).withdraw():
+                error = kwargs.get("error") or ResponseError(
+                    "retry budget exhausted"
+                )
+                raise MaxRetryError(pool, url, error)
+            self.client.record(pool.host, retries=1)
+        return new_retry
+
+
+class UpstreamHTTPClient:
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(
+        self,
+        connect_timeout=None,
+        read_timeout=None,
+        max_retries=None,
+        backoff_factor=None,
+        pool_maxsize=None,
+    ):
+        self.timeout = (
+            connect_timeout or settings.UPSTREAM_CONNECT_TIMEOUT,
+            read_timeout or settings.UPSTREAM_READ_TIMEOUT,
+        )
+        if max_retries is None:
+            max_retries = settings.UPSTREAM_MAX_RETRIES
+        if backoff_factor is None:
+            backoff_factor = settings.UPSTREAM_RETRY_BACKOFF
+        self.retry = BudgetedRetry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+            client=self,
+        )
+        self.pool_maxsize = pool_maxsize or settings.UPSTREAM_POOL_MAXSIZE
+        self.session = self.build_session()
+        self._budgets = {}
+        self._metrics = defaultdict(
+            lambda: {"requests": 0, "errors": 0, "retries": 0, "seconds": 0.0}
+        )
+        self._lock = threading.Lock()
+
+    def build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_maxsize,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.retry,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def budget_for(self, host):
+        with self._lock:
+            if host not in self._budgets:
+                self._budgets[host] = RetryBudget()
+            return self._budgets[host]
+
+    def record(self, host, **counts):
+        with self._lock:
+            host_metrics = self._metrics[host]
+            for name, value in counts.items():
+                host_metrics[name] += value
+
+    def metrics(self):
+        """
+        A snapshot of the per host counters since this process started
+        """
+        with self._lock:
+            return {
+                host: dict(values) for host, values in self._metrics.items()
+            }
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname
+        start = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.record(
+                host, requests=1, errors=1, seconds=time.monotonic() - start
+            )
+            raise
+        self.record(
+            host,
+            requests=1,
+            errors=int(response.status_code >= 500),
+            seconds=time.monotonic() - start,
+        )
+        self.budget_for(host).deposit()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+
+upstream_client = UpstreamHTTPClient()
@@ -1,9 +1,18 @@
 from django.db.models import Transform
 
 
+def last_word(name):
+    """
+    The last word of a name, used to sort people by surname when they don't
+    have a `sort_name`
+    """
+    return name.strip().split(" ")[-1]
+
+
 class LastWord(Transform):
     """
-    Split a field on space and get the last element
+    Split a field on space and get the last element. Only used by old
+    migrations: people are sorted on a stored `name_for_ordering` instead.
     """
 
     function = "LastWord"
@@ -8,7 +8,10 @@ from django.utils import timezone, translation
 from django.views.generic import FormView, TemplateView, View
 from elections.models import PostElection
 
+from .circuit_breaker import circuit_breaker_states
 from .forms import PostcodeLookupForm
+from .single_flight import single_flight_metrics
+from .upstream import upstream_client
 
 
 class TranslatedTemplateView(TemplateView):
@@ -71,7 +74,7 @@ class HomePageView(PostcodeFormView):
         if getattr(settings, "SHOW_UPCOMING_ELECTIONS", True):
             context[
                 "upcoming_elections"
-            ] = PostElection.objects.home_page_upcoming_ballots()
+            ] = PostElection.objects.cached_home_page_upcoming_ballots()
         polls_open = timezone.make_aware(
             datetime.datetime.strptime("2019-12-12 7", "%Y-%m-%d %H")
         )
@@ -123,4 +126,10 @@ class StatusCheckView(View):
             status = 200
             data["ready_to_serve"] = True
 
+        data["upstream"] = upstream_client.metrics()
+        data["single_flight"] = single_flight_metrics()
+        data["circuit_breakers"] = circuit_breaker_states()
+        if hasattr(settings.POSTCODE_LOGGER, "metrics"):
+            data["postcode_logger"] = settings.POSTCODE_LOGGER.metrics()
+
         return http.JsonResponse(data, status=status)
@@ -1,5 +1,18 @@
 POSTCODE_TO_BALLOT_KEY_FMT = "postcode_to_ballot_{}"
-PEOPLE_FOR_BALLOT_KEY_FMT = "people_for_ballot_{}_compact_{}"
+POSTCODE_TO_BALLOT_INVALIDATED_KEY = "postcode_to_ballot_invalidated_at"
+INVALID_LOOKUP_KEY_FMT = "invalid_lookup_{}"
+PEOPLE_FOR_BALLOT_KEY_FMT = "people_for_ballot_{}"
+# Candidate snapshots are versioned, so this only bounds how long changes
+# from importers that don't bump `PostElection.people_version` (parties,
+# manifestos and leaflets) take to show up
+PEOPLE_FOR_BALLOT_TIMEOUT = 60 * 60
+# The `{% cache %}` key for the candidate list in `_single_ballot.html`
+BALLOT_CANDIDATES_FRAGMENT_KEY_FMT = "template.cache.ballot_candidates.{}"
+# Keyed by date, so the list is rebuilt each day as ballots are held
+HOME_PAGE_UPCOMING_BALLOTS_KEY_FMT = "home_page_upcoming_ballots_{}"
+HOME_PAGE_UPCOMING_BALLOTS_TIMEOUT = 60 * 60 * 24
+ICAL_FEED_KEY_FMT = "ical_feed_{}"
+ICAL_FEEDS_INVALIDATED_KEY = "ical_feeds_invalidated_at"
 POLLING_STATIONS_KEY_FMT = "pollingstations_{}"
 
 UPDATED_SLUGS = {
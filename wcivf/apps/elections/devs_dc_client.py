@@ -1,8 +1,36 @@
+import logging
+import threading
+import time
 from json import JSONDecodeError
 from urllib.parse import urljoin
 
 import requests
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.helpers import is_valid_postcode
+from core.single_flight import SingleFlight
+from core.upstream import upstream_client
 from django.conf import settings
+from django.core.cache import cache
+from elections.constants import (
+    INVALID_LOOKUP_KEY_FMT,
+    POSTCODE_TO_BALLOT_INVALIDATED_KEY,
+    POSTCODE_TO_BALLOT_KEY_FMT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Coalesces concurrent lookups for the same uncached postcode or UPRN
+POSTCODE_LOOKUPS = SingleFlight("postcode_lookups")
+
+# Fails lookups fast while DevsDC is erroring or slow
+DEVS_DC_BREAKER = CircuitBreaker(
+    "devs_dc",
+    window=settings.DEVS_DC_BREAKER_WINDOW,
+    min_calls=settings.DEVS_DC_BREAKER_MIN_CALLS,
+    failure_rate=settings.DEVS_DC_BREAKER_FAILURE_RATE,
+    slow_call_seconds=settings.DEVS_DC_BREAKER_SLOW_CALL_SECONDS,
+    reset_timeout=settings.DEVS_DC_BREAKER_RESET_TIMEOUT,
+)
 
 
 class InvalidPostcodeError(Exception):
@@ -13,6 +41,12 @@ class InvalidUprnError(Exception):
     pass
 
 
+class DevsDCUnavailableError(Exception):
+    """
+    Raised without making a request while the circuit breaker is open
+    """
+
+
 class DevsDCAPIException(Exception):
     def __init__(self, response: requests.Response):
         try:
@@ -23,16 +57,187 @@ class DevsDCAPIException(Exception):
         self.response = response
 
 
+# The errors that mean DevsDC couldn't answer, rather than that it said the
+# postcode or UPRN is invalid
+UNAVAILABLE_ERRORS = (
+    DevsDCUnavailableError,
+    DevsDCAPIException,
+    requests.RequestException,
+)
+
+
+def purge_postcode_cache():
+    """
+    Marks every cached postcode and UPRN lookup as stale.
+
+    Entries aren't deleted: the next request for each postcode is still
+    answered from the cache while a single worker fetches a fresh copy.
+    """
+    cache.set(POSTCODE_TO_BALLOT_INVALIDATED_KEY, time.time(), timeout=None)
+
+
 class DevsDCClient:
-    def __init__(self, api_base=None, api_key=None):
+    # How long a worker may hold the lock used to refresh a stale entry
+    REFRESH_LOCK_TIMEOUT = 30
+
+    # The errors that are cached against `invalid_lookup_key`, by name
+    invalid_lookup_errors = {
+        error.__name__: error
+        for error in (InvalidPostcodeError, InvalidUprnError)
+    }
+
+    def __init__(self, api_base=None, api_key=None, cache_ttl=None):
         if not api_base:
             api_base = settings.DEVS_DC_BASE
         self.API_BASE = api_base
         if not api_key:
             api_key = settings.DEVS_DC_API_KEY
         self.API_KEY = api_key
+        if cache_ttl is None:
+            cache_ttl = getattr(settings, "DEVS_DC_CACHE_TTL", 0)
+        self.cache_ttl = cache_ttl
+        self.stale_ttl = getattr(settings, "DEVS_DC_CACHE_STALE_TTL", 0)
+        self.fallback_ttl = getattr(settings, "DEVS_DC_CACHE_FALLBACK_TTL", 0)
+        self.invalid_ttl = getattr(settings, "DEVS_DC_INVALID_CACHE_TTL", 0)
+
+    def cache_key(self, postcode, uprn=None, **extra_params):
+        """
+        Builds a cache key from everything that changes the response: the
+        postcode, the UPRN and any flags sent to the API
+        """
+        postcode = postcode.replace(" ", "").upper()
+        flags = "_".join(
+            f"{key}={value}" for key, value in sorted(extra_params.items())
+        )
+        return POSTCODE_TO_BALLOT_KEY_FMT.format(
+            f"{postcode}_{uprn or ''}_{flags}"
+        )
+
+    def fallback_key(self, key):
+        """
+        Where a copy of each entry is kept for `fallback_ttl`. It's separate
+        from `key`, so that workers waiting on `POSTCODE_LOOKUPS` for a new
+        copy aren't given the old one.
+        """
+        return f"{key}_fallback"
+
+    def invalid_lookup_key(self, postcode, uprn=None):
+        postcode = postcode.replace(" ", "").upper()
+        return INVALID_LOOKUP_KEY_FMT.format(f"{postcode}_{uprn or ''}")
 
     def make_request(self, postcode, uprn=None, **extra_params):
+        """
+        Returns the API response for a postcode or UPRN, using the cache
+        where possible.
+
+        Postcodes that aren't in a valid format, and postcodes or UPRNs that
+        the API has recently said are invalid, raise an error without a
+        request being made.
+
+        Fresh entries are returned directly. Stale entries (older than
+        `cache_ttl`, or fetched before the last call to
+        `purge_postcode_cache`) are returned as well, but one worker is
+        sent off to refresh them in the background.
+
+        Entries older than `cache_ttl + stale_ttl` are refetched, but a copy
+        is kept for `fallback_ttl` and returned if DevsDC is unavailable.
+        """
+        if not uprn and not is_valid_postcode(postcode):
+            logger.debug("Not looking up malformed postcode %r", postcode)
+            raise InvalidPostcodeError()
+
+        key = self.cache_key(postcode, uprn=uprn, **extra_params)
+        invalid_key = self.invalid_lookup_key(postcode, uprn=uprn)
+        cached = {}
+        if self.cache_ttl or self.invalid_ttl:
+            cached = cache.get_many(
+                [key, invalid_key, POSTCODE_TO_BALLOT_INVALIDATED_KEY]
+            )
+        if invalid_key in cached:
+            raise self.invalid_lookup_errors[cached[invalid_key]]()
+
+        if not self.cache_ttl:
+            return self.fetch_or_remember_invalid(postcode, uprn, extra_params)
+
+        entry = cached.get(key)
+        if entry is None:
+            try:
+                entry = POSTCODE_LOOKUPS.run(
+                    key,
+                    lambda: self.fetch_and_cache(
+                        key, postcode, uprn, extra_params
+                    ),
+                )
+            except UNAVAILABLE_ERRORS:
+                entry = cache.get(self.fallback_key(key))
+                if entry is None:
+                    raise
+                logger.warning(
+                    "DevsDC unavailable, serving old copy of %s", key
+                )
+            return entry["response"]
+
+        invalidated_at = cached.get(POSTCODE_TO_BALLOT_INVALIDATED_KEY) or 0
+        is_fresh = (
+            entry["fetched"] > invalidated_at
+            and time.time() - entry["fetched"] < self.cache_ttl
+        )
+        if not is_fresh:
+            self.revalidate(key, postcode, uprn, extra_params)
+        return entry["response"]
+
+    def fetch_or_remember_invalid(self, postcode, uprn, extra_params):
+        """
+        Calls `fetch`, caching invalid postcode and UPRN errors for
+        `invalid_ttl` seconds so repeated lookups don't reach the API
+        """
+        try:
+            return self.fetch(postcode, uprn=uprn, **extra_params)
+        except (InvalidPostcodeError, InvalidUprnError) as error:
+            if self.invalid_ttl:
+                cache.set(
+                    self.invalid_lookup_key(postcode, uprn=uprn),
+                    type(error).__name__,
+                    timeout=self.invalid_ttl,
+                )
+            raise
+
+    def fetch_and_cache(self, key, postcode, uprn, extra_params):
+        response = self.fetch_or_remember_invalid(postcode, uprn, extra_params)
+        entry = {"fetched": time.time(), "response": response}
+        cache.set(key, entry, timeout=self.cache_ttl + self.stale_ttl)
+        if self.fallback_ttl:
+            cache.set(self.fallback_key(key), entry, timeout=self.fallback_ttl)
+        return entry
+
+    def revalidate(self, key, postcode, uprn, extra_params):
+        """
+        Refresh a stale entry in a background thread, unless another worker
+        is already doing so
+        """
+        lock_key = f"{key}_refreshing"
+        if not cache.add(lock_key, True, timeout=self.REFRESH_LOCK_TIMEOUT):
+            return
+        thread = threading.Thread(
+            target=self.refresh,
+            args=(key, lock_key, postcode, uprn, extra_params),
+            daemon=True,
+        )
+        thread.start()
+
+    def refresh(self, key, lock_key, postcode, uprn, extra_params):
+        try:
+            self.fetch_and_cache(key, postcode, uprn, extra_params)
+        except DevsDCUnavailableError:
+            pass
+        except Exception:
+            # Keep serving the stale copy, it'll be retried on the next
+            # request once the lock has been released
+            logger.exception("Failed to refresh %s", key)
+        finally:
+            cache.delete(lock_key)
+
+    def fetch(self, postcode, uprn=None, **extra_params):
         base = urljoin(self.API_BASE, "/api/v1/")
         path = f"postcode/{postcode}/"
         if uprn:
@@ -42,7 +247,19 @@ class DevsDCClient:
         default_params = {"auth_token": self.API_KEY, "include_current": 1}
         if extra_params:
             default_params.update(**extra_params)
-        resp = requests.get(url, params=default_params)
+        try:
+            DEVS_DC_BREAKER.before_call()
+        except CircuitOpenError:
+            raise DevsDCUnavailableError()
+        start = time.monotonic()
+        resp = None
+        try:
+            resp = upstream_client.get(url, params=default_params)
+        finally:
+            DEVS_DC_BREAKER.record(
+                succeeded=resp is not None and resp.status_code < 500,
+                seconds=time.monotonic() - start,
+            )
         if path.startswith("postcode/") and resp.status_code == 400:
             raise InvalidPostcodeError()
         if path.startswith("address/") and resp.status_code == 404:
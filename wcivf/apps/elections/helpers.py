@@ -1,10 +1,16 @@
+import datetime
+import re
 import sys
-from functools import update_wrapper
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, update_wrapper
+from typing import NamedTuple, Optional
 
 import requests
+from core.upstream import upstream_client
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.functional import cached_property
 from django.utils.http import urlencode
 from uk_election_timetables.calendars import Country
@@ -13,6 +19,7 @@ from uk_election_timetables.election_ids import from_election_id
 
 class EEHelper:
     ee_cache = {}
+    SYNC_OVERLAP = datetime.timedelta(minutes=5)
 
     @property
     def base_elections_url(self):
@@ -48,6 +55,7 @@ class EEHelper:
         """
         from elections.models import (
             Election,
+            EveryElectionRecord,
             PostElection,
         )
 
@@ -59,28 +67,130 @@ class EEHelper:
             ballot_paper_id__in=self.deleted_election_ids,
         ).delete()
 
+        EveryElectionRecord.objects.filter(
+            election_id__in=self.deleted_election_ids
+        ).delete()
+
         return elections_count, post_elections_count
 
-    def prewarm_cache(self, current=False):
+    def save_records(self, results):
+        """
+        Saves EE's data for elections and ballots so they don't have to be
+        downloaded again by the next import
+        """
+        from elections.models import EveryElectionRecord
+
+        records = {
+            result["election_id"]: EveryElectionRecord(
+                election_id=result["election_id"],
+                data=result,
+                modified=parse_datetime(result.get("modified") or ""),
+                election_date=parse_date(result.get("poll_open_date") or ""),
+            )
+            for result in results
+        }
+        EveryElectionRecord.objects.bulk_create(
+            records.values(),
+            update_conflicts=True,
+            unique_fields=["election_id"],
+            update_fields=["data", "modified", "election_date"],
+        )
+
+    def sync_cache(self, full=False):
+        """
+        Fetches every election that has changed in EE since the last sync
+        that finished.
+
+        The first sync only fetches current elections, so it's quick enough
+        to run as part of an import. Other elections are fetched as they're
+        needed, or all at once by `sync_ee_elections --full`. Nothing is
+        recorded until every page has been saved, so an interrupted sync is
+        started again next time.
+        """
+        from elections.models import EveryElectionSync
+
+        started = timezone.now()
+        params = {}
+        if not full:
+            try:
+                last_sync = EveryElectionSync.objects.latest()
+                # Allow for the clocks here and on EE not quite agreeing
+                params["modified"] = (
+                    last_sync.started - self.SYNC_OVERLAP
+                ).isoformat()
+            except EveryElectionSync.DoesNotExist:
+                params["current"] = True
         page1 = self.base_elections_url
-        if current:
-            page1 = f"{page1}?current=True"
-        pages = JsonPaginator(page1, sys.stdout)
+        if params:
+            page1 = f"{page1}?{urlencode(params)}"
+        pages = PrefetchingJsonPaginator(page1, sys.stdout)
         for page in pages:
-            for result in page["results"]:
-                self.ee_cache[result["election_id"]] = result
+            self.save_records(page["results"])
+        EveryElectionSync.objects.create(started=started, full=full)
 
-    def get_data(self, election_id):
-        if election_id in self.ee_cache:
-            return self.ee_cache[election_id]
-        req = requests.get(f"{self.base_elections_url}{election_id}/")
-        if req.status_code == 200:
-            self.ee_cache[election_id] = req.json()
-            return self.ee_cache[election_id]
+    def prewarm_cache(self, current=False):
+        """
+        Syncs the saved EE data, then loads it into memory. With `current`,
+        only the elections and ballots on the same days as our current
+        ballots are loaded. EE's `current` flag isn't used for this, as
+        changes to it don't update the record's modified time.
+        """
+        from elections.models import EveryElectionRecord, PostElection
 
-        self.ee_cache[election_id] = None
+        self.sync_cache()
+        records = EveryElectionRecord.objects.all()
+        if current:
+            records = records.filter(
+                election_date__in=PostElection.objects.filter(
+                    election__current=True
+                ).values("election__election_date")
+            )
+        for election_id, data in records.values_list(
+            "election_id", "data"
+        ).iterator():
+            self.ee_cache[election_id] = data
+
+    def fetch(self, election_id):
+        req = upstream_client.get(f"{self.base_elections_url}{election_id}/")
+        if req.status_code == 200:
+            return req.json()
         return None
 
+    def get_many(self, election_ids):
+        """
+        Makes sure the EE data for each of `election_ids` is in the cache.
+        Any we don't have are read from the database in one query, and the
+        rest are fetched from EE several at a time.
+        """
+        from elections.models import EveryElectionRecord
+
+        missing = {
+            election_id
+            for election_id in election_ids
+            if election_id not in self.ee_cache
+        }
+        if not missing:
+            return
+        for election_id, data in EveryElectionRecord.objects.filter(
+            election_id__in=missing
+        ).values_list("election_id", "data"):
+            self.ee_cache[election_id] = data
+            missing.discard(election_id)
+        if not missing:
+            return
+
+        missing = sorted(missing)
+        with ThreadPoolExecutor(
+            max_workers=settings.IMPORT_PREFETCH_PAGES
+        ) as executor:
+            results = list(executor.map(self.fetch, missing))
+        self.ee_cache.update(zip(missing, results))
+        self.save_records([result for result in results if result])
+
+    def get_data(self, election_id):
+        self.get_many([election_id])
+        return self.ee_cache[election_id]
+
     def iter_recently_modified_election_ids(self):
         params = {
             "modified": timezone.datetime.now().date()
@@ -90,6 +200,7 @@ class EEHelper:
         url = f"{self.base_elections_url}?{querystring}"
         pages = JsonPaginator(page1=url, stdout=sys.stdout)
         for page in pages:
+            self.save_records(page["results"])
             for result in page["results"]:
                 self.ee_cache[result["election_id"]] = result
                 if result["group_type"] == "election":
@@ -98,20 +209,31 @@ class EEHelper:
 
 
 class JsonPaginator:
+    # Pages of results can be slow to build upstream, so allow longer
+    # than the default read timeout
+    READ_TIMEOUT = 60
+
     def __init__(self, page1, stdout):
         self.next_page = page1
         self.stdout = stdout
+        self.timeout = (settings.UPSTREAM_CONNECT_TIMEOUT, self.READ_TIMEOUT)
+
+    def fetch(self, url, quiet=False):
+        r = upstream_client.get(url, timeout=self.timeout)
+        if r.status_code != 200 and not quiet:
+            self.log_error(r)
+        r.raise_for_status()
+        return r.json()
+
+    def log_error(self, response):
+        self.stdout.write("crashing with response:")
+        self.stdout.write(response.text)
 
     def __iter__(self):
         while self.next_page:
             self.stdout.write(f"{self.next_page}\n")
 
-            r = requests.get(self.next_page)
-            if r.status_code != 200:
-                self.stdout.write("crashing with response:")
-                self.stdout.write(r.text)
-            r.raise_for_status()
-            data = r.json()
+            data = self.fetch(self.next_page)
 
             try:
                 self.next_page = data["next"]
@@ -123,6 +245,66 @@ class JsonPaginator:
         return
 
 
+class PrefetchingJsonPaginator(JsonPaginator):
+    """
+    A JsonPaginator that downloads the next pages on background threads
+    while the caller is still working on the current one.
+
+    API pages only link to the page after them, so one page is fetched
+    ahead. The files in YNR's cached-api are numbered in order, so up to
+    `pages_ahead` of those are fetched at once. Fetches past the last page
+    are thrown away. Errors are only logged for the pages that are used.
+    """
+
+    NUMBERED_PAGE_RE = re.compile(r"-(\d+)\.json$")
+
+    def __init__(self, page1, stdout, pages_ahead=None):
+        super().__init__(page1, stdout)
+        self.pages_ahead = pages_ahead or settings.IMPORT_PREFETCH_PAGES
+
+    def following_pages(self, url):
+        """
+        Returns the URLs of the pages that are likely to come after `url`
+        """
+        match = self.NUMBERED_PAGE_RE.search(url)
+        if not match:
+            return []
+        number = match.group(1)
+        return [
+            f"{url[: match.start(1)]}{int(number) + n:0{len(number)}d}.json"
+            for n in range(1, self.pages_ahead)
+        ]
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(
+            max_workers=self.pages_ahead, thread_name_prefix="paginator"
+        )
+        pending = {}
+        try:
+            url = self.next_page
+            while url:
+                for page_url in [url, *self.following_pages(url)]:
+                    if page_url not in pending:
+                        pending[page_url] = executor.submit(
+                            self.fetch, page_url, quiet=True
+                        )
+                self.stdout.write(f"{url}\n")
+                try:
+                    data = pending.pop(url).result()
+                except requests.HTTPError as error:
+                    self.log_error(error.response)
+                    raise
+                self.next_page = data.get("next")
+                if self.next_page and self.next_page not in pending:
+                    pending[self.next_page] = executor.submit(
+                        self.fetch, self.next_page, quiet=True
+                    )
+                yield data
+                url = self.next_page
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
 class ElectionIDSwitcher:
     def __init__(self, ballot_view, election_view, **initkwargs):
         self.election_id_kwarg = initkwargs.get("election_id_kwarg", "election")
@@ -157,19 +339,67 @@ class ElectionIDSwitcher:
         return view(request, *args, **kwargs)
 
 
+class ElectionTimetable(NamedTuple):
+    """
+    Every deadline for an election, worked out once by
+    `uk_election_timetables`
+    """
+
+    poll_date: datetime.date
+    country: Country
+    registration_deadline: datetime.date
+    postal_vote_application_deadline: datetime.date
+    vac_application_deadline: datetime.date
+    sopn_publish_date: Optional[datetime.date]
+
+    def get_date_for_event_type(self, event):
+        event_date = getattr(self, event.name.lower())
+        if event_date is None:
+            raise KeyError("event not found")
+        return event_date
+
+    def is_before(self, event, date=None):
+        if not date:
+            date = datetime.datetime.now(datetime.timezone.utc).date()
+        return self.get_date_for_event_type(event) >= date
+
+
+TERRITORY_TO_COUNTRY = {
+    "ENG": Country.ENGLAND,
+    "WLS": Country.WALES,
+    "SCT": Country.SCOTLAND,
+    "NIR": Country.NORTHERN_IRELAND,
+}
+
+# Timetables only depend on the election ID and territory, so entries never
+# need to expire
+ELECTION_TIMETABLE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=ELECTION_TIMETABLE_CACHE_SIZE)
 def get_election_timetable(slug, territory):
-    country = {
-        "ENG": Country.ENGLAND,
-        "WLS": Country.WALES,
-        "SCT": Country.SCOTLAND,
-        "NIR": Country.NORTHERN_IRELAND,
-    }
-
-    if slug.startswith("local") and territory not in country:
+    """
+    Returns an ElectionTimetable for the election ID and territory code, or
+    None if we can't work one out. Only local elections need a territory the
+    timetable library knows about.
+    """
+    if slug.startswith("local") and territory not in TERRITORY_TO_COUNTRY:
         return None
 
     try:
-        return from_election_id(slug, country[territory])
+        election = from_election_id(slug, TERRITORY_TO_COUNTRY.get(territory))
+        try:
+            sopn_publish_date = election.sopn_publish_date
+        except NotImplementedError:
+            sopn_publish_date = None
+        return ElectionTimetable(
+            poll_date=election.poll_date,
+            country=election.country,
+            registration_deadline=election.registration_deadline,
+            postal_vote_application_deadline=election.postal_vote_application_deadline,
+            vac_application_deadline=election.vac_application_deadline,
+            sopn_publish_date=sopn_publish_date,
+        )
 
-    except BaseException:
+    except Exception:
         return None
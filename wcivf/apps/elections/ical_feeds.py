@@ -0,0 +1,65 @@
+"""
+Caches the iCal feeds served by `PostcodeiCalView`.
+
+Calendar clients poll these feeds on a schedule, so each generated feed is
+cached per postcode and UPRN along with an ETag and Last-Modified time.
+Repeat polls are answered from the cache, or with a 304, without a DevsDC
+lookup or any database queries.
+
+Feeds are keyed by the current date, as past hustings drop out of them
+each day, and every cached feed is discarded by `purge_ical_feed_cache`
+when ballots or hustings change.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from elections.constants import ICAL_FEED_KEY_FMT, ICAL_FEEDS_INVALIDATED_KEY
+
+
+def purge_ical_feed_cache():
+    cache.set(ICAL_FEEDS_INVALIDATED_KEY, time.time(), timeout=None)
+
+
+def ical_feed_cache_key(postcode, uprn=None):
+    postcode = postcode.replace(" ", "").upper()
+    return ICAL_FEED_KEY_FMT.format(
+        f"{postcode}_{uprn or ''}_{timezone.now().date().isoformat()}"
+    )
+
+
+def get_cached_feed(key):
+    cached = cache.get_many([key, ICAL_FEEDS_INVALIDATED_KEY])
+    feed = cached.get(key)
+    if feed is None:
+        return None
+    if feed["generated"] <= (cached.get(ICAL_FEEDS_INVALIDATED_KEY) or 0):
+        return None
+    return feed
+
+
+def cache_feed(key, feed):
+    cache.set(key, feed, timeout=settings.ICAL_FEED_CACHE_TTL)
+
+
+def make_feed(body, *parts, modified=()):
+    """
+    Returns a feed dict for caching.
+
+    The ETag is a hash of `parts`, which should include the `modified`
+    timestamps of every ballot and husting in the feed, as well as anything
+    else from the feed that can change without those timestamps changing.
+    """
+    modified = [timestamp for timestamp in modified if timestamp]
+    etag = hashlib.md5(
+        "|".join(str(part) for part in parts).encode("utf-8")
+    ).hexdigest()
+    return {
+        "generated": time.time(),
+        "body": body,
+        "etag": f'"{etag}"',
+        "last_modified": int(max(modified).timestamp()) if modified else None,
+    }
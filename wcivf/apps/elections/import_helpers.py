@@ -1,13 +1,18 @@
 import contextlib
 import re
 import sys
+from collections import Counter, defaultdict
 from urllib.parse import urlencode
 
+from core.cdn import ballot_key, election_key, person_key, queue_purge
+from core.utils import last_word
 from django.conf import settings
 from django.core.validators import URLValidator
 from django.db import transaction
 from django.utils import timezone
-from elections.helpers import EEHelper, JsonPaginator
+from elections.devs_dc_client import purge_postcode_cache
+from elections.helpers import EEHelper, PrefetchingJsonPaginator
+from elections.ical_feeds import purge_ical_feed_cache
 from elections.models import Election, Post, PostElection, VotingSystem
 from parties.models import Party
 from people.models import Person, PersonPost
@@ -185,8 +190,37 @@ class YNRBallotImporter:
     posts, voting systems, and the person information that show's on a ballot.
     (name, candidacy data)
 
+    With `bulk_candidacies`, the candidacies on each page of ballots are
+    diffed against the ones we have and written with a handful of bulk
+    queries, rather than deleted and recreated one at a time.
+
     """
 
+    # PostElection and Post fields set from EE by import_metadata_from_ee
+    BALLOT_EE_FIELDS = [
+        "voting_system",
+        "metadata",
+        "requires_voter_id",
+        "cancellation_reason",
+        "by_election_reason",
+    ]
+    POST_EE_FIELDS = ["territory", "organization_type", "division_type"]
+
+    # PersonPost fields set from a YNR candidacy
+    CANDIDACY_FIELDS = [
+        "post_election_id",
+        "post_id",
+        "election_id",
+        "party_id",
+        "party_name",
+        "party_description_text",
+        "list_position",
+        "deselected",
+        "deselected_source",
+        "elected",
+        "votes_cast",
+    ]
+
     def __init__(
         self,
         force_update=False,
@@ -198,6 +232,7 @@ class YNRBallotImporter:
         base_url=None,
         api_key=None,
         default_params=None,
+        bulk_candidacies=False,
     ):
         self.stdout = stdout
         self.ee_helper = EEHelper()
@@ -212,10 +247,12 @@ class YNRBallotImporter:
         self.base_url = base_url or settings.YNR_BASE
         self.api_key = api_key or settings.YNR_API_KEY
         self.default_params = default_params or {"page_size": 200}
+        self.bulk_candidacies = bulk_candidacies
+        self.updated_ballot_count = 0
 
     @time_function_length
     def get_paginator(self, page1):
-        return JsonPaginator(page1, self.stdout)
+        return PrefetchingJsonPaginator(page1, self.stdout)
 
     @time_function_length
     def get_last_updated(self):
@@ -308,6 +345,12 @@ class YNRBallotImporter:
 
         self.delete_orphan_posts()
 
+        if self.updated_ballot_count:
+            # New or changed ballots can change the ballots DevsDC returns
+            # for a postcode, so make sure cached lookups get refreshed
+            purge_postcode_cache()
+            purge_ical_feed_cache()
+
     @time_function_length
     def delete_orphan_posts(self):
         """
@@ -331,9 +374,32 @@ class YNRBallotImporter:
         ).update(replaced_by_id=ballot.pk)
         return bool(updated)
 
+    def ee_ids_needed(self, ballot_dicts):
+        """
+        Returns the IDs of the elections and ballots that importing these
+        ballots will need EE's data for, so they can be loaded in one go
+        """
+        ids = set()
+        for ballot_dict in ballot_dicts:
+            election = ballot_dict["election"]
+            if (
+                election["election_id"]
+                not in self.election_importer.election_cache
+            ):
+                ids.add(election["election_id"])
+            if election["current"] or self.force_metadata:
+                ids.add(ballot_dict["ballot_paper_id"])
+        return ids
+
     @time_function_length
     @transaction.atomic()
     def add_ballots(self, results):
+        ballots_with_new_candidacies = []
+        bulk_candidacies = []
+        ballots_to_rank = []
+        metadata_changes = []
+        purge_keys = set()
+        self.ee_helper.get_many(self.ee_ids_needed(results["results"]))
         for ballot_dict in results["results"]:
             print(ballot_dict["ballot_paper_id"])
 
@@ -395,6 +461,9 @@ class YNRBallotImporter:
                 ballot_paper_id=ballot_dict["ballot_paper_id"],
                 defaults=defaults,
             )
+            self.updated_ballot_count += 1
+            purge_keys.add(ballot_key(ballot.ballot_paper_id))
+            purge_keys.add(election_key(election.slug))
 
             if self.recently_updated:
                 # we can do this as the older ballot will be known.
@@ -406,67 +475,310 @@ class YNRBallotImporter:
                 )
 
             if ballot.election.current or self.force_metadata:
-                self.import_metadata_from_ee(ballot)
+                metadata_changes.append(
+                    (ballot, *self.import_metadata_from_ee(ballot, save=False))
+                )
 
+            # The stored count is only recalculated after every ballot has
+            # been imported, so count new winners as they're added
+            has_winner = ballot.has_winner
             if not self.exclude_candidacies:
-                # Now set the nominations up for this ballot
-                # First, remove any old candidates, this is to flush out candidates
-                # that have changed. We just delete the `person_post`
-                # (`membership` in YNR), not the person profile.
-                ballot.personpost_set.all().delete()
-                for candidate in ballot_dict["candidacies"]:
-                    person, person_created = Person.objects.update_or_create(
-                        ynr_id=candidate["person"]["id"],
-                        defaults={"name": candidate["person"]["name"]},
-                    )
-                    result = candidate["result"] or {}
-                    # if we dont have a result, get the "elected" value from
-                    # the main candidacy data
-                    elected = result.get("elected", candidate["elected"])
-                    person_post = PersonPost.objects.create(
-                        post_election=ballot,
-                        person=person,
-                        party_id=candidate["party"]["legacy_slug"],
-                        party_name=candidate["party_name"],
-                        party_description_text=candidate[
-                            "party_description_text"
-                        ],
-                        list_position=candidate["party_list_position"],
-                        deselected=candidate.get("deselected", False),
-                        deselected_source=candidate.get("deselected_source"),
-                        elected=elected,
-                        votes_cast=result.get("num_ballots", None),
-                        post=ballot.post,
-                        election=ballot.election,
-                    )
-                    for party in candidate.get(
-                        "previous_party_affiliations", []
-                    ):
-                        # if the previous party affiliation is the
-                        # same as the party on the candidacy skip it
-                        party_id = party["legacy_slug"]
-                        if party_id == person_post.party_id:
-                            continue
-
-                        try:
-                            party = Party.objects.get(party_id=party_id)
-                        except Party.DoesNotExist:
-                            continue
-                        person_post.previous_party_affiliations.add(party)
+                candidacies = ballot_dict["candidacies"]
+                has_winner = any(
+                    self.candidacy_elected(candidate)
+                    for candidate in candidacies
+                )
+                if self.bulk_candidacies:
+                    # Written for the whole page at once, below
+                    bulk_candidacies.append((ballot, candidacies))
+                else:
+                    self.replace_candidacies(ballot, candidacies, purge_keys)
+                    ballots_with_new_candidacies.append(ballot.pk)
 
             # Calculate ranks for all candidates if this ballot has results
             if ballot_dict.get("results") and (
-                ballot.has_results_summary or ballot.has_winner
+                ballot.has_results_summary or has_winner
             ):
-                ballot.update_candidate_ranks()
+                ballots_to_rank.append(ballot)
 
             if created:
                 self.stdout.write(
                     "Added new ballot: {0}".format(ballot.ballot_paper_id)
                 )
 
-    def import_metadata_from_ee(self, ballot):
-        # First, grab the data from EE
+        if bulk_candidacies:
+            changed_ballot_ids, counts = self.upsert_candidacies(
+                bulk_candidacies, purge_keys
+            )
+            ballots_with_new_candidacies.extend(changed_ballot_ids)
+            self.stdout.write(
+                "Candidacies: {candidacies_inserted} inserted, "
+                "{candidacies_updated} updated, {candidacies_deleted} deleted. "
+                "People: {people_inserted} inserted, {people_updated} updated. "
+                "Previous party affiliations: {affiliations_inserted} "
+                "inserted, {affiliations_deleted} deleted\n".format_map(counts)
+            )
+
+        self.save_metadata(metadata_changes)
+
+        for ballot in ballots_to_rank:
+            ballot.update_candidate_ranks()
+
+        ballots = PostElection.objects.filter(
+            pk__in=ballots_with_new_candidacies
+        )
+        ballots.bump_people_version()
+        ballots.update_candidate_counts()
+        queue_purge(purge_keys)
+
+    def candidacy_elected(self, candidate):
+        # if we dont have a result, get the "elected" value from
+        # the main candidacy data
+        result = candidate["result"] or {}
+        return result.get("elected", candidate["elected"])
+
+    def replace_candidacies(self, ballot, candidacies, purge_keys):
+        """
+        Deletes the candidacies on a ballot and creates them again from
+        the YNR data, one at a time
+        """
+        # First, remove any old candidates, this is to flush out candidates
+        # that have changed. We just delete the `person_post`
+        # (`membership` in YNR), not the person profile.
+        purge_keys.update(
+            person_key(person_id)
+            for person_id in ballot.personpost_set.values_list(
+                "person_id", flat=True
+            )
+        )
+        ballot.personpost_set.all().delete()
+        for candidate in candidacies:
+            person, person_created = Person.objects.update_or_create(
+                ynr_id=candidate["person"]["id"],
+                defaults={"name": candidate["person"]["name"]},
+            )
+            purge_keys.add(person_key(person.ynr_id))
+            result = candidate["result"] or {}
+            person_post = PersonPost.objects.create(
+                post_election=ballot,
+                person=person,
+                party_id=candidate["party"]["legacy_slug"],
+                party_name=candidate["party_name"],
+                party_description_text=candidate["party_description_text"],
+                list_position=candidate["party_list_position"],
+                deselected=candidate.get("deselected", False),
+                deselected_source=candidate.get("deselected_source"),
+                elected=self.candidacy_elected(candidate),
+                votes_cast=result.get("num_ballots", None),
+                post=ballot.post,
+                election=ballot.election,
+            )
+            for party in candidate.get("previous_party_affiliations", []):
+                # if the previous party affiliation is the
+                # same as the party on the candidacy skip it
+                party_id = party["legacy_slug"]
+                if party_id == person_post.party_id:
+                    continue
+
+                try:
+                    party = Party.objects.get(party_id=party_id)
+                except Party.DoesNotExist:
+                    continue
+                person_post.previous_party_affiliations.add(party)
+
+    def upsert_people(self, candidacies, counts):
+        """
+        Creates any people we don't know about yet, and renames any whose
+        name has changed. Returns the IDs of the people that were written.
+        """
+        names = {
+            int(candidate["person"]["id"]): candidate["person"]["name"]
+            for candidate in candidacies
+        }
+        existing = {
+            ynr_id: (name, sort_name)
+            for ynr_id, name, sort_name in Person.objects.filter(
+                ynr_id__in=names
+            ).values_list("ynr_id", "name", "sort_name")
+        }
+        people = []
+        for ynr_id, name in names.items():
+            if ynr_id in existing:
+                old_name, sort_name = existing[ynr_id]
+                if name == old_name:
+                    continue
+                counts["people_updated"] += 1
+            else:
+                sort_name = None
+                counts["people_inserted"] += 1
+            # bulk_create doesn't call Person.save
+            people.append(
+                Person(
+                    ynr_id=ynr_id,
+                    name=name,
+                    name_for_ordering=sort_name or last_word(name),
+                )
+            )
+        Person.objects.bulk_create(
+            people,
+            update_conflicts=True,
+            unique_fields=["ynr_id"],
+            update_fields=["name", "name_for_ordering"],
+        )
+        return {person.ynr_id for person in people}
+
+    def upsert_candidacies(self, ballot_candidacies, purge_keys):
+        """
+        Brings the candidacies on a page of ballots in line with YNR in a
+        fixed number of queries. Rather than deleting and recreating every
+        candidacy, only rows that have changed are written.
+
+        Takes a list of (ballot, YNR candidacies) pairs. Returns the pks of
+        the ballots whose candidates changed, and counts of the rows
+        inserted, updated and deleted.
+        """
+        counts = Counter()
+        changed_person_ids = self.upsert_people(
+            [
+                candidate
+                for _, candidacies in ballot_candidacies
+                for candidate in candidacies
+            ],
+            counts,
+        )
+
+        person_posts = {}
+        previous_parties = {}
+        for ballot, candidacies in ballot_candidacies:
+            for candidate in candidacies:
+                key = (ballot.pk, int(candidate["person"]["id"]))
+                result = candidate["result"] or {}
+                person_posts[key] = PersonPost(
+                    post_election_id=ballot.pk,
+                    person_id=key[1],
+                    post_id=ballot.post_id,
+                    election_id=ballot.election_id,
+                    party_id=candidate["party"]["legacy_slug"],
+                    party_name=candidate["party_name"],
+                    party_description_text=candidate["party_description_text"],
+                    list_position=candidate["party_list_position"],
+                    deselected=candidate.get("deselected", False),
+                    deselected_source=candidate.get("deselected_source"),
+                    elected=self.candidacy_elected(candidate),
+                    votes_cast=result.get("num_ballots", None),
+                )
+                # if the previous party affiliation is the
+                # same as the party on the candidacy skip it
+                previous_parties[key] = {
+                    party["legacy_slug"]
+                    for party in candidate.get(
+                        "previous_party_affiliations", []
+                    )
+                } - {candidate["party"]["legacy_slug"]}
+
+        existing = {
+            (row["post_election_id"], row["person_id"]): row
+            for row in PersonPost.objects.filter(
+                post_election_id__in=[
+                    ballot.pk for ballot, _ in ballot_candidacies
+                ]
+            ).values("id", "person_id", *self.CANDIDACY_FIELDS)
+        }
+        changed = {key for key in existing if key not in person_posts}
+        PersonPost.objects.filter(
+            pk__in=[existing[key]["id"] for key in changed]
+        ).delete()
+        counts["candidacies_deleted"] = len(changed)
+
+        to_write = []
+        for key, person_post in person_posts.items():
+            row = existing.get(key)
+            if row is None:
+                counts["candidacies_inserted"] += 1
+            elif any(
+                getattr(person_post, field) != row[field]
+                for field in self.CANDIDACY_FIELDS
+            ):
+                counts["candidacies_updated"] += 1
+            else:
+                person_post.pk = row["id"]
+                continue
+            changed.add(key)
+            to_write.append(person_post)
+        # On PostgreSQL this sets the pk on each object, inserted or not
+        PersonPost.objects.bulk_create(
+            to_write,
+            update_conflicts=True,
+            unique_fields=["person", "post", "election"],
+            update_fields=self.CANDIDACY_FIELDS,
+        )
+
+        changed.update(
+            self.sync_previous_party_affiliations(
+                person_posts, previous_parties, counts
+            )
+        )
+        changed.update(
+            key for key in person_posts if key[1] in changed_person_ids
+        )
+        purge_keys.update(person_key(person_id) for _, person_id in changed)
+        return {ballot_id for ballot_id, _ in changed}, counts
+
+    def sync_previous_party_affiliations(
+        self, person_posts, previous_parties, counts
+    ):
+        """
+        Adds and removes previous party affiliations so they match
+        `previous_parties`. Returns the keys of the candidacies that changed.
+        """
+        Affiliation = PersonPost.previous_party_affiliations.through
+        known_parties = set(
+            Party.objects.filter(
+                party_id__in=set().union(*previous_parties.values())
+            ).values_list("party_id", flat=True)
+        )
+        keys = {
+            person_post.pk: key for key, person_post in person_posts.items()
+        }
+        wanted = {
+            (person_posts[key].pk, party_id)
+            for key, party_ids in previous_parties.items()
+            for party_id in party_ids & known_parties
+        }
+        existing = {
+            (personpost_id, party_id): pk
+            for pk, personpost_id, party_id in Affiliation.objects.filter(
+                personpost_id__in=keys
+            ).values_list("pk", "personpost_id", "party_id")
+        }
+
+        stale = existing.keys() - wanted
+        Affiliation.objects.filter(
+            pk__in=[existing[affiliation] for affiliation in stale]
+        ).delete()
+        missing = wanted - existing.keys()
+        Affiliation.objects.bulk_create(
+            [
+                Affiliation(personpost_id=personpost_id, party_id=party_id)
+                for personpost_id, party_id in missing
+            ]
+        )
+        counts["affiliations_deleted"] = len(stale)
+        counts["affiliations_inserted"] = len(missing)
+        return {keys[personpost_id] for personpost_id, _ in stale | missing}
+
+    def import_metadata_from_ee(self, ballot, save=True):
+        """
+        Sets the fields on the ballot and its post that come from EE.
+
+        Returns the names of the ballot fields and post fields that
+        changed. Unless `save` is False these are written straight away,
+        with at most one UPDATE each for the ballot and post.
+        """
+        before = {
+            "ballot": self.field_values(ballot, self.BALLOT_EE_FIELDS),
+            "post": self.field_values(ballot.post, self.POST_EE_FIELDS),
+        }
 
         self.set_territory(ballot)
         self.set_voting_system(ballot)
@@ -476,7 +788,48 @@ class YNRBallotImporter:
         self.set_by_election_reason(ballot)
         self.set_organisation_type(ballot)
         self.set_division_type(ballot)
-        ballot.save()
+
+        ballot_fields = self.changed_fields(
+            ballot, self.BALLOT_EE_FIELDS, before["ballot"]
+        )
+        post_fields = self.changed_fields(
+            ballot.post, self.POST_EE_FIELDS, before["post"]
+        )
+        if ballot_fields:
+            # bulk_update doesn't set this for us
+            ballot.modified = timezone.now()
+            ballot_fields.append("modified")
+        if save:
+            self.save_metadata([(ballot, ballot_fields, post_fields)])
+        return ballot_fields, post_fields
+
+    def field_values(self, obj, fields):
+        return {
+            field: getattr(obj, obj._meta.get_field(field).attname)
+            for field in fields
+        }
+
+    def changed_fields(self, obj, fields, before):
+        after = self.field_values(obj, fields)
+        return [field for field in fields if after[field] != before[field]]
+
+    def save_metadata(self, changes):
+        """
+        Writes the fields changed by `import_metadata_from_ee`. Takes a list
+        of (ballot, ballot fields, post fields), and makes one bulk_update
+        for each set of fields that changed together.
+        """
+        ballots = defaultdict(list)
+        posts = defaultdict(dict)
+        for ballot, ballot_fields, post_fields in changes:
+            if ballot_fields:
+                ballots[tuple(ballot_fields)].append(ballot)
+            if post_fields:
+                posts[tuple(post_fields)][ballot.post.pk] = ballot.post
+        for fields, objs in ballots.items():
+            PostElection.objects.bulk_update(objs, fields)
+        for fields, objs in posts.items():
+            Post.objects.bulk_update(objs.values(), fields)
 
     def set_territory(self, ballot):
         if ballot.post.territory and not self.force_update:
@@ -490,7 +843,6 @@ class YNRBallotImporter:
             territory = ee_data["division"].get("territory_code")
 
         ballot.post.territory = territory
-        ballot.post.save()
 
     def set_voting_system(self, ballot):
         if ballot.voting_system_id and not self.force_update:
@@ -506,7 +858,6 @@ class YNRBallotImporter:
                 self.voting_systems[voting_system_slug] = voting_system
 
             ballot.voting_system = self.voting_systems[voting_system_slug]
-            ballot.save()
 
     def set_metadata(self, ballot):
         ee_data = self.ee_helper.get_data(ballot.ballot_paper_id)
@@ -519,7 +870,6 @@ class YNRBallotImporter:
         ee_data = self.ee_helper.get_data(ballot.ballot_paper_id)
         if ee_data:
             ballot.requires_voter_id = ee_data["requires_voter_id"]
-            ballot.save()
 
     def set_cancellation_reason(self, ballot):
         if ballot.cancellation_reason and not self.force_update:
@@ -527,13 +877,11 @@ class YNRBallotImporter:
         ee_data = self.ee_helper.get_data(ballot.ballot_paper_id)
         if ee_data:
             ballot.cancellation_reason = ee_data["cancellation_reason"]
-            ballot.save()
 
     def set_by_election_reason(self, ballot):
         ee_data = self.ee_helper.get_data(ballot.ballot_paper_id)
         if ee_data:
             ballot.by_election_reason = ee_data["by_election_reason"]
-            ballot.save()
 
     def set_organisation_type(self, ballot):
         if ballot.post.organization_type and not self.force_update:
@@ -543,7 +891,6 @@ class YNRBallotImporter:
             ballot.post.organization_type = ee_data["organisation"][
                 "organisation_type"
             ]
-            ballot.post.save()
 
     def set_division_type(self, ballot):
         """
@@ -559,8 +906,13 @@ class YNRBallotImporter:
 
         ballot.post.division_type = ee_data["division"].get("division_type")
         # ensures the division_type is valid, or will raise a ValidationError
-        ballot.post.full_clean()
-        ballot.post.save()
+        ballot.post.clean_fields(
+            exclude=[
+                field.name
+                for field in Post._meta.fields
+                if field.name != "division_type"
+            ]
+        )
 
     def get_replacement_ballot(self, ballot_id):
         replacement_ballot = None
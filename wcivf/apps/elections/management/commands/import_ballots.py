@@ -43,6 +43,13 @@ class Command(BaseCommand):
             default=False,
             help="Ignore candidacies when importing ballots",
         )
+        parser.add_argument(
+            "--bulk-candidacies",
+            action="store_true",
+            dest="bulk_candidacies",
+            default=False,
+            help="Write the candidacies on each page of ballots in bulk",
+        )
 
     @time_function_length
     def populate_any_non_by_elections_field(self):
@@ -85,7 +92,9 @@ class Command(BaseCommand):
             force_metadata=options["force_metadata"],
             recently_updated=options["recently_updated"],
             exclude_candidacies=options["exclude_candidacies"],
+            bulk_candidacies=options["bulk_candidacies"],
         )
         importer.do_import()
         self.populate_any_non_by_elections_field()
         self.delete_deleted_elections()
+        PostElection.objects.cache_home_page_upcoming_ballots()
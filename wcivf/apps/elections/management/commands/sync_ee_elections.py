@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from elections.helpers import EEHelper
+
+
+class Command(BaseCommand):
+    help = (
+        "Saves the elections that have changed in EveryElection since the "
+        "last sync, or with --full, every election in EveryElection"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            dest="full",
+            default=False,
+            help="Fetch every election, not just the ones that have changed",
+        )
+
+    def handle(self, **options):
+        EEHelper().sync_cache(full=options["full"])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from elections.models import PostElection
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculates the candidate counts stored on each ballot, or with "
+        "--check, lists the ballots whose counts are wrong"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            dest="check",
+            default=False,
+            help="Report ballots with wrong counts without fixing them",
+        )
+
+    def handle(self, **options):
+        if not options["check"]:
+            count = PostElection.objects.update_candidate_counts()
+            self.stdout.write(f"Updated candidate counts for {count} ballots")
+            return
+
+        wrong = PostElection.objects.with_wrong_candidate_counts()
+        for ballot in wrong:
+            self.stdout.write(
+                f"{ballot.ballot_paper_id}: "
+                f"{ballot.candidate_count} candidates "
+                f"(actually {ballot.actual_candidate_count}), "
+                f"{ballot.party_count} parties "
+                f"(actually {ballot.actual_party_count}), "
+                f"{ballot.independent_count} independents "
+                f"(actually {ballot.actual_independent_count}), "
+                f"{ballot.elected_count} elected "
+                f"(actually {ballot.actual_elected_count})"
+            )
+        if wrong:
+            raise CommandError(
+                f"{len(wrong)} ballots have wrong candidate counts. "
+                "Run update_candidate_counts to fix them."
+            )
+        self.stdout.write("All candidate counts are correct")
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.15 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("elections", "0052_alter_postelection_by_election_reason"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="postelection",
+            name="people_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Bumped by the importers whenever the candidates change, so cached copies of them can be discarded",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.15 on 2026-10-18 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("elections", "0053_postelection_people_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="postelection",
+            name="candidate_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="postelection",
+            name="elected_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="postelection",
+            name="independent_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="postelection",
+            name="party_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Distinct parties, not counting independents",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.15 on 2026-10-18 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("elections", "0054_postelection_candidate_counts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EveryElectionRecord",
+            fields=[
+                (
+                    "election_id",
+                    models.CharField(
+                        max_length=255, primary_key=True, serialize=False
+                    ),
+                ),
+                ("data", models.JSONField()),
+                (
+                    "modified",
+                    models.DateTimeField(
+                        db_index=True,
+                        help_text="When the record last changed in EE",
+                        null=True,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.15 on 2026-10-18 22:20
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_date
+
+
+def set_election_dates(apps, schema_editor):
+    EveryElectionRecord = apps.get_model("elections", "EveryElectionRecord")
+    records = EveryElectionRecord.objects.using(schema_editor.connection.alias)
+    for record in records.iterator():
+        record.election_date = parse_date(
+            record.data.get("poll_open_date") or ""
+        )
+        record.save(update_fields=["election_date"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("elections", "0055_everyelectionrecord"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EveryElectionSync",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started", models.DateTimeField()),
+                ("finished", models.DateTimeField(auto_now_add=True)),
+                (
+                    "full",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Whether this sync fetched every election from EE",
+                    ),
+                ),
+            ],
+            options={
+                "get_latest_by": "started",
+            },
+        ),
+        migrations.AddField(
+            model_name="everyelectionrecord",
+            name="election_date",
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.RunPython(
+            code=set_election_dates, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -1,12 +1,24 @@
 import datetime
 import re
+from collections import Counter
 
 import pytz
+from django.apps import apps
 from django.conf import settings
 from django.contrib.humanize.templatetags.humanize import apnumber
+from django.core.cache import cache
 from django.db import models
-from django.db.models import DateTimeField, F, JSONField, Q, Window
-from django.db.models.functions import DenseRank, Greatest
+from django.db.models import (
+    Count,
+    DateTimeField,
+    F,
+    JSONField,
+    OuterRef,
+    Q,
+    Subquery,
+    Window,
+)
+from django.db.models.functions import Coalesce, DenseRank, Greatest
 from django.template.defaultfilters import pluralize
 from django.urls import reverse
 from django.utils import timezone
@@ -19,6 +31,10 @@ from uk_election_ids.metadata_tools import (
     PostalVotingRequirementsMatcher,
 )
 
+from .constants import (
+    HOME_PAGE_UPCOMING_BALLOTS_KEY_FMT,
+    HOME_PAGE_UPCOMING_BALLOTS_TIMEOUT,
+)
 from .helpers import get_election_timetable
 from .managers import ElectionManager
 
@@ -474,6 +490,43 @@ class Post(models.Model):
         return f"{self.label} {self.division_suffix}".strip()
 
 
+INDEPENDENT_PARTY_ID = "ynmp-party:2"
+
+
+def candidate_count_expressions():
+    """
+    Expressions that count each ballot's candidacies, keyed by the
+    `PostElection` fields that store them
+    """
+    candidacies = (
+        apps.get_model("people", "PersonPost")
+        .objects.filter(post_election=OuterRef("pk"))
+        .order_by()
+        .values("post_election")
+    )
+
+    def count(aggregate):
+        return Coalesce(
+            Subquery(candidacies.annotate(count=aggregate).values("count")),
+            0,
+        )
+
+    return {
+        "candidate_count": count(Count("pk")),
+        "party_count": count(
+            Count(
+                "party_id",
+                distinct=True,
+                filter=~Q(party_id=INDEPENDENT_PARTY_ID),
+            )
+        ),
+        "independent_count": count(
+            Count("pk", filter=Q(party_id=INDEPENDENT_PARTY_ID))
+        ),
+        "elected_count": count(Count("pk", filter=Q(elected=True))),
+    }
+
+
 class PostElectionQuerySet(models.QuerySet):
     def last_updated_in_ynr(self):
         """
@@ -499,6 +552,35 @@ class PostElectionQuerySet(models.QuerySet):
             .order_by("last_updated")
         )
 
+    def bump_people_version(self):
+        """
+        Marks any cached candidates for these ballots as out of date
+        """
+        return self.update(people_version=F("people_version") + 1)
+
+    def update_candidate_counts(self):
+        """
+        Recalculates the stored candidate counts for these ballots in a
+        single UPDATE. Call this after changing their candidacies.
+        """
+        return self.update(**candidate_count_expressions())
+
+    def with_wrong_candidate_counts(self):
+        """
+        Ballots whose stored candidate counts don't match their candidacies,
+        annotated with the correct counts as `actual_<field>`
+        """
+        expressions = candidate_count_expressions()
+        wrong = Q()
+        for field in expressions:
+            wrong |= ~Q(**{field: F(f"actual_{field}")})
+        return self.annotate(
+            **{
+                f"actual_{field}": expression
+                for field, expression in expressions.items()
+            }
+        ).filter(wrong)
+
     def home_page_upcoming_ballots(self):
         """
         Returns a queryset of ballots to show on the home page
@@ -525,6 +607,30 @@ class PostElectionQuerySet(models.QuerySet):
             )
         )
 
+    def cached_home_page_upcoming_ballots(self):
+        """
+        `home_page_upcoming_ballots` as a list, built once a day or whenever
+        `import_ballots` runs
+        """
+        key = HOME_PAGE_UPCOMING_BALLOTS_KEY_FMT.format(
+            datetime.date.today().isoformat()
+        )
+        ballots = cache.get(key)
+        if ballots is None:
+            ballots = self.cache_home_page_upcoming_ballots()
+        return ballots
+
+    def cache_home_page_upcoming_ballots(self):
+        ballots = list(self.home_page_upcoming_ballots())
+        cache.set(
+            HOME_PAGE_UPCOMING_BALLOTS_KEY_FMT.format(
+                datetime.date.today().isoformat()
+            ),
+            ballots,
+            timeout=HOME_PAGE_UPCOMING_BALLOTS_TIMEOUT,
+        )
+        return ballots
+
 
 class PostElection(TimeStampedModel):
     ballot_paper_id = models.CharField(blank=True, max_length=800, unique=True)
@@ -572,6 +678,19 @@ class PostElection(TimeStampedModel):
     turnout = models.IntegerField(blank=True, null=True)
     spoilt_ballots = models.IntegerField(blank=True, null=True)
     results_source_url = models.URLField(blank=True, null=True, max_length=800)
+    people_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped by the importers whenever the candidates change, "
+        "so cached copies of them can be discarded",
+    )
+    # Counts of the candidacies on this ballot, kept up to date by the
+    # importers with `update_candidate_counts`
+    candidate_count = models.PositiveIntegerField(default=0)
+    party_count = models.PositiveIntegerField(
+        default=0, help_text="Distinct parties, not counting independents"
+    )
+    independent_count = models.PositiveIntegerField(default=0)
+    elected_count = models.PositiveIntegerField(default=0)
 
     objects = PostElectionQuerySet.as_manager()
 
@@ -598,43 +717,52 @@ class PostElection(TimeStampedModel):
         """
         Returns a boolean for if the election has a winner
         """
-        return self.personpost_set.filter(elected=True).exists()
+        return self.elected_count > 0
 
     def update_candidate_ranks(self):
         """
-        Calculate ranks for all candidates on this ballot.
+        Calculate ranks for all candidates on this ballot, along with whether
+        each rank is tied and the number of candidates they're ranked among.
         This should be called when results are imported or updated.
         """
         if not self.has_results_summary:
             return
 
         # Get all candidates with calculated ranks
-        candidates = self.personpost_set.annotate(
-            new_rank=Window(
-                expression=DenseRank(), order_by=F("votes_cast").desc()
-            )
-        ).order_by("new_rank")
-        # Set the rank on each candidate
+        candidates = list(
+            self.personpost_set.annotate(
+                new_rank=Window(
+                    expression=DenseRank(), order_by=F("votes_cast").desc()
+                )
+            ).order_by("new_rank")
+        )
+        candidates_per_rank = Counter(
+            candidate.new_rank for candidate in candidates
+        )
         for candidate in candidates:
-            if candidate.rank != candidate.new_rank:
-                candidate.rank = candidate.new_rank
-                candidate.save()
+            candidate.rank = candidate.new_rank
+            candidate.rank_tied = candidates_per_rank[candidate.new_rank] > 1
+            candidate.ballot_candidate_count = len(candidates)
+        # Save them all in a single UPDATE
+        self.personpost_set.model.objects.bulk_update(
+            candidates, ["rank", "rank_tied", "ballot_candidate_count"]
+        )
+
+    @property
+    def timetable(self):
+        return get_election_timetable(self.ballot_paper_id, self.post.territory)
 
     @property
     def expected_sopn_date(self):
         try:
-            return get_election_timetable(
-                self.ballot_paper_id, self.post.territory
-            ).sopn_publish_date
-        except (AttributeError, NotImplementedError):
+            return self.timetable.sopn_publish_date
+        except AttributeError:
             return None
 
     @property
     def registration_deadline(self):
         try:
-            date = get_election_timetable(
-                self.ballot_paper_id, self.post.territory
-            ).registration_deadline
+            date = self.timetable.registration_deadline
         except AttributeError:
             return None
 
@@ -643,9 +771,7 @@ class PostElection(TimeStampedModel):
     @property
     def past_registration_deadline(self):
         try:
-            registration_deadline = get_election_timetable(
-                self.ballot_paper_id, self.post.territory
-            ).registration_deadline
+            registration_deadline = self.timetable.registration_deadline
         except AttributeError:
             return None
 
@@ -654,9 +780,7 @@ class PostElection(TimeStampedModel):
     @property
     def postal_vote_application_deadline(self):
         try:
-            date = get_election_timetable(
-                self.ballot_paper_id, self.post.territory
-            ).postal_vote_application_deadline
+            date = self.timetable.postal_vote_application_deadline
         except AttributeError:
             return None
 
@@ -665,9 +789,7 @@ class PostElection(TimeStampedModel):
     @property
     def past_vac_application_deadline(self):
         try:
-            vac_application_deadline = get_election_timetable(
-                self.ballot_paper_id, self.post.territory
-            ).vac_application_deadline
+            vac_application_deadline = self.timetable.vac_application_deadline
         except AttributeError:
             return None
 
@@ -676,9 +798,7 @@ class PostElection(TimeStampedModel):
     @property
     def vac_application_deadline(self):
         try:
-            return get_election_timetable(
-                self.ballot_paper_id, self.post.territory
-            ).vac_application_deadline
+            return self.timetable.vac_application_deadline
         except AttributeError:
             return None
 
@@ -911,17 +1031,10 @@ class PostElection(TimeStampedModel):
 
     @property
     def party_ballot_count(self):
-        if self.personpost_set.exists():
-            people = self.personpost_set
+        if self.candidate_count:
             if self.election.uses_lists:
-                ind_candidates = people.filter(party_id="ynmp-party:2").count()
-                num_other_parties = (
-                    people.exclude(party_id="ynmp-party:2")
-                    .values("party_id")
-                    .distinct()
-                    .count()
-                )
-                ind_and_parties = ind_candidates + num_other_parties
+                ind_candidates = self.independent_count
+                ind_and_parties = ind_candidates + self.party_count
                 ind_and_parties_apnumber = apnumber(ind_and_parties)
                 ind_and_parties_pluralized = pluralize(ind_and_parties)
                 value = f"{ind_and_parties_apnumber} parties"
@@ -929,13 +1042,28 @@ class PostElection(TimeStampedModel):
                     value = f"{value} or independent candidate{ind_and_parties_pluralized}"
                 return value
 
-            num_candidates = people.count()
+            num_candidates = self.candidate_count
             candidates_apnumber = apnumber(num_candidates)
             candidates_pluralized = pluralize(num_candidates)
             return f"{candidates_apnumber} candidate{candidates_pluralized}"
 
         return None
 
+    @property
+    def displayable_hustings(self):
+        """
+        The hustings to show on this ballot, using prefetched hustings
+        rather than querying again if there are any
+        """
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "husting_set" in prefetched:
+            return [
+                husting
+                for husting in prefetched["husting_set"]
+                if husting.is_displayable
+            ]
+        return self.husting_set.displayable()
+
     @property
     def should_display_sopn_info(self):
         """
@@ -1019,3 +1147,43 @@ class VotingSystem(models.Model):
             return _("Closed-List Proportional Representation")
 
         return None
+
+
+class EveryElectionRecord(models.Model):
+    """
+    A copy of an election or ballot from the EE API, kept between imports so
+    that each import only needs to fetch the ones that have changed since
+    the last sync. See `EEHelper.sync_cache`.
+    """
+
+    election_id = models.CharField(max_length=255, primary_key=True)
+    data = models.JSONField()
+    modified = models.DateTimeField(
+        null=True,
+        db_index=True,
+        help_text="When the record last changed in EE",
+    )
+    election_date = models.DateField(null=True, db_index=True)
+
+    def __str__(self):
+        return self.election_id
+
+
+class EveryElectionSync(models.Model):
+    """
+    A sync of `EveryElectionRecord` that finished without an error. The
+    next sync fetches the elections modified since the last one started.
+    """
+
+    started = models.DateTimeField()
+    finished = models.DateTimeField(auto_now_add=True)
+    full = models.BooleanField(
+        default=False,
+        help_text="Whether this sync fetched every election from EE",
+    )
+
+    class Meta:
+        get_latest_by = "started"
+
+    def __str__(self):
+        return f"Sync started at {self.started}"
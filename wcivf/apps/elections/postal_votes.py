@@ -1,24 +1,74 @@
+"""
+Dates councils send out postal voting packs, from the
+`data/<election date>_postal_votes.csv` files.
+
+Every file is read the first time it's needed and kept for the life of the
+process, indexed by (election date, council ID).
+"""
+
 import csv
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 from pathlib import Path
 
+from uk_election_timetables.calendars import Country
+
+DATA_DIR = Path(__file__).parent / "data"
+FILE_SUFFIX = "_postal_votes.csv"
+
+# Replacement packs can be issued from this date by every council for the
+# elections on the given date. We don't know this date for Scotland.
+# TODO: add this to the timetable library
+REPLACEMENT_PACK_START_DATES = {
+    date(2026, 5, 7): date(2026, 4, 30),
+}
+
+
+def parse_dispatch_dates(row):
+    try:
+        return tuple(
+            datetime.strptime(row[column], "%d/%m/%Y").date()
+            for column in ("Date 1", "Date 2", "Date 3")
+        )
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_dispatch_dates():
+    """
+    Returns a dict of (election date, council ID) to a tuple of the three
+    dispatch dates, or None if the council didn't give us any
+    """
+    dispatch_dates = {}
+    for path in sorted(DATA_DIR.glob(f"*{FILE_SUFFIX}")):
+        election_date = datetime.strptime(
+            path.name[: -len(FILE_SUFFIX)], "%Y%m%d"
+        ).date()
+        with open(path) as csvfile:
+            for row in csv.DictReader(csvfile):
+                dispatch_dates[
+                    (election_date, row["Reg"])
+                ] = parse_dispatch_dates(row)
+    return dispatch_dates
+
+
+@lru_cache(maxsize=None)
+def election_dates_with_dispatch_dates():
+    return frozenset(
+        election_date for election_date, _ in load_dispatch_dates()
+    )
+
+
+def has_postal_vote_dispatch_dates(election_date):
+    return election_date in election_dates_with_dispatch_dates()
+
+
+def get_postal_vote_dispatch_dates(election_date, council_id):
+    return load_dispatch_dates().get((election_date, council_id))
+
 
-def get_postal_vote_dispatch_dates(council_id):
-    with open(
-        Path(__file__).parent / "data" / "20260507_postal_votes.csv"
-    ) as csvfile:
-        reader = csv.DictReader(csvfile)
-        dispatch_dates = {row.pop("Reg"): row for row in list(reader)}
-
-        if council_id not in dispatch_dates:
-            return None
-
-        try:
-            row = dispatch_dates[council_id]
-            return [
-                datetime.strptime(row["Date 1"], "%d/%m/%Y").date(),
-                datetime.strptime(row["Date 2"], "%d/%m/%Y").date(),
-                datetime.strptime(row["Date 3"], "%d/%m/%Y").date(),
-            ]
-        except ValueError:
-            return None
+def get_replacement_pack_start(election_date, country):
+    if country == Country.SCOTLAND:
+        return None
+    return REPLACEMENT_PACK_START_DATES.get(election_date)
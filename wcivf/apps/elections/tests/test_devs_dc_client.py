@@ -0,0 +1,328 @@
+import threading
+import time
+
+import pytest
+import requests
+from django.core.cache import cache
+from elections.devs_dc_client import (
+    DEVS_DC_BREAKER,
+    POSTCODE_LOOKUPS,
+    DevsDCAPIException,
+    DevsDCClient,
+    DevsDCUnavailableError,
+    InvalidPostcodeError,
+    InvalidUprnError,
+    purge_postcode_cache,
+)
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def mock_get(mocker):
+    response = mocker.MagicMock(status_code=200)
+    response.json.return_value = {"address_picker": False, "dates": []}
+    return mocker.patch(
+        "elections.devs_dc_client.upstream_client.get", return_value=response
+    )
+
+
+@pytest.mark.usefixtures("locmem_cache")
+class TestDevsDCClientCache:
+    @pytest.fixture
+    def client(self, mocker):
+        client = DevsDCClient(
+            api_base="https://example.com", api_key="foo", cache_ttl=60
+        )
+        mocker.patch.object(client, "revalidate")
+        return client
+
+    def test_cache_key_normalises_postcode(self, client):
+        assert client.cache_key("sw1a 1aa") == client.cache_key("SW1A1AA")
+        assert client.cache_key("SW1A1AA") != client.cache_key(
+            "SW1A1AA", uprn="123"
+        )
+        assert client.cache_key(
+            "SW1A1AA", include_boundary_reviews=1
+        ) != client.cache_key("SW1A1AA")
+
+    def test_second_lookup_served_from_cache(self, client, mock_get):
+        first = client.make_request("SW1A1AA")
+        second = client.make_request("SW1A 1AA")
+
+        assert first == second
+        mock_get.assert_called_once()
+        client.revalidate.assert_not_called()
+
+    def test_stale_entry_served_and_revalidated(
+        self, client, mock_get, freezer
+    ):
+        client.make_request("SW1A1AA")
+        freezer.tick(61)
+
+        assert client.make_request("SW1A1AA") == {
+            "address_picker": False,
+            "dates": [],
+        }
+        mock_get.assert_called_once()
+        client.revalidate.assert_called_once()
+
+    def test_purge_marks_entries_stale(self, client, mock_get, freezer):
+        client.make_request("SW1A1AA")
+        freezer.tick(1)
+        purge_postcode_cache()
+        freezer.tick(1)
+
+        client.make_request("SW1A1AA")
+        client.revalidate.assert_called_once()
+
+    def test_errors_are_not_cached(self, client, mock_get):
+        mock_get.return_value.status_code = 500
+        for _ in range(2):
+            with pytest.raises(DevsDCAPIException):
+                client.make_request("SW1A1AA")
+        assert mock_get.call_count == 2
+
+    def test_invalid_postcodes_are_cached(self, client, mock_get):
+        mock_get.return_value.status_code = 400
+        for postcode in ("SW1A1AA", "sw1a 1aa"):
+            with pytest.raises(InvalidPostcodeError):
+                client.make_request(postcode)
+        mock_get.assert_called_once()
+
+    def test_invalid_uprns_are_cached(self, client, mock_get):
+        mock_get.return_value.status_code = 404
+        for _ in range(2):
+            with pytest.raises(InvalidUprnError):
+                client.make_request("SW1A1AA", uprn="123")
+        mock_get.assert_called_once()
+
+        # Other UPRNs in the postcode are still looked up
+        mock_get.return_value.status_code = 200
+        client.make_request("SW1A1AA", uprn="456")
+        assert mock_get.call_count == 2
+
+    def test_invalid_postcodes_cached_without_ttl(self, mock_get, settings):
+        settings.DEVS_DC_INVALID_CACHE_TTL = 60
+        client = DevsDCClient(
+            api_base="https://example.com", api_key="foo", cache_ttl=0
+        )
+        mock_get.return_value.status_code = 400
+        for _ in range(2):
+            with pytest.raises(InvalidPostcodeError):
+                client.make_request("SW1A1AA")
+        mock_get.assert_called_once()
+
+    def test_invalid_postcodes_expire(self, client, mock_get, freezer):
+        mock_get.return_value.status_code = 400
+        with pytest.raises(InvalidPostcodeError):
+            client.make_request("SW1A1AA")
+        freezer.tick(client.invalid_ttl + 1)
+        mock_get.return_value.status_code = 200
+
+        client.make_request("SW1A1AA")
+        assert mock_get.call_count == 2
+
+    @pytest.mark.parametrize(
+        "postcode", ["", "not a postcode", "SW1A", "12345", "QQ1 1AA"]
+    )
+    def test_malformed_postcodes_not_looked_up(
+        self, client, mock_get, postcode
+    ):
+        with pytest.raises(InvalidPostcodeError):
+            client.make_request(postcode)
+        mock_get.assert_not_called()
+
+    def test_expired_entry_refetched(self, client, mock_get, freezer):
+        client.make_request("SW1A1AA")
+        freezer.tick(client.cache_ttl + client.stale_ttl + 1)
+
+        client.make_request("SW1A1AA")
+        assert mock_get.call_count == 2
+        client.revalidate.assert_not_called()
+
+    def test_expired_entry_served_when_unavailable(
+        self, client, mock_get, freezer
+    ):
+        client.make_request("SW1A1AA")
+        freezer.tick(client.cache_ttl + client.stale_ttl + 1)
+        mock_get.return_value.status_code = 500
+
+        assert client.make_request("SW1A1AA") == {
+            "address_picker": False,
+            "dates": [],
+        }
+
+    def test_unavailable_without_cached_entry(self, client, mock_get):
+        mock_get.side_effect = requests.ConnectionError
+        with pytest.raises(requests.ConnectionError):
+            client.make_request("SW1A1AA")
+
+    def test_no_ttl_disables_cache(self, mock_get):
+        client = DevsDCClient(
+            api_base="https://example.com", api_key="foo", cache_ttl=0
+        )
+        client.make_request("SW1A1AA")
+        client.make_request("SW1A1AA")
+        assert mock_get.call_count == 2
+
+
+@pytest.mark.usefixtures("locmem_cache")
+def test_concurrent_lookups_coalesced(mocker, settings):
+    settings.SINGLE_FLIGHT_WAIT_TIMEOUT = 5
+    client = DevsDCClient(
+        api_base="https://example.com", api_key="foo", cache_ttl=60
+    )
+    started = threading.Event()
+    finish = threading.Event()
+    response = mocker.MagicMock(status_code=200)
+    response.json.return_value = {"address_picker": False, "dates": []}
+
+    def slow_get(*args, **kwargs):
+        started.set()
+        finish.wait(5)
+        return response
+
+    mock_get = mocker.patch(
+        "elections.devs_dc_client.upstream_client.get", side_effect=slow_get
+    )
+    coalesced = POSTCODE_LOOKUPS.metrics()["coalesced"]
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(client.make_request("SW1A1AA"))
+    )
+    first.start()
+    assert started.wait(5)
+
+    second = threading.Thread(
+        target=lambda: results.append(client.make_request("SW1A 1AA"))
+    )
+    second.start()
+    # Give the second lookup time to find the first one in flight
+    time.sleep(0.1)
+    finish.set()
+    first.join()
+    second.join()
+
+    assert results == [response.json.return_value] * 2
+    mock_get.assert_called_once()
+    assert POSTCODE_LOOKUPS.metrics()["coalesced"] == coalesced + 1
+
+
+@pytest.mark.usefixtures("locmem_cache")
+def test_waiting_lookups_not_given_expired_entry(mocker, settings, freezer):
+    settings.SINGLE_FLIGHT_WAIT_TIMEOUT = 5
+    settings.DEVS_DC_CACHE_FALLBACK_TTL = 60 * 60 * 24
+    client = DevsDCClient(
+        api_base="https://example.com", api_key="foo", cache_ttl=60
+    )
+    old = mocker.MagicMock(status_code=200)
+    old.json.return_value = {"address_picker": False, "dates": ["old"]}
+    mock_get = mocker.patch(
+        "elections.devs_dc_client.upstream_client.get", return_value=old
+    )
+    client.make_request("SW1A1AA")
+    freezer.tick(client.cache_ttl + client.stale_ttl + 1)
+
+    started = threading.Event()
+    finish = threading.Event()
+    new = mocker.MagicMock(status_code=200)
+    new.json.return_value = {"address_picker": False, "dates": ["new"]}
+
+    def slow_get(*args, **kwargs):
+        started.set()
+        finish.wait(5)
+        return new
+
+    mock_get.side_effect = slow_get
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(client.make_request("SW1A1AA"))
+    )
+    first.start()
+    assert started.wait(5)
+
+    second = threading.Thread(
+        target=lambda: results.append(client.make_request("SW1A1AA"))
+    )
+    second.start()
+    time.sleep(0.1)
+    finish.set()
+    first.join()
+    second.join()
+
+    assert results == [new.json.return_value] * 2
+    assert mock_get.call_count == 2
+
+
+class TestDevsDCClientCircuitBreaker:
+    @pytest.fixture
+    def client(self):
+        return DevsDCClient(
+            api_base="https://example.com", api_key="foo", cache_ttl=0
+        )
+
+    def test_fails_fast_while_open(self, client, mock_get):
+        DEVS_DC_BREAKER.open()
+
+        with pytest.raises(DevsDCUnavailableError):
+            client.make_request("SW1A1AA")
+        mock_get.assert_not_called()
+
+    def test_server_errors_open_breaker(self, client, mock_get):
+        mock_get.return_value.status_code = 500
+        for _ in range(DEVS_DC_BREAKER.min_calls):
+            with pytest.raises(DevsDCAPIException):
+                client.make_request("SW1A1AA")
+
+        assert DEVS_DC_BREAKER.is_open
+
+    def test_invalid_postcodes_dont_open_breaker(self, client, mock_get):
+        mock_get.return_value.status_code = 400
+        for _ in range(DEVS_DC_BREAKER.min_calls):
+            with pytest.raises(InvalidPostcodeError):
+                client.make_request("SW1A1AA")
+
+        assert not DEVS_DC_BREAKER.is_open
+
+    def test_connection_errors_open_breaker(self, client, mock_get):
+        mock_get.side_effect = requests.ConnectionError
+        for _ in range(DEVS_DC_BREAKER.min_calls):
+            with pytest.raises(requests.ConnectionError):
+                client.make_request("SW1A1AA")
+
+        assert DEVS_DC_BREAKER.is_open
+
+
+@pytest.mark.usefixtures("locmem_cache")
+class TestDevsDCClientRevalidate:
+    def test_only_one_worker_refreshes(self, mocker):
+        client = DevsDCClient(api_base="https://example.com", api_key="foo")
+        thread = mocker.patch("elections.devs_dc_client.threading.Thread")
+
+        client.revalidate("key", "SW1A1AA", None, {})
+        client.revalidate("key", "SW1A1AA", None, {})
+
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+    def test_refresh_releases_lock_on_error(self, mocker):
+        client = DevsDCClient(api_base="https://example.com", api_key="foo")
+        mocker.patch.object(
+            client, "fetch_and_cache", side_effect=InvalidPostcodeError
+        )
+        cache.set("key_refreshing", True)
+
+        client.refresh("key", "key_refreshing", "SW1A1AA", None, {})
+
+        assert cache.get("key_refreshing") is None
@@ -5,10 +5,12 @@ from random import shuffle
 import factory
 import pytest
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.shortcuts import reverse
 from django.test import TestCase
-from django.test.utils import override_settings
-from elections.models import ByElectionReason, Post
+from django.test.utils import CaptureQueriesContext, override_settings
+from elections.models import ByElectionReason, Post, PostElection
 from elections.tests.factories import (
     ElectionFactory,
     ElectionFactoryLazySlug,
@@ -18,7 +20,9 @@ from elections.tests.factories import (
 )
 from elections.views import PostView
 from elections.views.mixins import PostelectionsToPeopleMixin
-from parties.tests.factories import PartyFactory
+from freezegun import freeze_time
+from hustings.models import Husting
+from parties.tests.factories import LocalPartyFactory, PartyFactory
 from people.tests.factories import (
     PersonFactory,
     PersonPostFactory,
@@ -727,6 +731,155 @@ class TestPostElectionView(TestCase):
         self.assertNotContains(response, "Ballot Papers Issued")
 
 
+@override_settings(
+    STORAGES=TEST_STORAGES_DICT,
+    PIPELINE_ENABLED=False,
+)
+class TestPostViewConditionalGet(TestCase):
+    def setUp(self):
+        self.post_election = PostElectionFactory(
+            election__election_date="2017-03-23"
+        )
+        self.url = self.post_election.get_absolute_url()
+        # ElectionIDSwitcher looks up the ballot, then one for the validators
+        self.num_queries = 2
+
+    def test_etag_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        with self.assertNumQueries(self.num_queries):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.url)
+        last_modified = response["Last-Modified"]
+
+        with self.assertNumQueries(self.num_queries):
+            response = self.client.get(
+                self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_candidates_change_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        PostElection.objects.filter(
+            pk=self.post_election.pk
+        ).bump_people_version()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_validators_expire(self):
+        with freeze_time("2017-03-01 10:00"):
+            etag = self.client.get(self.url)["ETag"]
+        with freeze_time("2017-03-01 11:00"):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_ballot(self):
+        response = self.client.get(
+            "/elections/local.foo.bar.2017-03-23/", HTTP_IF_NONE_MATCH="*"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_last_modified_from_related_objects(self):
+        def add_related(day):
+            with freeze_time(f"2017-03-{day:02d} 10:00"):
+                Husting.objects.create(
+                    post_election=self.post_election,
+                    title="Hustings",
+                    starts=f"2017-03-{day:02d} 19:00Z",
+                )
+                LocalPartyFactory(post_election=self.post_election)
+                PersonPostFactory(
+                    post_election=self.post_election,
+                    election=self.post_election.election,
+                    person__ynr_id=day,
+                )
+
+        PostElection.objects.filter(pk=self.post_election.pk).update(
+            modified="2017-03-01T09:00Z"
+        )
+        add_related(1)
+        add_related(5)
+        view = PostView(kwargs={"election": self.post_election.ballot_paper_id})
+        with freeze_time("2017-03-09 10:00"):
+            Husting.objects.create(
+                post_election=self.post_election,
+                title="Later hustings",
+                starts="2017-03-20 19:00Z",
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            version, last_modified = view.get_validators()
+
+        # The related tables are in separate subqueries, not joined
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN "hustings_husting"', queries[0]["sql"])
+        self.assertNotIn('JOIN "parties_localparty"', queries[0]["sql"])
+
+        self.assertEqual(
+            last_modified,
+            datetime.datetime(2017, 3, 9, 10, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(version[0], self.post_election.people_version)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "candidate-fragment-tests",
+        }
+    }
+)
+class TestCandidateFragmentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.post_election = PostElectionFactory(
+            election__election_date="2017-03-23"
+        )
+        self.person_post = PersonPostWithPartyFactory(
+            post_election=self.post_election,
+            election=self.post_election.election,
+            person__name="Jane Adams",
+        )
+        self.url = self.post_election.get_absolute_url()
+
+    def test_candidates_rendered_once(self):
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(
+            response, "elections/includes/_person_card.html"
+        )
+        assertContains(response, "Jane Adams")
+
+        response = self.client.get(self.url)
+        self.assertTemplateNotUsed(
+            response, "elections/includes/_person_card.html"
+        )
+        assertContains(response, "Jane Adams")
+
+    def test_rerendered_when_people_version_bumped(self):
+        self.client.get(self.url)
+        self.person_post.person.name = "Jane Baker"
+        self.person_post.person.save()
+        PostElection.objects.filter(
+            pk=self.post_election.pk
+        ).bump_people_version()
+
+        response = self.client.get(self.url)
+
+        assertContains(response, "Jane Baker")
+        assertNotContains(response, "Jane Adams")
+
+
 class TestPostElectionsToPeopleMixin(TestCase):
     def test_people_for_ballot_ordered_alphabetically(self):
         people = [
@@ -755,12 +908,10 @@ class TestPostElectionsToPeopleMixin(TestCase):
 class TestPostelectionsToPeopleMixin(TestCase):
     # should be updated as more queries are added
     PERSON_POST_QUERY = 1
-    PLEDGE_QUERY = 1
     LEAFLET_QUERY = 1
     PREVIOUS_PARTY_AFFILIATIONS_QUERY = 1
     ALL_QUERIES = [
         PERSON_POST_QUERY,
-        PLEDGE_QUERY,
         LEAFLET_QUERY,
         PREVIOUS_PARTY_AFFILIATIONS_QUERY,
     ]
@@ -791,7 +942,7 @@ class TestPostelectionsToPeopleMixin(TestCase):
             for candidate in queryset:
                 party_ids = [
                     party.party_id
-                    for party in candidate.previous_party_affiliations.all()
+                    for party in candidate.previous_party_affiliations
                 ]
                 previous_parties += party_ids
 
@@ -799,19 +950,31 @@ class TestPostelectionsToPeopleMixin(TestCase):
             self.assertEqual(len(candidates), 10)
             self.assertEqual(len(previous_parties), 10 * 10)
 
-    def test_num_queries_using_compact(self):
-        """
-        Test when using compact number of queries is one less
-        """
-        all_queries_without_pledge = self.ALL_QUERIES.copy()
-        all_queries_without_pledge.remove(self.PLEDGE_QUERY)
-        with self.assertNumQueries(sum(all_queries_without_pledge)):
-            queryset = self.mixin.people_for_ballot(
-                self.post_election, compact=True
-            )
-            # resolve queryset to execute the queries
-            candidates = list(queryset)
-            self.assertEqual(len(candidates), 10)
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "people-for-ballot-tests",
+            }
+        }
+    )
+    def test_cached_until_people_version_bumped(self):
+        cache.clear()
+        candidates = self.mixin.people_for_ballot(self.post_election)
+        self.assertEqual(len(candidates), 10)
+
+        with self.assertNumQueries(0):
+            cached = self.mixin.people_for_ballot(self.post_election)
+        self.assertEqual(cached, candidates)
+
+        self.candidates[0].delete()
+        PostElection.objects.filter(
+            pk=self.post_election.pk
+        ).bump_people_version()
+        self.post_election.refresh_from_db(fields=["people_version"])
+        with self.assertNumQueries(sum(self.ALL_QUERIES)):
+            candidates = self.mixin.people_for_ballot(self.post_election)
+        self.assertEqual(len(candidates), 9)
 
 
 class TestUpdateCandidateRanks(TestCase):
@@ -836,14 +999,16 @@ class TestUpdateCandidateRanks(TestCase):
             votes_cast=100,
         )
 
-        post_election.update_candidate_ranks()
+        # One query to rank the candidates and one to save them
+        with self.assertNumQueries(2):
+            post_election.update_candidate_ranks()
 
         ranks = list(
             post_election.personpost_set.values_list(
-                "rank", flat=True
+                "rank", "rank_tied", "ballot_candidate_count"
             ).order_by("rank")
         )
-        assert ranks == [1, 2, 3]
+        assert ranks == [(1, False, 3), (2, False, 3), (3, False, 3)]
 
     def test_update_candidate_ranks_without_results(self):
         """
@@ -1,24 +1,40 @@
+import json
 import sys
+import threading
+from collections import Counter
 from datetime import date
+from io import StringIO
 
 import pytest
+import requests
+from core.cdn import person_key
 from django.conf import settings
 from django.test import TestCase
 from django.utils import timezone
 from elections.helpers import (
     EEHelper,
     JsonPaginator,
+    PrefetchingJsonPaginator,
     get_election_timetable,
 )
 from elections.import_helpers import YNRBallotImporter, YNRPostImporter
-from elections.models import Election, Post, PostElection
+from elections.models import (
+    Election,
+    EveryElectionRecord,
+    EveryElectionSync,
+    Post,
+    PostElection,
+)
 from elections.tests.factories import (
     ElectionFactory,
     PostElectionFactory,
     PostFactory,
 )
 from parties.models import Party
+from parties.tests.factories import PartyFactory
 from people.models import PersonPost
+from people.tests.factories import PersonFactory, PersonPostFactory
+from uk_election_timetables.election import TimetableEvent
 
 
 class GetElectionTimetable(TestCase):
@@ -37,6 +53,12 @@ class GetElectionTimetable(TestCase):
 
         assert expected is None
 
+    def test_with_territory_code_unknown_not_local(self):
+        expected = get_election_timetable("parl.2024-07-04", "-")
+
+        assert expected.registration_deadline == date(2024, 6, 18)
+        assert expected.country is None
+
     def test_with_territory_code_unambiguous_election_type(self):
         expected = get_election_timetable("nia.belfast-east.2017-03-02", "NIR")
 
@@ -47,6 +69,139 @@ class GetElectionTimetable(TestCase):
 
         assert expected is None
 
+    def test_memoized(self):
+        get_election_timetable.cache_clear()
+        first = get_election_timetable("local.2019-05-02", "ENG")
+        second = get_election_timetable("local.2019-05-02", "ENG")
+
+        assert first is second
+        assert get_election_timetable.cache_info().hits == 1
+        assert get_election_timetable("local.2019-05-02", "SCT") is not first
+
+    def test_all_deadlines(self):
+        expected = get_election_timetable("local.2019-05-02", "ENG")
+
+        assert expected.registration_deadline == date(2019, 4, 12)
+        assert expected.postal_vote_application_deadline == date(2019, 4, 15)
+        assert expected.vac_application_deadline == date(2019, 4, 24)
+        assert expected.sopn_publish_date == date(2019, 4, 3)
+
+    def test_is_before(self):
+        timetable = get_election_timetable("local.2019-05-02", "ENG")
+        event = TimetableEvent.REGISTRATION_DEADLINE
+
+        assert timetable.is_before(event, date=date(2019, 4, 12))
+        assert not timetable.is_before(event, date=date(2019, 4, 13))
+
+
+class TestPrefetchingJsonPaginator:
+    def fake_fetch(self, pages, fetched):
+        def fetch(url, quiet=False):
+            fetched.append(url)
+            if url not in pages:
+                raise ValueError(f"404 for {url}")
+            return pages[url]
+
+        return fetch
+
+    def test_follows_next(self, mocker):
+        pages = {
+            "https://example.com/api/?page=1": {
+                "results": [1],
+                "next": "https://example.com/api/?page=2",
+            },
+            "https://example.com/api/?page=2": {"results": [2], "next": None},
+        }
+        fetched = []
+        paginator = PrefetchingJsonPaginator(
+            "https://example.com/api/?page=1", mocker.Mock(), pages_ahead=4
+        )
+        mocker.patch.object(
+            paginator, "fetch", side_effect=self.fake_fetch(pages, fetched)
+        )
+
+        assert [page["results"] for page in paginator] == [[1], [2]]
+        assert fetched == list(pages)
+
+    def test_fetches_numbered_pages_ahead(self, mocker):
+        base = "https://example.com/media/cached-api/latest/ballots-{:06d}.json"
+        pages = {
+            base.format(n): {
+                "results": [n],
+                "next": base.format(n + 1) if n < 3 else None,
+            }
+            for n in range(1, 4)
+        }
+        fetched = []
+        paginator = PrefetchingJsonPaginator(
+            base.format(1), mocker.Mock(), pages_ahead=3
+        )
+        mocker.patch.object(
+            paginator, "fetch", side_effect=self.fake_fetch(pages, fetched)
+        )
+
+        iterator = iter(paginator)
+        assert next(iterator)["results"] == [1]
+        # The next two pages were requested before the first was used
+        assert sorted(fetched[:3]) == [base.format(n) for n in range(1, 4)]
+
+        # Failed fetches for pages past the end don't stop the import
+        assert [page["results"] for page in iterator] == [[2], [3]]
+
+    def test_errors_raised(self, mocker):
+        paginator = PrefetchingJsonPaginator(
+            "https://example.com/api/", mocker.Mock()
+        )
+        mocker.patch.object(
+            paginator, "fetch", side_effect=self.fake_fetch({}, [])
+        )
+
+        with pytest.raises(ValueError):
+            list(paginator)
+
+    def fake_get(self, pages, mocker, not_found=None):
+        def get(url, **kwargs):
+            if url not in pages and not_found:
+                not_found.set()
+            response = requests.Response()
+            response.url = url
+            response.status_code = 200 if url in pages else 404
+            response._content = json.dumps(pages.get(url, {})).encode()
+            return response
+
+        return mocker.patch(
+            "elections.helpers.upstream_client.get", side_effect=get
+        )
+
+    def test_pages_past_the_end_not_logged(self, mocker):
+        base = "https://example.com/media/cached-api/latest/ballots-{:06d}.json"
+        pages = {
+            base.format(1): {"results": [1], "next": base.format(2)},
+            base.format(2): {"results": [2], "next": None},
+        }
+        not_found = threading.Event()
+        self.fake_get(pages, mocker, not_found)
+        stdout = StringIO()
+        paginator = PrefetchingJsonPaginator(
+            base.format(1), stdout, pages_ahead=4
+        )
+
+        pages = iter(paginator)
+        assert next(pages)["results"] == [1]
+        # Pages 3 and 4 were requested along with the first one
+        assert not_found.wait(5)
+        assert [page["results"] for page in pages] == [[2]]
+        assert "crashing" not in stdout.getvalue()
+
+    def test_errors_logged_when_used(self, mocker):
+        self.fake_get({}, mocker)
+        stdout = StringIO()
+        paginator = PrefetchingJsonPaginator("https://example.com/api/", stdout)
+
+        with pytest.raises(requests.HTTPError):
+            list(paginator)
+        assert "crashing with response:" in stdout.getvalue()
+
 
 class TestEEHelper:
     @pytest.fixture
@@ -116,6 +271,158 @@ class TestEEHelper:
         postelection_filter.return_value.delete.assert_called_once()
 
 
+@pytest.mark.django_db
+class TestEEHelperCache:
+    @pytest.fixture(autouse=True)
+    def ee_helper(self, settings, mocker):
+        settings.EE_BASE = "https://elections.democracyclub.org.uk"
+        mocker.patch.dict(EEHelper.ee_cache, clear=True)
+        return EEHelper()
+
+    def election(self, election_id, modified=None, current=True):
+        return {
+            "election_id": election_id,
+            "current": current,
+            "modified": modified,
+            "poll_open_date": election_id.rsplit(".", 1)[-1],
+        }
+
+    def mock_paginator(self, mocker, pages):
+        return mocker.patch(
+            "elections.helpers.PrefetchingJsonPaginator",
+            return_value=pages,
+        )
+
+    def test_first_sync_fetches_current_elections(self, ee_helper, mocker):
+        paginator = self.mock_paginator(mocker, [])
+
+        ee_helper.sync_cache()
+
+        paginator.assert_called_once_with(
+            "https://elections.democracyclub.org.uk/api/elections/"
+            "?current=True",
+            sys.stdout,
+        )
+        assert EveryElectionSync.objects.get().full is False
+
+    def test_full_sync_fetches_every_election(self, ee_helper, mocker):
+        EveryElectionSync.objects.create(started="2021-05-01T12:00:00Z")
+        paginator = self.mock_paginator(mocker, [])
+
+        ee_helper.sync_cache(full=True)
+
+        paginator.assert_called_once_with(
+            "https://elections.democracyclub.org.uk/api/elections/",
+            sys.stdout,
+        )
+        assert EveryElectionSync.objects.latest().full is True
+
+    @pytest.mark.freeze_time("2021-05-03T12:00:00Z")
+    def test_sync_cache(self, ee_helper, mocker):
+        EveryElectionSync.objects.create(started="2021-05-01T12:00:00Z")
+        EveryElectionRecord.objects.create(
+            election_id="local.2021-05-06",
+            data={},
+            # Newer than the last sync, but that doesn't matter
+            modified="2021-05-02T12:00:00Z",
+        )
+        paginator = self.mock_paginator(
+            mocker,
+            [
+                {
+                    "results": [
+                        self.election(
+                            "local.2021-05-06", "2021-05-02T12:30:00Z"
+                        ),
+                        self.election("parl.2021-05-06"),
+                    ]
+                }
+            ],
+        )
+
+        ee_helper.sync_cache()
+
+        paginator.assert_called_once_with(
+            "https://elections.democracyclub.org.uk/api/elections/"
+            "?modified=2021-05-01T11%3A55%3A00%2B00%3A00",
+            sys.stdout,
+        )
+        records = EveryElectionRecord.objects.order_by("election_id")
+        assert [record.election_id for record in records] == [
+            "local.2021-05-06",
+            "parl.2021-05-06",
+        ]
+        assert records[0].data["modified"] == "2021-05-02T12:30:00Z"
+        assert records[0].election_date == date(2021, 5, 6)
+        assert records[1].modified is None
+        assert EveryElectionSync.objects.latest().started == timezone.now()
+
+    def test_interrupted_sync_keeps_watermark(self, ee_helper, mocker):
+        EveryElectionSync.objects.create(started="2021-05-01T12:00:00Z")
+
+        def pages():
+            yield {"results": [self.election("local.2021-05-06")]}
+            raise ConnectionError
+
+        self.mock_paginator(mocker, pages())
+
+        with pytest.raises(ConnectionError):
+            ee_helper.sync_cache()
+
+        # The saved page is kept, but the next sync starts from the same place
+        assert EveryElectionRecord.objects.filter(
+            election_id="local.2021-05-06"
+        ).exists()
+        assert EveryElectionSync.objects.count() == 1
+
+    def test_prewarm_cache_current(self, ee_helper, mocker):
+        mocker.patch.object(ee_helper, "sync_cache")
+        PostElectionFactory(election__election_date=date(2021, 5, 6))
+        PostElectionFactory(
+            election__slug="local.2019-05-02",
+            election__election_date=date(2019, 5, 2),
+            election__current=False,
+            post__ynr_id="post-2",
+        )
+        for election_id in ["local.2021-05-06", "local.2019-05-02"]:
+            EveryElectionRecord.objects.create(
+                election_id=election_id,
+                # EE's current flag is out of date for the first election
+                data=self.election(election_id, current=False),
+                election_date=election_id.rsplit(".", 1)[-1],
+            )
+
+        ee_helper.prewarm_cache(current=True)
+
+        ee_helper.sync_cache.assert_called_once()
+        assert list(ee_helper.ee_cache) == ["local.2021-05-06"]
+
+    def test_get_many(self, ee_helper, mocker):
+        EveryElectionRecord.objects.create(
+            election_id="saved", data=self.election("saved")
+        )
+        mocker.patch.object(
+            ee_helper,
+            "fetch",
+            side_effect=lambda election_id: (
+                self.election(election_id) if election_id == "new" else None
+            ),
+        )
+
+        ee_helper.get_many(["saved", "new", "unknown"])
+
+        assert ee_helper.fetch.call_count == 2
+        assert ee_helper.ee_cache["saved"]["election_id"] == "saved"
+        assert ee_helper.ee_cache["new"]["election_id"] == "new"
+        assert ee_helper.ee_cache["unknown"] is None
+        assert EveryElectionRecord.objects.filter(election_id="new").exists()
+
+        # Everything is in memory now
+        ee_helper.fetch.reset_mock()
+        assert ee_helper.get_data("new")["election_id"] == "new"
+        ee_helper.fetch.assert_not_called()
+
+
 class TestYNRBallotImporter:
     @pytest.fixture
     def importer(self, mocker):
@@ -307,6 +614,32 @@ class TestYNRBallotImporter:
                 expected = f"{settings.YNR_BASE}{case['url']}"
                 assert importer.import_url == expected
 
+    def test_ee_ids_needed(self, importer):
+        importer.election_importer.election_cache["local.2021-05-06"] = None
+        ballot_dicts = [
+            {
+                "ballot_paper_id": "local.sheffield.fulwood.2021-05-06",
+                "election": {
+                    "election_id": "local.2021-05-06",
+                    "current": True,
+                },
+            },
+            {
+                "ballot_paper_id": "parl.romsey.2010-05-06",
+                "election": {
+                    "election_id": "parl.2010-05-06",
+                    "current": False,
+                },
+            },
+        ]
+
+        assert importer.ee_ids_needed(ballot_dicts) == {
+            "local.sheffield.fulwood.2021-05-06",
+            "parl.2010-05-06",
+        }
+        importer.force_metadata = True
+        assert "parl.romsey.2010-05-06" in importer.ee_ids_needed(ballot_dicts)
+
     def test_add_replaced_ballot(self, importer, mocker, subtests):
         ballot = mocker.Mock()
         test_cases = [
@@ -385,7 +718,10 @@ class TestYNRImporterAddBallots:
             return_value=post,
         )
         mocker.patch.object(importer, "add_replaced_ballot")
-        mocker.patch.object(importer, "import_metadata_from_ee")
+        mocker.patch.object(
+            importer, "import_metadata_from_ee", return_value=([], [])
+        )
+        mocker.patch.object(importer, "ee_ids_needed", return_value=set())
         mocker.patch.object(
             PostElection.objects,
             "update_or_create",
@@ -551,9 +887,18 @@ class TestYNRImporterAddBallots:
         )
         party = mocker.MagicMock(spec=Party)
         mocker.patch.object(Party.objects, "get", return_value=party)
+        ballot.pk = 1
+        bump = mocker.patch(
+            "elections.models.PostElectionQuerySet.bump_people_version"
+        )
+        update_counts = mocker.patch(
+            "elections.models.PostElectionQuerySet.update_candidate_counts"
+        )
         importer.add_ballots(results=results)
 
         ballot.personpost_set.all.return_value.delete.assert_called_once()
+        bump.assert_called_once()
+        update_counts.assert_called_once()
 
         PersonPost.objects.create.assert_called_once()
         Party.objects.get.assert_called_once_with(party_id="ynmp-party:2")
@@ -651,6 +996,163 @@ class TestYNRImporterAddBallots:
         )
 
 
+@pytest.mark.django_db
+class TestYNRImporterBulkCandidacies:
+    @pytest.fixture
+    def ballot(self):
+        return PostElectionFactory()
+
+    @pytest.fixture
+    def parties(self):
+        return (
+            PartyFactory(party_id="party:53", party_name="Labour Party"),
+            PartyFactory(party_id="ynmp-party:2", party_name="Independent"),
+        )
+
+    def candidacy(self, person_id, name, party_id="party:53", **kwargs):
+        return {
+            "person": {"id": person_id, "name": name},
+            "result": None,
+            "elected": None,
+            "party_list_position": None,
+            "party": {"legacy_slug": party_id},
+            "party_name": "Labour Party",
+            "party_description_text": "",
+            "previous_party_affiliations": [],
+            **kwargs,
+        }
+
+    def test_upsert_candidacies(self, ballot, parties):
+        kept = PersonPostFactory(
+            post_election=ballot,
+            post=ballot.post,
+            election=ballot.election,
+            person=PersonFactory(ynr_id=1, name="Kept Person"),
+            party=parties[0],
+            party_name="Labour Party",
+            party_description_text="",
+        )
+        PersonPostFactory(
+            post_election=ballot,
+            post=ballot.post,
+            election=ballot.election,
+            person=PersonFactory(ynr_id=2, name="Withdrawn Person"),
+            party=parties[0],
+        )
+        PersonFactory(ynr_id=3, name="Changed Name", sort_name="Name")
+        candidacies = [
+            self.candidacy(1, "Kept Person"),
+            self.candidacy(
+                3,
+                "Changed Person",
+                previous_party_affiliations=[
+                    {"legacy_slug": "ynmp-party:2"},
+                    {"legacy_slug": "party:53"},
+                    {"legacy_slug": "party:unknown"},
+                ],
+            ),
+            self.candidacy(4, "New Person", party_list_position=1),
+        ]
+        importer = YNRBallotImporter(bulk_candidacies=True)
+        purge_keys = set()
+
+        changed_ballot_ids, counts = importer.upsert_candidacies(
+            [(ballot, candidacies)], purge_keys
+        )
+
+        assert changed_ballot_ids == {ballot.pk}
+        assert counts == Counter(
+            people_inserted=1,
+            people_updated=1,
+            candidacies_inserted=2,
+            candidacies_deleted=1,
+            affiliations_inserted=1,
+        )
+        assert purge_keys == {person_key(2), person_key(3), person_key(4)}
+        person_posts = ballot.personpost_set.order_by("person_id")
+        assert [pp.person_id for pp in person_posts] == [1, 3, 4]
+        # Unchanged candidacies aren't recreated
+        assert person_posts[0].pk == kept.pk
+        assert person_posts[1].person.name == "Changed Person"
+        assert person_posts[1].person.name_for_ordering == "Name"
+        assert person_posts[2].person.name_for_ordering == "Person"
+        assert person_posts[2].list_position == 1
+        assert list(person_posts[1].previous_party_affiliations.all()) == [
+            parties[1]
+        ]
+
+    def test_upsert_candidacies_unchanged(self, ballot, parties):
+        candidacies = [
+            self.candidacy(
+                1,
+                "Joe Bloggs",
+                previous_party_affiliations=[{"legacy_slug": "ynmp-party:2"}],
+            ),
+            self.candidacy(2, "Jane Bloggs", elected=True),
+        ]
+        importer = YNRBallotImporter(bulk_candidacies=True)
+        importer.upsert_candidacies([(ballot, candidacies)], set())
+        candidacies[1]["result"] = {"elected": False, "num_ballots": 10}
+        purge_keys = set()
+
+        changed_ballot_ids, counts = importer.upsert_candidacies(
+            [(ballot, candidacies)], purge_keys
+        )
+
+        assert changed_ballot_ids == {ballot.pk}
+        assert sum(counts.values()) == 1
+        assert counts["candidacies_updated"] == 1
+        assert purge_keys == {person_key(2)}
+        person_post = ballot.personpost_set.get(person_id=2)
+        assert person_post.elected is False
+        assert person_post.votes_cast == 10
+
+        changed_ballot_ids, counts = importer.upsert_candidacies(
+            [(ballot, candidacies)], set()
+        )
+        assert changed_ballot_ids == set()
+        assert sum(counts.values()) == 0
+
+    def test_add_ballots_bulk_candidacies(self, ballot, parties, mocker):
+        ballot_dict = {
+            "ballot_paper_id": ballot.ballot_paper_id,
+            "winner_count": 1,
+            "cancelled": False,
+            "candidates_locked": False,
+            "candidacies": [self.candidacy(1, "Joe Bloggs", elected=True)],
+            "results": None,
+        }
+        importer = YNRBallotImporter(bulk_candidacies=True)
+        mocker.patch.object(
+            importer.election_importer,
+            "update_or_create_from_ballot_dict",
+            return_value=ballot.election,
+        )
+        mocker.patch.object(
+            importer.post_importer,
+            "update_or_create_from_ballot_dict",
+            return_value=ballot.post,
+        )
+        mocker.patch.object(
+            importer, "import_metadata_from_ee", return_value=([], [])
+        )
+        mocker.patch.object(importer, "ee_ids_needed", return_value=set())
+        mocker.patch.object(importer, "stdout")
+
+        importer.add_ballots({"results": [ballot_dict]})
+
+        ballot.refresh_from_db()
+        assert ballot.personpost_set.get().person.name == "Joe Bloggs"
+        assert ballot.people_version == 1
+        assert ballot.candidate_count == 1
+        assert ballot.elected_count == 1
+        importer.stdout.write.assert_called_with(
+            "Candidacies: 1 inserted, 0 updated, 0 deleted. "
+            "People: 1 inserted, 0 updated. "
+            "Previous party affiliations: 0 inserted, 0 deleted\n"
+        )
+
+
 class TestYNRBallotImporterDivisionType:
     @pytest.fixture(autouse=True)
     def mock_ee_helper(self, mocker):
@@ -699,13 +1201,96 @@ class TestYNRBallotImporterDivisionType:
         importer = YNRBallotImporter(force_update=True)
         division = {"division": {"division_type": "NEW"}}
         mocker.patch.object(EEHelper, "get_data", return_value=division)
-        mocker.patch.object(ballot.post, "full_clean")
+        mocker.patch.object(ballot.post, "clean_fields")
 
         assert importer.set_division_type(ballot=ballot) is None
         assert ballot.post.division_type == "NEW"
         EEHelper.get_data.assert_called_once_with(ballot.ballot_paper_id)
-        ballot.post.full_clean.assert_called_once()
-        ballot.post.save.assert_called_once()
+        ballot.post.clean_fields.assert_called_once()
+        # Saved by import_metadata_from_ee
+        ballot.post.save.assert_not_called()
+
+
+@pytest.mark.django_db
+class TestYNRBallotImporterMetadata:
+    @pytest.fixture
+    def ee_data(self):
+        return {
+            "division": {"territory_code": "ENG", "division_type": "DIW"},
+            "organisation": {"organisation_type": "local-authority"},
+            "voting_system": {"slug": "FPTP", "name": "First past the post"},
+            "metadata": None,
+            "requires_voter_id": "EA-2022",
+            "cancellation_reason": None,
+            "by_election_reason": "",
+        }
+
+    @pytest.fixture
+    def importer(self, ee_data, mocker):
+        importer = YNRBallotImporter()
+        mocker.patch.object(
+            importer.ee_helper, "get_data", return_value=ee_data
+        )
+        return importer
+
+    def test_import_metadata_from_ee(self, importer, django_assert_num_queries):
+        ballot = PostElectionFactory(
+            post__territory="", voting_system=None, requires_voter_id=None
+        )
+        modified = ballot.modified
+
+        # Four to create the voting system, then one UPDATE each for the
+        # ballot and post
+        with django_assert_num_queries(6):
+            ballot_fields, post_fields = importer.import_metadata_from_ee(
+                ballot
+            )
+
+        assert ballot_fields == [
+            "voting_system",
+            "requires_voter_id",
+            "modified",
+        ]
+        assert post_fields == ["territory", "division_type"]
+        ballot.refresh_from_db()
+        assert ballot.voting_system_id == "FPTP"
+        assert ballot.requires_voter_id == "EA-2022"
+        assert ballot.modified > modified
+        assert ballot.post.territory == "ENG"
+        assert ballot.post.division_type == "DIW"
+
+        # Nothing is written when nothing has changed
+        with django_assert_num_queries(0):
+            assert importer.import_metadata_from_ee(ballot) == ([], [])
+
+    def test_save_metadata(self, importer, django_assert_num_queries):
+        ballots = [
+            PostElectionFactory(
+                post__ynr_id=f"post-{n}",
+                post__organization_type="",
+                requires_voter_id=None,
+            )
+            for n in range(3)
+        ]
+        changes = []
+        for ballot in ballots:
+            ballot.post.organization_type = "local-authority"
+            ballot.requires_voter_id = "EA-2022"
+            changes.append(
+                (ballot, ["requires_voter_id"], ["organization_type"])
+            )
+
+        with django_assert_num_queries(2):
+            importer.save_metadata(changes)
+
+        assert (
+            PostElection.objects.filter(requires_voter_id="EA-2022").count()
+            == 3
+        )
+        assert (
+            Post.objects.filter(organization_type="local-authority").count()
+            == 3
+        )
 
 
 class TestYNRPostImporter:
@@ -1,9 +1,11 @@
 import pytest
+from django.core.management import CommandError, call_command
 from elections.management.commands.import_ballots import Command
 from elections.tests.factories import (
     ElectionFactoryLazySlug,
     PostElectionFactory,
 )
+from people.tests.factories import PersonPostFactory
 
 
 class TestPopulateAnyNonByElections:
@@ -56,3 +58,34 @@ class TestPopulateAnyNonByElections:
         cmd.populate_any_non_by_elections_field()
         election.refresh_from_db()
         assert election.any_non_by_elections is True
+
+
+@pytest.mark.django_db
+class TestUpdateCandidateCounts:
+    @pytest.fixture
+    def post_election(self):
+        post_election = PostElectionFactory(
+            ballot_paper_id="local.foo.bar.2021-05-06"
+        )
+        PersonPostFactory(
+            post_election=post_election, election=post_election.election
+        )
+        return post_election
+
+    def test_check_reports_wrong_counts(self, post_election, capsys):
+        with pytest.raises(CommandError):
+            call_command("update_candidate_counts", "--check")
+
+        assert "local.foo.bar.2021-05-06: 0 candidates (actually 1)" in (
+            capsys.readouterr().out
+        )
+        post_election.refresh_from_db()
+        assert post_election.candidate_count == 0
+
+    def test_backfill(self, post_election, capsys):
+        call_command("update_candidate_counts")
+        call_command("update_candidate_counts", "--check")
+
+        assert "All candidate counts are correct" in capsys.readouterr().out
+        post_election.refresh_from_db()
+        assert post_election.candidate_count == 1
@@ -371,6 +371,10 @@ class TestPostElectionModel:
                 person=person,
                 party=PartyFactory(party_id=i),
             )
+        PostElection.objects.filter(
+            pk=post_election.pk
+        ).update_candidate_counts()
+        post_election.refresh_from_db()
         assert post_election.party_ballot_count == "six candidates"
         post_election.election.uses_lists = True
         post_election.election.save()
@@ -380,6 +384,43 @@ class TestPostElectionModel:
             == "six parties or independent candidates"
         )
 
+    @pytest.mark.django_db
+    def test_update_candidate_counts(self):
+        post_election = PostElectionFactory()
+        empty_ballot = PostElectionFactory(post__ynr_id="empty")
+        labour = PartyFactory(party_id="party:53")
+        independent = PartyFactory(party_id="ynmp-party:2")
+        for party, elected in [
+            (labour, True),
+            (labour, False),
+            (PartyFactory(party_id="party:52"), False),
+            (independent, False),
+            (independent, True),
+        ]:
+            PersonPostFactory(
+                post_election=post_election,
+                election=post_election.election,
+                party=party,
+                elected=elected,
+            )
+        ballots = PostElection.objects.filter(
+            pk__in=[post_election.pk, empty_ballot.pk]
+        )
+        assert list(ballots.with_wrong_candidate_counts()) == [post_election]
+
+        ballots.update_candidate_counts()
+
+        post_election.refresh_from_db()
+        assert post_election.candidate_count == 5
+        assert post_election.party_count == 2
+        assert post_election.independent_count == 2
+        assert post_election.elected_count == 2
+        assert post_election.has_winner
+        empty_ballot.refresh_from_db()
+        assert empty_ballot.candidate_count == 0
+        assert not empty_ballot.has_winner
+        assert not ballots.with_wrong_candidate_counts().exists()
+
     @pytest.mark.django_db
     def test_postal_vote_requires_form(self):
         election = ElectionWithPostFactory(
@@ -0,0 +1,53 @@
+from datetime import date
+
+from elections.postal_votes import (
+    get_postal_vote_dispatch_dates,
+    get_replacement_pack_start,
+    has_postal_vote_dispatch_dates,
+    load_dispatch_dates,
+)
+from uk_election_timetables.calendars import Country
+
+MAY_2026 = date(2026, 5, 7)
+
+
+class TestPostalVoteDispatchDates:
+    def test_loads_every_file(self):
+        assert has_postal_vote_dispatch_dates(MAY_2026)
+        assert has_postal_vote_dispatch_dates(date(2025, 5, 1))
+        assert not has_postal_vote_dispatch_dates(date(2024, 5, 2))
+
+    def test_dispatch_dates(self):
+        assert get_postal_vote_dispatch_dates(MAY_2026, "HPL") == (
+            date(2026, 4, 17),
+            date(2026, 4, 20),
+            date(2026, 4, 28),
+        )
+
+    def test_council_without_dates(self):
+        assert get_postal_vote_dispatch_dates(MAY_2026, "CLK") is None
+
+    def test_unknown_council_or_election(self):
+        assert get_postal_vote_dispatch_dates(MAY_2026, "XXX") is None
+        assert get_postal_vote_dispatch_dates(date(2024, 5, 2), "HPL") is None
+
+    def test_only_reads_files_once(self, mocker):
+        load_dispatch_dates.cache_clear()
+        mock_open = mocker.patch("builtins.open", wraps=open)
+
+        get_postal_vote_dispatch_dates(MAY_2026, "HPL")
+        calls = mock_open.call_count
+        get_postal_vote_dispatch_dates(MAY_2026, "HAL")
+
+        assert calls == 2
+        assert mock_open.call_count == calls
+
+    def test_replacement_pack_start(self):
+        assert get_replacement_pack_start(MAY_2026, Country.ENGLAND) == date(
+            2026, 4, 30
+        )
+        assert get_replacement_pack_start(MAY_2026, Country.SCOTLAND) is None
+        assert (
+            get_replacement_pack_start(date(2025, 5, 1), Country.ENGLAND)
+            is None
+        )
@@ -1,12 +1,14 @@
+import threading
 from copy import deepcopy
 
 import pytest
 import vcr
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count
 from django.test import TestCase, override_settings
 from django.urls import reverse
-from elections.devs_dc_client import InvalidPostcodeError
+from elections.devs_dc_client import DEVS_DC_BREAKER, InvalidPostcodeError
 from elections.dummy_models import dummy_polling_station
 from elections.models import PostElection
 from elections.tests.factories import (
@@ -17,7 +19,9 @@ from elections.tests.factories import (
 from elections.views.mixins import PostcodeToPostsMixin
 from elections.views.postcode_view import PostcodeView
 from freezegun import freeze_time
+from hustings.models import Husting, HustingStatus
 from parishes.models import ParishCouncilElection
+from people.tests.factories import PersonPostFactory
 from pytest_django import asserts
 
 TEST_STORAGES_DICT = deepcopy(settings.STORAGES)
@@ -115,7 +119,7 @@ class PostcodeViewTests(TestCase):
         )
         response = self.client.get("/elections/e32nx/", follow=True)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.context["postelections"].count(), 1)
+        self.assertEqual(len(response.context["postelections"]), 1)
         self.assertContains(response, "Tower Hamlets")
 
     @vcr.use_cassette("fixtures/vcr_cassettes/test_mayor_elections.yaml")
@@ -194,9 +198,8 @@ class TestPostcodeViewPolls:
             "registration": {},
         }
         mocker.patch(
-            "requests.get",
+            "core.upstream.upstream_client.get",
             return_value=response,
-            autospec=True,
         )
         return response
 
@@ -223,6 +226,29 @@ class TestPostcodeViewPolls:
             response, "Polling stations are open from 8a.m. till 8p.m. today"
         )
 
+    def test_surrogate_keys(self, mock_response, client, settings):
+        settings.CDN_POSTCODE_CACHE_TTL = 300
+        post_election = PostElectionFactory(
+            ballot_paper_id="local.sheffield.ecclesall.2021-05-06",
+            election__election_date="2021-05-06",
+        )
+        mock_response.json.return_value["dates"].append(
+            {
+                "date": post_election.election.election_date,
+                "polling_station": {"polling_station_known": False},
+                "ballots": [{"ballot_paper_id": post_election.ballot_paper_id}],
+            }
+        )
+
+        response = client.get(
+            reverse("postcode_view", kwargs={"postcode": "s11 8qd"})
+        )
+
+        assert response["Surrogate-Key"] == (
+            "postcode:S118QD ballot:local.sheffield.ecclesall.2021-05-06"
+        )
+        assert "s-maxage=300" in response["Cache-Control"]
+
     def test_not_city_of_london_today(self, mock_response, client):
         post_election = PostElectionFactory(
             ballot_paper_id="local.sheffield.ecclesall.2021-05-06",
@@ -470,6 +496,35 @@ class TestPostcodeViewPolls:
             response, "elections/includes/_single_ballot.html"
         )
 
+    @freeze_time("2021-04-10")
+    def test_devs_dc_unavailable(self, mock_response, client):
+        upcoming = PostElectionFactory(
+            ballot_paper_id="local.sheffield.ecclesall.2021-05-06",
+            election__slug="local.sheffield.2021-05-06",
+            election__election_date="2021-05-06",
+            election__any_non_by_elections=False,
+            post__label="Ecclesall",
+        )
+        DEVS_DC_BREAKER.open()
+
+        response = client.get(
+            reverse("postcode_view", kwargs={"postcode": "s11 8qd"})
+        )
+
+        assert response.status_code == 503
+        assert response["Retry-After"]
+        assert "Surrogate-Key" not in response
+        asserts.assertTemplateUsed(
+            response, "elections/postcode_unavailable.html"
+        )
+        asserts.assertContains(
+            response, "Please try again in a few minutes", status_code=503
+        )
+        asserts.assertContains(
+            response, upcoming.get_absolute_url(), status_code=503
+        )
+        mock_response.json.assert_not_called()
+
     @freeze_time("2021-04-04")
     @pytest.mark.django_db
     def test_no_polling_station_shows_council_details(
@@ -588,6 +643,109 @@ class TestPostcodeViewPolls:
         asserts.assertContains(response, "info@council.com")
 
 
+@pytest.mark.django_db
+class TestPostcodeViewQueries:
+    """
+    The number of queries the postcode page makes shouldn't depend on how
+    many ballots there are for the postcode
+    """
+
+    # Ballots, hustings, news articles, candidates, previous party
+    # affiliations, leaflets and referendums
+    EXPECTED_QUERIES = 7
+
+    @pytest.fixture
+    def mock_response(self, mocker):
+        response = mocker.MagicMock(status_code=200)
+        response.json.return_value = {
+            "address_picker": False,
+            "dates": [],
+            "electoral_services": {"identifiers": ["code"]},
+            "registration": {},
+        }
+        mocker.patch(
+            "core.upstream.upstream_client.get",
+            return_value=response,
+        )
+        return response
+
+    def make_ballots(self, mock_response, num_ballots):
+        ballots = []
+        for i in range(num_ballots):
+            ballot = PostElectionFactory(
+                ballot_paper_id=f"local.sheffield.ward-{i}.2021-05-06",
+                election__slug="local.sheffield.2021-05-06",
+                election__election_date="2021-05-06",
+                post__ynr_id=f"ward-{i}",
+                post__label=f"Ward {i}",
+                post__territory="ENG",
+                locked=True,
+            )
+            PersonPostFactory.create_batch(
+                size=2,
+                post_election=ballot,
+                election=ballot.election,
+                post=ballot.post,
+            )
+            Husting.objects.create(
+                post_election=ballot,
+                title=f"Ward {i} hustings",
+                url="https://example.com",
+                starts="2021-04-20T19:00:00+00:00",
+                status=HustingStatus.published,
+            )
+            ballots.append(ballot)
+        mock_response.json.return_value["dates"].append(
+            {
+                "date": "2021-05-06",
+                "polling_station": {"polling_station_known": False},
+                "ballots": [
+                    {"ballot_paper_id": ballot.ballot_paper_id}
+                    for ballot in ballots
+                ],
+            }
+        )
+        return ballots
+
+    @freeze_time("2021-04-06")
+    @pytest.mark.parametrize("num_ballots", [1, 4])
+    def test_fixed_number_of_queries(
+        self, mock_response, client, django_assert_num_queries, num_ballots
+    ):
+        ballots = self.make_ballots(mock_response, num_ballots)
+        url = reverse("postcode_view", kwargs={"postcode": "s11 8qd"})
+
+        with django_assert_num_queries(self.EXPECTED_QUERIES):
+            response = client.get(url)
+
+        assert response.context["postelections"] == ballots
+        assert response.context["num_ballots"] == num_ballots
+        for ballot in response.context["postelections"]:
+            assert len(ballot.people) == 2
+        asserts.assertContains(response, "two candidates", count=num_ballots)
+        for ballot in ballots:
+            asserts.assertContains(
+                response, f"{ballot.post.label} hustings</a>"
+            )
+
+    @freeze_time("2021-04-06")
+    def test_parish_council_query(
+        self, mock_response, client, django_assert_num_queries
+    ):
+        ballots = self.make_ballots(mock_response, 2)
+        parish_council_election = ParishCouncilElection.objects.create()
+        parish_council_election.ballots.add(ballots[1])
+        url = reverse("postcode_view", kwargs={"postcode": "s11 8qd"})
+
+        with django_assert_num_queries(self.EXPECTED_QUERIES + 1):
+            response = client.get(url)
+
+        assert (
+            response.context["parish_council_election"]
+            == parish_council_election
+        )
+
+
 class TestPostcodeViewMethods:
     @pytest.fixture
     def view_obj(self, rf):
@@ -643,6 +801,64 @@ class TestPostcodeViewMethods:
         view_obj.postcode_to_ballots.assert_not_called()
         assert result == "ballots"
 
+    def test_administrations_lookup_disabled(self, view_obj, settings):
+        settings.ENABLE_LAYERS_OF_STATE_FEATURE = False
+        view_obj.start_administrations_lookup()
+        assert view_obj.administrations_future is None
+        assert view_obj.get_administrations() is None
+
+    def test_administrations_lookup_runs_in_background(
+        self, view_obj, settings, mocker
+    ):
+        settings.ENABLE_LAYERS_OF_STATE_FEATURE = True
+        settings.LAYERS_OF_STATE_DEADLINE = 1
+        started = threading.Event()
+        finish = threading.Event()
+
+        def slow_helper(postcode, uprn=None, timeout=None):
+            started.set()
+            finish.wait(1)
+            return "administrations"
+
+        mocker.patch(
+            "elections.views.postcode_view.AdministrationsHelper",
+            side_effect=slow_helper,
+        )
+        view_obj.postcode = "S118QE"
+        view_obj.start_administrations_lookup()
+
+        # The lookup has started but hasn't been waited for yet
+        assert started.wait(1)
+        finish.set()
+        assert view_obj.get_administrations() == "administrations"
+
+    def test_administrations_lookup_past_deadline(
+        self, view_obj, settings, mocker
+    ):
+        settings.ENABLE_LAYERS_OF_STATE_FEATURE = True
+        settings.LAYERS_OF_STATE_DEADLINE = 0.01
+        finish = threading.Event()
+        mocker.patch(
+            "elections.views.postcode_view.AdministrationsHelper",
+            side_effect=lambda *args, **kwargs: finish.wait(1),
+        )
+        view_obj.postcode = "S118QE"
+        view_obj.start_administrations_lookup()
+
+        assert view_obj.get_administrations() is None
+        finish.set()
+
+    def test_administrations_lookup_error(self, view_obj, settings, mocker):
+        settings.ENABLE_LAYERS_OF_STATE_FEATURE = True
+        mocker.patch(
+            "elections.views.postcode_view.AdministrationsHelper",
+            side_effect=ValueError,
+        )
+        view_obj.postcode = "S118QE"
+        view_obj.start_administrations_lookup()
+
+        assert view_obj.get_administrations() is None
+
     @pytest.mark.django_db
     def test_multiple_london_elections_same_day(self, view_obj, mocker):
         PostElectionFactory(
@@ -788,6 +1004,49 @@ class TestPostcodeViewMethods:
         assert card["application_deadline"] == "21 April 2020"
         assert card["election_date"] == "2020-05-06"
 
+    @freeze_time("2020-01-01")
+    @pytest.mark.django_db
+    def test_global_cards_unknown_territory(self, view_obj):
+        post_elections = [
+            PostElectionFactory(
+                ballot_paper_id="local.croydon.wardname1.2020-05-06",
+                election__slug="local.croydon.2020-05-06",
+                election__election_date="2020-05-06",
+                contested=True,
+                cancelled=False,
+                post__territory="XXX",
+            ),
+        ]
+
+        assert view_obj.get_global_registration_card(post_elections) == {
+            "show": False
+        }
+        assert view_obj.get_global_postal_vote_card(
+            post_elections, council={"council_id": "EXE"}
+        ) == {"show": False}
+
+    @freeze_time("2024-06-01")
+    @pytest.mark.django_db
+    def test_global_cards_unknown_territory_not_local(self, view_obj):
+        post_elections = [
+            PostElectionFactory(
+                ballot_paper_id="parl.croydon-east.2024-07-04",
+                election__slug="parl.2024-07-04",
+                election__election_date="2024-07-04",
+                contested=True,
+                cancelled=False,
+                post__territory="XXX",
+            ),
+        ]
+
+        card = view_obj.get_global_registration_card(post_elections)
+        assert card["show"] is True
+        assert card["registration_deadline"] == "18 June 2024"
+        card = view_obj.get_global_postal_vote_card(
+            post_elections, council={"council_id": "EXE"}
+        )
+        assert card["before_application_deadline"] is True
+
     def test_num_ballots_no_parish_election(self, view_obj, mocker):
         future_post_election = mocker.MagicMock(spec=PostElection, past_date=0)
         past_post_election = mocker.MagicMock(spec=PostElection, past_date=1)
@@ -1011,3 +1270,83 @@ class TestPostcodeiCalView:
             "END:VCALENDAR\n"
         )
         assert content_without_ephemeral_datestamp == expected
+
+    @pytest.fixture
+    def locmem_cache(self, settings):
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "ical-feed-tests",
+            }
+        }
+        cache.clear()
+
+    @pytest.fixture
+    def mock_ballots(self, mocker):
+        ballot = PostElectionFactory(election__election_date="2099-05-07")
+        Husting.objects.create(
+            post_election=ballot,
+            title="Future hustings",
+            starts="2099-05-01T19:00:00Z",
+            status=HustingStatus.published,
+        )
+        Husting.objects.create(
+            post_election=ballot,
+            title="Suggested hustings",
+            starts="2099-05-01T19:00:00Z",
+            status=HustingStatus.suggested,
+        )
+
+        def mock_postcode_to_ballots(postcode, uprn=None):
+            return {
+                "ballots": PostElection.objects.filter(
+                    pk=ballot.pk
+                ).prefetch_related("husting_set"),
+                "polling_station": dummy_polling_station,
+            }
+
+        return mocker.patch.object(
+            PostcodeToPostsMixin,
+            "postcode_to_ballots",
+            side_effect=mock_postcode_to_ballots,
+        )
+
+    @pytest.mark.django_db
+    def test_ical_conditional_get(
+        self, client, locmem_cache, mock_ballots, django_assert_num_queries
+    ):
+        url = reverse("postcode_ical_view", kwargs={"postcode": "TE1 2ST"})
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert "Future hustings" in response.content.decode()
+        assert "Suggested hustings" not in response.content.decode()
+        etag = response["ETag"]
+        assert response["Last-Modified"]
+
+        with django_assert_num_queries(0):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+
+        with django_assert_num_queries(0):
+            response = client.get(url)
+        assert response.status_code == 200
+        mock_ballots.assert_called_once()
+
+    @pytest.mark.django_db
+    def test_ical_changed_husting_invalidates_feed(
+        self, client, locmem_cache, mock_ballots
+    ):
+        url = reverse("postcode_ical_view", kwargs={"postcode": "TE1 2ST"})
+        etag = client.get(url)["ETag"]
+
+        husting = Husting.objects.get(title="Future hustings")
+        husting.title = "Renamed hustings"
+        husting.save()
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert "Renamed hustings" in response.content.decode()
+        assert mock_ballots.call_count == 2
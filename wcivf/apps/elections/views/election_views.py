@@ -1,5 +1,15 @@
+from core.cdn import SurrogateKeyMixin, ballot_key, election_key
+from core.mixins import ConditionalGetMixin
 from django.apps import apps
-from django.db.models import Prefetch
+from django.db.models import (
+    Count,
+    DateTimeField,
+    Max,
+    OuterRef,
+    Prefetch,
+    Subquery,
+)
+from django.db.models.functions import Greatest
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.views.generic import DetailView, RedirectView, TemplateView
@@ -9,6 +19,7 @@ from elections.views.mixins import (
     NewSlugsRedirectMixin,
     PostelectionsToPeopleMixin,
 )
+from hustings.models import Husting
 from parties.models import LocalParty, NationalParty, Party
 from people.models import PersonPost
 
@@ -29,11 +40,28 @@ class ElectionsView(TemplateView):
         return context
 
 
-class ElectionView(NewSlugsRedirectMixin, DetailView):
+class ElectionView(
+    SurrogateKeyMixin, NewSlugsRedirectMixin, ConditionalGetMixin, DetailView
+):
     template_name = "elections/election_view.html"
     model = apps.get_model("elections.Election")
     pk_url_kwarg = "election"
 
+    def get_surrogate_keys(self):
+        return [election_key(self.kwargs[self.pk_url_kwarg])]
+
+    def get_validators(self):
+        validators = self.model.objects.filter(
+            slug=self.kwargs.get(self.pk_url_kwarg)
+        ).aggregate(
+            election_id=Max("pk"),
+            ballot_count=Count("postelection"),
+            last_modified=Max("postelection__modified"),
+        )
+        if validators["election_id"] is None:
+            return None
+        return tuple(validators.values()), validators["last_modified"]
+
     def get_object(self, queryset=None):
         if queryset is None:
             queryset = self.get_queryset()
@@ -73,9 +101,51 @@ class RedirectPostView(RedirectView):
         return url
 
 
-class PostView(NewSlugsRedirectMixin, PostelectionsToPeopleMixin, DetailView):
+class PostView(
+    SurrogateKeyMixin,
+    NewSlugsRedirectMixin,
+    ConditionalGetMixin,
+    PostelectionsToPeopleMixin,
+    DetailView,
+):
     model = apps.get_model("elections.PostElection")
 
+    def get_surrogate_keys(self):
+        return [ballot_key(self.kwargs["election"])]
+
+    def latest_for_ballot(self, model, field):
+        """
+        The latest `field` of the `model` rows for the outer ballot. Each of
+        these is its own subquery, so the related tables aren't joined to
+        each other.
+        """
+        return Subquery(
+            model.objects.filter(post_election=OuterRef("pk"))
+            .order_by()
+            .values("post_election")
+            .annotate(latest=Max(field))
+            .values("latest")
+        )
+
+    def get_validators(self):
+        validators = (
+            self.model.objects.filter(ballot_paper_id=self.kwargs["election"])
+            .annotate(
+                last_modified=Greatest(
+                    "modified",
+                    self.latest_for_ballot(Husting, "modified"),
+                    self.latest_for_ballot(LocalParty, "modified"),
+                    self.latest_for_ballot(PersonPost, "person__last_updated"),
+                    output_field=DateTimeField(),
+                )
+            )
+            .values("people_version", "last_modified")
+            .first()
+        )
+        if validators is None:
+            return None
+        return tuple(validators.values()), validators["last_modified"]
+
     def get_template_names(self):
         """
         Checks if the object is a Referendum
@@ -1,7 +1,9 @@
 import json
-from datetime import date, datetime
+import logging
+from collections import defaultdict
+from datetime import date
 
-from core.utils import LastWord
+from core.single_flight import SingleFlight
 from django.conf import settings
 from django.core.cache import cache
 from django.db.models import Case, Count, F, IntegerField, Prefetch, Value, When
@@ -11,28 +13,41 @@ from django.http import (
     HttpResponsePermanentRedirect,
     HttpResponseRedirect,
 )
+from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.views import View
 from elections.constants import (
     PEOPLE_FOR_BALLOT_KEY_FMT,
+    PEOPLE_FOR_BALLOT_TIMEOUT,
     UPDATED_SLUGS,
 )
 from elections.devs_dc_client import (
+    UNAVAILABLE_ERRORS,
     DevsDCClient,
     InvalidPostcodeError,
     InvalidUprnError,
 )
+from elections.helpers import get_election_timetable
 from hustings.models import Husting
 from leaflets.models import Leaflet
 from parties.models import Manifesto
-from uk_election_timetables.calendars import Country
+from people.models import PersonPost
+from people.snapshots import BallotCandidates, snapshot_candidacies
 from uk_election_timetables.election import TimetableEvent
-from uk_election_timetables.election_ids import from_election_id
 
-from ..postal_votes import get_postal_vote_dispatch_dates
+from ..postal_votes import (
+    get_postal_vote_dispatch_dates,
+    get_replacement_pack_start,
+    has_postal_vote_dispatch_dates,
+)
+
+logger = logging.getLogger(__name__)
 
 DEVS_DC_CLIENT = DevsDCClient()
 
+# Coalesces concurrent requests building the same candidate snapshots
+CANDIDATE_SNAPSHOTS = SingleFlight("candidate_snapshots")
+
 
 class PostcodeToPostsMixin(object):
     def get(self, request, *args, **kwargs):
@@ -44,9 +59,35 @@ class PostcodeToPostsMixin(object):
             )
         except InvalidUprnError:
             raise Http404()
+        except UNAVAILABLE_ERRORS:
+            logger.warning(
+                "DevsDC unavailable for %s", self.postcode, exc_info=True
+            )
+            return self.render_unavailable()
 
         return self.render_to_response(context)
 
+    def render_unavailable(self):
+        """
+        A lightweight page asking the user to try again, used when DevsDC
+        can't be reached and there's no cached copy of the lookup
+        """
+        from ..models import PostElection
+
+        context = {"postcode": self.postcode}
+        if getattr(settings, "SHOW_UPCOMING_ELECTIONS", True):
+            context[
+                "upcoming_elections"
+            ] = PostElection.objects.cached_home_page_upcoming_ballots()
+        response = TemplateResponse(
+            self.request,
+            "elections/postcode_unavailable.html",
+            context,
+            status=503,
+        )
+        response["Retry-After"] = int(settings.DEVS_DC_BREAKER_RESET_TIMEOUT)
+        return response
+
     def split_hubs_by_date(self, hubs, election_date):
         polling_day_hubs = []
         advance_hubs = []
@@ -137,6 +178,7 @@ class PostcodeToPostsMixin(object):
         pes = pes.select_related("election")
         pes = pes.select_related("election__voting_system")
         pes = pes.select_related("referendum")
+        pes = pes.select_related("voting_system")
 
         pes = pes.prefetch_related(
             Prefetch("husting_set", queryset=Husting.objects.published())
@@ -156,22 +198,84 @@ class PostcodeToPostsMixin(object):
 
 
 class PostelectionsToPeopleMixin(object):
-    def people_for_ballot(self, postelection, compact=False):
-        key = PEOPLE_FOR_BALLOT_KEY_FMT.format(
-            postelection.ballot_paper_id, compact
-        )
-        people_for_post = cache.get(key)
-        if people_for_post:
-            return people_for_post
-        people_for_post = postelection.personpost_set.all()
-        people_for_post = people_for_post.annotate(
-            last_name=LastWord("person__name")
+    def people_for_ballot(self, postelection):
+        """
+        Returns the candidates for a ballot as a list of CandidacySnapshot.
+
+        The snapshot is cached against the ballot's `people_version`, which
+        the importers bump whenever the candidates change.
+        """
+        return self.people_for_ballots([postelection])[postelection.pk]
+
+    def people_for_ballots(self, postelections):
+        """
+        Returns a dict of ballot pk to the candidates for that ballot, as
+        returned by `people_for_ballot`.
+
+        Cached snapshots are read in one go, and the candidates for every
+        ballot that isn't cached are fetched together, so the number of
+        queries doesn't depend on the number of ballots. Snapshots another
+        worker is already building are waited for rather than built again.
+        """
+        keys = {
+            PEOPLE_FOR_BALLOT_KEY_FMT.format(
+                f"{postelection.ballot_paper_id}_{postelection.people_version}"
+            ): postelection
+            for postelection in postelections
+        }
+        snapshots = cache.get_many(list(keys))
+        missing = [key for key in keys if key not in snapshots]
+        if missing:
+            snapshots.update(
+                CANDIDATE_SNAPSHOTS.run_many(
+                    missing,
+                    lambda lead_keys: self.cache_candidate_snapshots(
+                        {key: keys[key] for key in lead_keys}
+                    ),
+                )
+            )
+
+        return {
+            postelection.pk: BallotCandidates(snapshots[key])
+            for key, postelection in keys.items()
+        }
+
+    def cache_candidate_snapshots(self, postelections):
+        """
+        Takes a dict of cache key to ballot, and caches and returns a dict of
+        cache key to the snapshot of that ballot's candidates
+        """
+        person_posts = defaultdict(list)
+        for uses_lists in (False, True):
+            ballots = [
+                postelection
+                for postelection in postelections.values()
+                if postelection.election.uses_lists == uses_lists
+            ]
+            if not ballots:
+                continue
+            for person_post in self.people_for_ballots_queryset(
+                ballots, uses_lists
+            ):
+                person_posts[person_post.post_election_id].append(person_post)
+        snapshots = {
+            key: snapshot_candidacies(person_posts[postelection.pk])
+            for key, postelection in postelections.items()
+        }
+        cache.set_many(snapshots, timeout=PEOPLE_FOR_BALLOT_TIMEOUT)
+        return snapshots
+
+    def people_for_ballot_queryset(self, postelection):
+        return self.people_for_ballots_queryset(
+            [postelection], postelection.election.uses_lists
         )
-        people_for_post = people_for_post.annotate(
-            name_for_ordering=Coalesce("person__sort_name", "last_name")
+
+    def people_for_ballots_queryset(self, postelections, uses_lists):
+        people_for_post = PersonPost.objects.filter(
+            post_election__in=postelections
         )
 
-        if postelection.election.uses_lists:
+        if uses_lists:
             # Put independent candidates at the end of the list for elections that use lists
             list_party_sort = Case(
                 When(party__party_id="ynmp-party:2", then=1),
@@ -181,7 +285,9 @@ class PostelectionsToPeopleMixin(object):
             order_by = [list_party_sort, "party_display_name", "list_position"]
 
             manifesto_qs = Manifesto.objects.filter(
-                election_id=postelection.election.pk
+                election_id__in={
+                    postelection.election_id for postelection in postelections
+                }
             )
             people_for_post = people_for_post.prefetch_related(
                 Prefetch(
@@ -196,7 +302,7 @@ class PostelectionsToPeopleMixin(object):
                 )
             )
         else:
-            order_by = ["name_for_ordering", "person__name"]
+            order_by = ["person__name_for_ordering", "person__name"]
 
         people_for_post = people_for_post.order_by(
             F("elected").desc(nulls_last=True),
@@ -205,8 +311,6 @@ class PostelectionsToPeopleMixin(object):
         )
 
         people_for_post = people_for_post.select_related(
-            "post",
-            "election",
             "person",
             "party",
         )
@@ -222,11 +326,21 @@ class PostelectionsToPeopleMixin(object):
                 to_attr="ordered_leaflets",
             )
         )
-        if not compact:
-            people_for_post = people_for_post.prefetch_related(
-                "person__pledges"
-            )
-        cache.set(key, people_for_post)
+        if uses_lists:
+            # Only show each candidate the manifestos for their own election
+            election_ids = {
+                postelection.pk: postelection.election_id
+                for postelection in postelections
+            }
+            people_for_post = list(people_for_post)
+            for person_post in people_for_post:
+                if person_post.party:
+                    person_post.party.manifestos = [
+                        manifesto
+                        for manifesto in person_post.party.manifestos
+                        if manifesto.election_id
+                        == election_ids[person_post.post_election_id]
+                    ]
         return people_for_post
 
 
@@ -247,22 +361,14 @@ class PollingStationInfoMixin(object):
         if not non_city_of_london_ballots:
             return {"show": False}
         next_ballot = non_city_of_london_ballots[0]
-        election = next_ballot.election
-        country = next_ballot.post.territory
-
-        if not country:
-            country = Country.ENGLAND
-        else:
-            country = {
-                "ENG": Country.ENGLAND,
-                "SCT": Country.SCOTLAND,
-                "WLS": Country.WALES,
-                "NIR": Country.NORTHERN_IRELAND,
-            }.get(country)
-        election = from_election_id(election_id=election.slug, country=country)
+        timetable = get_election_timetable(
+            next_ballot.election.slug, next_ballot.post.territory or "ENG"
+        )
+        if timetable is None:
+            return {"show": False}
         event = TimetableEvent.REGISTRATION_DEADLINE
         return {
-            "show": election.is_before(event),
+            "show": timetable.is_before(event),
             "registration_deadline": next_ballot.registration_deadline,
             "election_date": next_ballot.election.election_date,
         }
@@ -271,47 +377,31 @@ class PollingStationInfoMixin(object):
         if not post_elections or all(pe.cancelled for pe in post_elections):
             return {"show": False}
         next_ballot = post_elections[0]
-        election = next_ballot.election
-        country = next_ballot.post.territory
-
-        if not country:
-            country = Country.ENGLAND
-        else:
-            country = {
-                "ENG": Country.ENGLAND,
-                "SCT": Country.SCOTLAND,
-                "WLS": Country.WALES,
-                "NIR": Country.NORTHERN_IRELAND,
-            }.get(country)
-        election = from_election_id(election_id=election.slug, country=country)
+        timetable = get_election_timetable(
+            next_ballot.election.slug, next_ballot.post.territory or "ENG"
+        )
+        if timetable is None:
+            return {"show": False}
         event = TimetableEvent.POSTAL_VOTE_APPLICATION_DEADLINE
 
         card = {
             "show": True,
-            "before_application_deadline": election.is_before(event),
+            "before_application_deadline": timetable.is_before(event),
             "application_deadline": next_ballot.postal_vote_application_deadline,
             "election_date": next_ballot.election.election_date,
             "sopn_date": next_ballot.expected_sopn_date,
             "show_dispatch_date_fallback": False,
         }
 
-        # we only hold postal votes dispatch data data for one
-        # election. TODO: remove/review after 2026-05-07
-        if next_ballot.election.election_date == date(2026, 5, 7):
+        election_date = next_ballot.election.election_date
+        if has_postal_vote_dispatch_dates(election_date):
             card["show_dispatch_date_fallback"] = True
-            # hard-coded for May 2026
-            # this is the date when replacement packs can be issued from
-            # for ALL councils
-            # TODO: add this to the timetable library
-            if country == Country.SCOTLAND:
-                card["replacement_pack_start"] = None
-            else:
-                card["replacement_pack_start"] = datetime.strptime(
-                    "30/04/2026", "%d/%m/%Y"
-                ).date()
+            card["replacement_pack_start"] = get_replacement_pack_start(
+                election_date, timetable.country
+            )
             if council and council["council_id"]:
                 card["dispatch_dates"] = get_postal_vote_dispatch_dates(
-                    council["council_id"]
+                    election_date, council["council_id"]
                 )
 
         return card
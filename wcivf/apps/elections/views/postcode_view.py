@@ -1,18 +1,33 @@
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from administrations.helpers import AdministrationsHelper
-from core.helpers import clean_postcode
+from core.cdn import SurrogateKeyMixin, ballot_key, postcode_key
+from core.helpers import clean_postcode, is_valid_postcode
 from django.conf import settings
+from django.db import close_old_connections
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.generic import TemplateView, View
 from elections.devs_dc_client import InvalidPostcodeError, InvalidUprnError
 from elections.dummy_models import DummyPostElection, dummy_polling_station
+from elections.ical_feeds import (
+    cache_feed,
+    get_cached_feed,
+    ical_feed_cache_key,
+    make_feed,
+)
 from elections.models import LOCAL_TZ
+from hustings.models import HustingStatus
 from icalendar import Calendar, Event, vText
 from parishes.models import ParishCouncilElection
+from referendums.models import Referendum
 
 from .mixins import (
     LogLookUpMixin,
@@ -22,8 +37,26 @@ from .mixins import (
     PostelectionsToPeopleMixin,
 )
 
+logger = logging.getLogger(__name__)
+
+# Runs the layers of state lookups alongside the ballot lookup
+LAYERS_OF_STATE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.UPSTREAM_POOL_MAXSIZE,
+    thread_name_prefix="layers-of-state",
+)
+
+
+def get_administrations_helper(postcode, uprn=None, timeout=None):
+    try:
+        return AdministrationsHelper(postcode, uprn=uprn, timeout=timeout)
+    finally:
+        # This runs outside of the request/response cycle, so tidy up the
+        # database connection this thread used to read administrations
+        close_old_connections()
+
 
 class PostcodeView(
+    SurrogateKeyMixin,
     NewSlugsRedirectMixin,
     PostcodeToPostsMixin,
     PollingStationInfoMixin,
@@ -46,6 +79,20 @@ class PostcodeView(
     postcode = None
     uprn = None
     parish_council_election = None
+    administrations_future = None
+    administrations_deadline = None
+
+    def get_cdn_cache_ttl(self):
+        return settings.CDN_POSTCODE_CACHE_TTL
+
+    def get_surrogate_keys(self):
+        keys = [postcode_key(self.kwargs["postcode"])]
+        if self.ballot_dict and self.ballot_dict.get("ballots"):
+            keys.extend(
+                ballot_key(ballot.ballot_paper_id)
+                for ballot in self.ballot_dict["ballots"]
+            )
+        return keys
 
     def get_ballot_dict(self):
         """
@@ -59,6 +106,65 @@ class PostcodeView(
 
         return self.ballot_dict
 
+    def assemble_ballots(self):
+        """
+        Fetches the ballots for this postcode, and the candidates for all of
+        them, in a fixed number of queries.
+
+        The list replaces the QuerySet in `ballot_dict`, so everything else
+        on the page is worked out from it without querying again.
+        """
+        ballots = list(
+            self.get_ballot_dict()["ballots"].prefetch_related(
+                "ballotnewsarticle_set"
+            )
+        )
+        people = self.people_for_ballots(ballots)
+        for ballot in ballots:
+            ballot.people = people[ballot.pk]
+        self.ballot_dict["ballots"] = ballots
+        return ballots
+
+    def start_administrations_lookup(self):
+        """
+        Starts the layers of state lookups in the background, so they
+        happen while we're waiting for the ballots
+        """
+        if not settings.ENABLE_LAYERS_OF_STATE_FEATURE:
+            return
+        if not self.uprn and not is_valid_postcode(self.postcode):
+            # The ballot lookup will fail without a request to DevsDC
+            return
+        timeout = settings.LAYERS_OF_STATE_DEADLINE
+        self.administrations_deadline = time.monotonic() + timeout
+        self.administrations_future = LAYERS_OF_STATE_EXECUTOR.submit(
+            get_administrations_helper,
+            self.postcode,
+            uprn=self.uprn,
+            timeout=timeout,
+        )
+
+    def get_administrations(self):
+        """
+        Waits for the lookup started by `start_administrations_lookup`
+        until its deadline. Returns None if it wasn't started, failed or ran
+        out of time.
+        """
+        if self.administrations_future is None:
+            return None
+        timeout = max(0, self.administrations_deadline - time.monotonic())
+        try:
+            return self.administrations_future.result(timeout=timeout)
+        except Exception:
+            # Just catch any error at the moment, as we don't want this to
+            # break anything. The page is shown without administrations.
+            logger.warning(
+                "Layers of state lookup failed for %s",
+                self.postcode,
+                exc_info=True,
+            )
+            return None
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         self.postcode = clean_postcode(kwargs["postcode"])
@@ -66,30 +172,23 @@ class PostcodeView(
 
         context["postcode"] = self.postcode
 
+        self.start_administrations_lookup()
         ballot_dict = self.get_ballot_dict()
         context["address_picker"] = ballot_dict.get("address_picker")
         context["addresses"] = ballot_dict.get("addresses")
 
-        if (
-            not context["address_picker"]
-            and settings.ENABLE_LAYERS_OF_STATE_FEATURE
-        ):
-            try:
-                administrations = AdministrationsHelper(
-                    self.postcode, uprn=self.uprn
-                )
+        if not context["address_picker"]:
+            administrations = self.get_administrations()
+            if administrations is not None:
                 context["administrations"] = administrations
                 if administrations.address_picker:
                     context["address_picker"] = True
                     context["addresses"] = administrations.addresses
-            except Exception:
-                # Just catch any error at the moment, as we don't want this to break anything
-                pass
 
         if context["address_picker"]:
             return context
 
-        context["postelections"] = ballot_dict.get("ballots")
+        context["postelections"] = self.assemble_ballots()
 
         had_election = False
         if len(context["postelections"]) > 0:
@@ -106,8 +205,6 @@ class PostcodeView(
             context["postelections"]
         )
         context["people_for_post"] = {}
-        for postelection in context["postelections"]:
-            postelection.people = self.people_for_ballot(postelection)
         context["polling_station"] = self.ballot_dict.get("polling_station")
         context[
             "polling_station_opening_times"
@@ -171,7 +268,7 @@ class PostcodeView(
 
     def get_referendums(self):
         """
-        Yield all referendums associated with the ballots for this postcode.
+        Return all referendums associated with the ballots for this postcode.
         After 6th May return an empty list to avoid displaying unwanted
         information
         """
@@ -181,19 +278,22 @@ class PostcodeView(
         ):
             return []
 
-        for ballot in self.ballot_dict.get("ballots", []):
-            yield from ballot.referendums.all()
+        return Referendum.objects.filter(
+            ballots__in=self.ballot_dict.get("ballots", [])
+        ).distinct()
 
     def get_ballots_for_next_date(self):
-        ballots = (
-            self.get_ballot_dict()
-            .get("ballots")
-            .order_by("election__election_date")
-        )
+        ballots = self.get_ballot_dict().get("ballots")
         if not ballots:
-            return ballots
-        first_ballot_date = ballots[0].election.election_date
-        return ballots.filter(election__election_date=first_ballot_date)
+            return []
+        first_ballot_date = min(
+            ballot.election.election_date for ballot in ballots
+        )
+        return [
+            ballot
+            for ballot in ballots
+            if ballot.election.election_date == first_ballot_date
+        ]
 
     def get_polling_station_opening_times(self):
         ballots = self.get_ballots_for_next_date()
@@ -251,14 +351,16 @@ class PostcodeView(
         if not self.ballot_dict.get("ballots"):
             return None
 
-        ballots_with_parishes = self.ballot_dict.get("ballots").filter(
-            num_parish_councils__gt=0
-        )
+        ballots_with_parishes = [
+            ballot
+            for ballot in self.ballot_dict["ballots"]
+            if ballot.num_parish_councils
+        ]
         if not ballots_with_parishes:
             return None
 
         self.parish_council_election = ParishCouncilElection.objects.filter(
-            ballots__in=self.ballot_dict["ballots"]
+            ballots__in=ballots_with_parishes
         ).first()
         return self.parish_council_election
 
@@ -320,21 +422,44 @@ class PostcodeiCalView(
 ):
     pk_url_kwarg = "postcode"
 
+    # Set to False to never cache feeds
+    cache_feeds = True
+
     def get(self, request, *args, **kwargs):
         postcode = kwargs["postcode"]
         uprn = kwargs.get("uprn")
-        try:
-            self.ballot_dict = self.postcode_to_ballots(
-                postcode=postcode, uprn=uprn
-            )
-        except InvalidPostcodeError:
-            return HttpResponseRedirect(
-                f"/?invalid_postcode=1&postcode={postcode}"
-            )
-        except InvalidUprnError:
-            raise Http404()
+        key = ical_feed_cache_key(postcode, uprn=uprn)
+        feed = get_cached_feed(key) if self.cache_feeds else None
+        if feed is None:
+            try:
+                self.ballot_dict = self.postcode_to_ballots(
+                    postcode=postcode, uprn=uprn
+                )
+            except InvalidPostcodeError:
+                return HttpResponseRedirect(
+                    f"/?invalid_postcode=1&postcode={postcode}"
+                )
+            except InvalidUprnError:
+                raise Http404()
+
+            feed = self.build_feed(postcode, uprn)
+            if self.cache_feeds:
+                cache_feed(key, feed)
+
+        response = HttpResponse(feed["body"], content_type="text/calendar")
+        response["ETag"] = feed["etag"]
+        if feed["last_modified"]:
+            response["Last-Modified"] = http_date(feed["last_modified"])
+        return get_conditional_response(
+            request,
+            etag=feed["etag"],
+            last_modified=feed["last_modified"],
+            response=response,
+        )
 
+    def build_feed(self, postcode, uprn):
         polling_station = self.ballot_dict.get("polling_station")
+        today = timezone.now().date()
 
         cal = Calendar()
         cal["summary"] = "Elections in {}".format(postcode)
@@ -353,12 +478,8 @@ class PostcodeiCalView(
             event["uid"] = f"{postcode}-address-picker"
             event["summary"] = "You may have upcoming elections"
             event.add("dtstamp", timezone.now())
-            PostcodeiCalView.add_local_timestamp(
-                event, "dtstart", timezone.now().date()
-            )
-            PostcodeiCalView.add_local_timestamp(
-                event, "dtend", timezone.now().date()
-            )
+            PostcodeiCalView.add_local_timestamp(event, "dtstart", today)
+            PostcodeiCalView.add_local_timestamp(event, "dtend", today)
             event.add(
                 "DESCRIPTION",
                 (
@@ -369,9 +490,18 @@ class PostcodeiCalView(
                 ),
             )
             cal.add_component(event)
-            return HttpResponse(cal.to_ical(), content_type="text/calendar")
+            return make_feed(
+                cal.to_ical(), postcode, uprn, today, "address-picker"
+            )
 
+        etag_parts = [postcode, uprn, today]
+        modified = []
         for post_election in self.ballot_dict["ballots"]:
+            etag_parts += [
+                post_election.ballot_paper_id,
+                post_election.modified,
+            ]
+            modified.append(post_election.modified)
             if post_election.cancelled:
                 continue
             event = Event()
@@ -408,11 +538,17 @@ class PostcodeiCalView(
                         properties["postcode"],
                     )
                 )
+                etag_parts += [event.get("geo"), event["location"]]
 
             cal.add_component(event)
 
-            # add hustings events if there are any in the future
-            for husting in post_election.husting_set.published().future():
+            # add hustings events if there are any in the future. The
+            # ballots come with their published hustings prefetched.
+            for husting in post_election.husting_set.all():
+                if husting.status != HustingStatus.published or husting.in_past:
+                    continue
+                etag_parts += [husting.pk, husting.modified]
+                modified.append(husting.modified)
                 event = Event()
                 event["uid"] = husting.uuid
                 event["summary"] = husting.title
@@ -427,7 +563,7 @@ class PostcodeiCalView(
                 event.add("DESCRIPTION", f"Find out more at {husting.url}")
                 cal.add_component(event)
 
-        return HttpResponse(cal.to_ical(), content_type="text/calendar")
+        return make_feed(cal.to_ical(), *etag_parts, modified=modified)
 
     @staticmethod
     def add_local_timestamp(event, name, value):
@@ -435,6 +571,8 @@ class PostcodeiCalView(
 
 
 class DummyPostcodeiCalView(PostcodeiCalView):
+    cache_feeds = False
+
     def get(self, request, *args, **kwargs):
         kwargs["postcode"] = "TE1 1ST"
         return super().get(request, *args, **kwargs)
@@ -450,6 +588,9 @@ class DummyPostcodeView(PostcodeView):
     postcode = None
     uprn = None
 
+    def get_surrogate_keys(self):
+        return []
+
     def get(self, request, *args, **kwargs):
         kwargs["postcode"] = self.postcode
         context = self.get_context_data(**kwargs)
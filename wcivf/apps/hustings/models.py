@@ -9,6 +9,7 @@ from django.db import models
 from django.db.models import TextChoices
 from django.urls import reverse
 from django.utils import timezone
+from elections.ical_feeds import purge_ical_feed_cache
 from elections.models import PostElection
 from model_utils.models import TimeStampedModel
 
@@ -75,10 +76,29 @@ class Husting(TimeStampedModel):
     class Meta:
         ordering = ["-starts"]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        purge_ical_feed_cache()
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        purge_ical_feed_cache()
+        return deleted
+
     @property
     def in_past(self):
         return self.starts.date() < timezone.now().date()
 
+    @property
+    def is_displayable(self):
+        """
+        Matches `HustingQueryset.displayable`, for hustings that have already
+        been fetched
+        """
+        if self.status != HustingStatus.published:
+            return False
+        return not self.in_past or bool(self.postevent_url)
+
     @property
     def uuid(self):
         """
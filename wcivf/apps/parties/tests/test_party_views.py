@@ -81,3 +81,23 @@ class PartyViewTests(TestCase):
         self.assertContains(response, "3 candidates")
         x = response.context_data["object"]
         assert len(x.personpost_set.all().counts_by_post()) == 2
+
+    def test_party_view_conditional_get(self):
+        url = f"/parties/{self.party.party_id}/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        PersonPostFactory(
+            post_election=self.pe,
+            party=self.party,
+            election=self.election,
+            post=self.post,
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -1,4 +1,5 @@
-from django.db.models import Q
+from core.mixins import ConditionalGetMixin
+from django.db.models import Count, Max, Q
 from django.views.generic import DetailView, TemplateView
 
 from .filters import PartyRegisterFilter
@@ -29,7 +30,21 @@ class PartiesView(TemplateView):
         return context
 
 
-class PartyView(DetailView):
+class PartyView(ConditionalGetMixin, DetailView):
+    def get_validators(self):
+        """
+        Parties don't have a modified timestamp, so this only changes with
+        the candidates, or after `validator_lifetime`
+        """
+        validators = Party.objects.filter(pk=self.kwargs["pk"]).aggregate(
+            party_id=Max("pk"),
+            candidate_count=Count("personpost"),
+            last_modified=Max("personpost__post_election__modified"),
+        )
+        if validators["party_id"] is None:
+            return None
+        return tuple(validators.values()), None
+
     def get_template_names(self):
         party_id = self.object.party_id
 
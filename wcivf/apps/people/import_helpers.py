@@ -1,8 +1,10 @@
 import sys
 
+from core.cdn import ballot_key, person_key, queue_purge
 from django.conf import settings
 from django.utils.http import urlencode
-from elections.helpers import JsonPaginator
+from elections.helpers import PrefetchingJsonPaginator
+from elections.models import PostElection
 from people.models import Person
 
 
@@ -38,15 +40,30 @@ class YNRPersonImporter:
             yield page
 
     def paginator(self, url):
-        return JsonPaginator(page1=url, stdout=self.stdout)
+        return PrefetchingJsonPaginator(page1=url, stdout=self.stdout)
 
     def delete_deleted_people(self):
         deleted_ynr_pks = []
         for result in self.deleted_people:
             deleted_ynr_pks.append(result["person_pk"])
 
+        ballots = PostElection.objects.filter(
+            personpost__person_id__in=deleted_ynr_pks
+        )
+        queue_purge(
+            [person_key(pk) for pk in deleted_ynr_pks]
+            + [
+                ballot_key(ballot_paper_id)
+                for ballot_paper_id in ballots.values_list(
+                    "ballot_paper_id", flat=True
+                )
+            ]
+        )
+        ballots.bump_people_version()
+        ballot_ids = list(ballots.values_list("pk", flat=True))
         _, deleted_dict = Person.objects.filter(
             ynr_id__in=deleted_ynr_pks
         ).delete()
+        PostElection.objects.filter(pk__in=ballot_ids).update_candidate_counts()
         count = deleted_dict.get("people.Person", 0)
         self.stdout.write(f"Deleted {count} people")
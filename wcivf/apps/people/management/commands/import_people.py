@@ -1,11 +1,13 @@
-import json
 import os
 import shutil
 import tempfile
 from urllib.parse import urlencode
 
 import requests
-from core.helpers import show_data_on_error
+from core.cdn import ballot_key, person_key, queue_purge
+from core.helpers import IDBitmap, show_data_on_error
+from core.json_stream import iter_json_object
+from core.upstream import upstream_client
 from dateutil.parser import parse
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -20,6 +22,10 @@ from wcivf.apps.people.import_helpers import YNRPersonImporter
 
 
 class Command(BaseCommand):
+    # Pages of people can be slow to build upstream, so allow longer than
+    # the default read timeout between chunks
+    DOWNLOAD_READ_TIMEOUT = 60
+
     def add_arguments(self, parser):
         parser.add_argument(
             "--recently-updated",
@@ -83,16 +89,22 @@ class Command(BaseCommand):
         self.calculate_ranks_for_updated_ballots()
 
     def add_to_db(self):
-        self.existing_people = set(Person.objects.values_list("pk", flat=True))
-        self.seen_people = set()
+        self.existing_people = IDBitmap(
+            Person.objects.values_list("pk", flat=True).iterator()
+        )
+        self.seen_people = IDBitmap()
 
         files = [f for f in os.listdir(self.dirpath) if f.endswith(".json")]
         files = sorted(files, key=lambda k: int(k.split("-")[-1].split(".")[0]))
         for file in files:
             self.stdout.write("Importing {}".format(file))
-            with open(os.path.join(self.dirpath, file), "r") as f:
-                results = json.loads(f.read())
-                self.add_people(results)
+            with open(os.path.join(self.dirpath, file), encoding="utf-8") as f:
+                # Read one person at a time, rather than the whole page
+                self.import_people(
+                    person
+                    for key, person in iter_json_object(f, list_key="results")
+                    if key == "results"
+                )
 
         # Calculate ranks after all people have been processed
         self.calculate_ranks_for_updated_ballots()
@@ -105,9 +117,18 @@ class Command(BaseCommand):
         )
         if should_clean_up:
             deleted_ids = self.existing_people.difference(self.seen_people)
+            ballots = PostElection.objects.filter(
+                personpost__person_id__in=deleted_ids
+            )
+            self.queue_cdn_purge(ballots, deleted_ids)
+            ballots.bump_people_version()
+            ballot_ids = list(ballots.values_list("pk", flat=True))
             Person.objects.filter(ynr_id__in=deleted_ids).delete()
+            PostElection.objects.filter(
+                pk__in=ballot_ids
+            ).update_candidate_counts()
 
-    def save_page(self, url, page):
+    def page_path(self, url):
         # get the file name from the page number
         if "cached-api" in url:
             filename = url.split("/")[-1]
@@ -118,11 +139,7 @@ class Command(BaseCommand):
             else:
                 page_number = 1
             filename = "page-{}.json".format(page_number)
-        file_path = os.path.join(self.dirpath, filename)
-
-        # Save the page
-        with open(file_path, "w") as f:
-            f.write(page)
+        return os.path.join(self.dirpath, filename)
 
     def download_pages(self):
         params = {"page_size": "200"}
@@ -140,20 +157,41 @@ class Command(BaseCommand):
 
         while next_page:
             self.stdout.write("Downloading {}".format(next_page))
-            req = requests.get(next_page)
-            req.raise_for_status()
-            page = req.text
-            results = req.json()
-            self.save_page(next_page, page)
-            next_page = results.get("next")
+            file_path = self.page_path(next_page)
+            # Write the page straight to disk, without reading it all in
+            with upstream_client.get(
+                next_page,
+                stream=True,
+                timeout=(
+                    settings.UPSTREAM_CONNECT_TIMEOUT,
+                    self.DOWNLOAD_READ_TIMEOUT,
+                ),
+            ) as req:
+                req.raise_for_status()
+                with open(file_path, "wb") as f:
+                    for chunk in req.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+            next_page = self.next_page_url(file_path)
+
+    def next_page_url(self, file_path):
+        with open(file_path, encoding="utf-8") as f:
+            for key, value in iter_json_object(f, list_key="results"):
+                if key == "next":
+                    return value
+        return None
 
-    @time_function_length
-    @transaction.atomic
     def add_people(self, results):
         self.stdout.write(f"Found {results['count']} people to import")
-        for person in results["results"]:
+        self.import_people(results["results"])
+
+    @time_function_length
+    @transaction.atomic
+    def import_people(self, people):
+        updated_people = []
+        for person in people:
             with show_data_on_error("Person {}".format(person["id"]), person):
                 person_obj = Person.objects.update_or_create_from_ynr(person)
+                updated_people.append(person_obj.pk)
                 self.stdout.write(
                     f"Updated {person_obj.name} ({person_obj.pk})"
                 )
@@ -173,6 +211,30 @@ class Command(BaseCommand):
                 if person["candidacies"]:
                     self.seen_people.add(person_obj.pk)
 
+        # Any ballot these people stand on (before or after this update) may
+        # now have out of date cached candidates. Candidacies deleted above
+        # have already bumped their ballots.
+        ballots = PostElection.objects.filter(
+            personpost__person_id__in=updated_people
+        )
+        self.queue_cdn_purge(ballots, updated_people)
+        ballots.bump_people_version()
+        ballots.update_candidate_counts()
+
+    def queue_cdn_purge(self, ballots, person_ids=()):
+        """
+        Queues the pages for the given ballots and people for purging from
+        the CDN
+        """
+        keys = [person_key(person_id) for person_id in person_ids]
+        keys.extend(
+            ballot_key(ballot_paper_id)
+            for ballot_paper_id in ballots.values_list(
+                "ballot_paper_id", flat=True
+            )
+        )
+        queue_purge(keys)
+
     def delete_old_candidacies(self, person_data, person_obj):
         """
         Delete any candidacies that have been deleted upstream in YNR
@@ -181,9 +243,17 @@ class Command(BaseCommand):
             c["ballot"]["ballot_paper_id"] for c in person_data["candidacies"]
         ]
 
-        count, _ = person_obj.personpost_set.exclude(
+        old_candidacies = person_obj.personpost_set.exclude(
             post_election__ballot_paper_id__in=ballot_paper_ids
-        ).delete()
+        )
+        ballots = PostElection.objects.filter(
+            pk__in=old_candidacies.values("post_election_id")
+        )
+        self.queue_cdn_purge(ballots)
+        ballots.bump_people_version()
+        ballot_ids = list(ballots.values_list("pk", flat=True))
+        count, _ = old_candidacies.delete()
+        PostElection.objects.filter(pk__in=ballot_ids).update_candidate_counts()
         self.stdout.write(f"Deleted {count} candidacies for {person_obj.name}")
 
     def update_candidacies(self, person_data, person_obj):
@@ -297,7 +367,14 @@ class Command(BaseCommand):
                     },
                 )
             url = page.get("next")
+        ballots = PostElection.objects.filter(
+            personpost__person_id__in=merged_ids
+        )
+        self.queue_cdn_purge(ballots, merged_ids)
+        ballots.bump_people_version()
+        ballot_ids = list(ballots.values_list("pk", flat=True))
         Person.objects.filter(ynr_id__in=merged_ids).delete()
+        PostElection.objects.filter(pk__in=ballot_ids).update_candidate_counts()
 
     @time_function_length
     def delete_orphaned_people(self):
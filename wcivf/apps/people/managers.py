@@ -1,3 +1,4 @@
+from core.utils import last_word
 from django.db import models
 from django.db.models import Count
 from django.utils import timezone
@@ -112,7 +113,7 @@ class PersonManager(models.Manager):
 
         sort_name = person.get("sort_name")
         if not sort_name:
-            sort_name = person["name"].strip().split(" ")[-1]
+            sort_name = last_word(person["name"])
 
         defaults = {
             "name": person["name"],
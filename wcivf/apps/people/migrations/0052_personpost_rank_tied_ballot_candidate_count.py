@@ -0,0 +1,51 @@
+# Generated by Django 5.2.15 on 2026-10-18 21:51
+
+from django.db import migrations, models
+from django.db.models import Count, F, Window
+
+
+def set_rank_details(apps, schema_editor):
+    PersonPost = apps.get_model("people", "PersonPost")
+    candidacies = (
+        PersonPost.objects.filter(rank__isnull=False)
+        .annotate(
+            candidates=Window(Count("pk"), partition_by=[F("post_election")]),
+            candidates_with_rank=Window(
+                Count("pk"), partition_by=[F("post_election"), F("rank")]
+            ),
+        )
+        .only("pk")
+    )
+    batch = []
+    for candidacy in candidacies.iterator(chunk_size=1000):
+        candidacy.ballot_candidate_count = candidacy.candidates
+        candidacy.rank_tied = candidacy.candidates_with_rank > 1
+        batch.append(candidacy)
+        if len(batch) == 1000:
+            PersonPost.objects.bulk_update(
+                batch, ["ballot_candidate_count", "rank_tied"]
+            )
+            batch = []
+    PersonPost.objects.bulk_update(
+        batch, ["ballot_candidate_count", "rank_tied"]
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0051_alter_personredirect_old_person_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="personpost",
+            name="ballot_candidate_count",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="personpost",
+            name="rank_tied",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(set_rank_details, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.15 on 2026-10-18 21:54
+
+import core.utils
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Coalesce, NullIf, Trim
+
+
+def set_name_for_ordering(apps, schema_editor):
+    Person = apps.get_model("people", "Person")
+    Person.objects.update(
+        name_for_ordering=Coalesce(
+            NullIf("sort_name", Value("")),
+            core.utils.LastWord(Trim("name")),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0052_personpost_rank_tied_ballot_candidate_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="person",
+            name="name_for_ordering",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="The sort name, or the last word of the name if there isn't one. Set on save.",
+                max_length=255,
+            ),
+        ),
+        migrations.RunPython(set_name_for_ordering, migrations.RunPython.noop),
+    ]
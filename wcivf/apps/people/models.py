@@ -1,5 +1,6 @@
 from urllib.parse import urlparse
 
+from core.utils import last_word
 from django.contrib.humanize.templatetags.humanize import intcomma, ordinal
 from django.db import models
 from django.db.models import JSONField
@@ -43,6 +44,10 @@ class PersonPost(models.Model):
         Party, related_name="affiliated_memberships", blank=True
     )
     rank = models.PositiveIntegerField(null=True)
+    # Stored with `rank` by `PostElection.update_candidate_ranks`, so the
+    # results can be shown without counting the ballot's candidates again
+    rank_tied = models.BooleanField(default=False)
+    ballot_candidate_count = models.PositiveIntegerField(null=True)
     deselected = models.BooleanField(default=False)
     deselected_source = models.CharField(max_length=800, blank=True, null=True)
 
@@ -116,23 +121,12 @@ class PersonPost(models.Model):
 
         """
 
-        if not self.rank:
+        if not self.rank or self.ballot_candidate_count is None:
             return None
 
-        election_info = PersonPost.objects.filter(
-            post_election=self.post_election
-        ).aggregate(
-            candidate_count=models.Count("id"),
-            tie_count=models.Count(
-                "id",
-                filter=models.Q(votes_cast=self.votes_cast, rank=self.rank),
-            ),
-        )
-
-        has_tie = election_info["tie_count"] > 1
-        candidate_count = election_info["candidate_count"]
+        candidate_count = self.ballot_candidate_count
         rank_ordinal = ordinal(self.rank)
-        if has_tie:
+        if self.rank_tied:
             return ngettext(
                 "Joint %(rank)s / %(count)d candidate",
                 "Joint %(rank)s / %(count)d candidates",
@@ -155,6 +149,13 @@ class Person(models.Model):
     twfy_id = models.IntegerField(null=True, blank=True)
     name = models.CharField(blank=True, max_length=255)
     sort_name = models.CharField(null=True, max_length=255)
+    name_for_ordering = models.CharField(
+        blank=True,
+        max_length=255,
+        db_index=True,
+        help_text="The sort name, or the last word of the name if there "
+        "isn't one. Set on save.",
+    )
     email = models.EmailField(null=True)
     gender = models.CharField(blank=True, max_length=255, null=True)
     birth_date = models.CharField(null=True, max_length=255)
@@ -215,6 +216,13 @@ class Person(models.Model):
     def save(self, *args, **kwargs):
         if not self.wikipedia_url:
             self.wikipedia_bio = None
+        self.name_for_ordering = self.sort_name or last_word(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"name", "sort_name"} & set(
+            update_fields
+        ):
+            # e.g. from update_or_create in the importers
+            kwargs["update_fields"] = {*update_fields, "name_for_ordering"}
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
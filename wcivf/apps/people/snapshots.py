@@ -0,0 +1,137 @@
+"""
+Compact, cacheable copies of the candidates standing on a ballot.
+
+Caching a QuerySet of PersonPost objects stores the whole pickled model
+graph, which is large and slow to unpickle. Instead we cache tuples of the
+records below, which only hold what the ballot templates and
+`PersonPostSerializer` use.
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+
+class ManifestoSnapshot(NamedTuple):
+    country: str
+    language: str
+    canonical_url: str
+    pdf_url: Optional[str]
+    easy_read_url: Optional[str]
+
+
+class PartySnapshot(NamedTuple):
+    party_id: str
+    party_name: str
+    emblem_url: Optional[str]
+    is_independent: bool
+    manifestos: Tuple[ManifestoSnapshot, ...] = ()
+
+
+class LeafletSnapshot(NamedTuple):
+    leaflet_id: int
+    thumb_url: Optional[str]
+
+
+class PersonSnapshot(NamedTuple):
+    ynr_id: int
+    name: str
+    email: Optional[str]
+    photo_url: Optional[str]
+    absolute_url: str
+    delisted: bool
+    ordered_leaflets: Tuple[LeafletSnapshot, ...]
+
+    def get_absolute_url(self):
+        return self.absolute_url
+
+
+class CandidacySnapshot(NamedTuple):
+    person: PersonSnapshot
+    party: Optional[PartySnapshot]
+    party_name: str
+    party_display_name: str
+    list_position: Optional[int]
+    elected: Optional[bool]
+    votes_cast: Optional[int]
+    deselected: bool
+    deselected_source: Optional[str]
+    previous_party_affiliations: Tuple[PartySnapshot, ...]
+
+
+class BallotCandidates(list):
+    """
+    The candidates on a ballot, as returned by `people_for_ballot`
+    """
+
+    @property
+    def contains_delisted_person(self):
+        return any(candidacy.person.delisted for candidacy in self)
+
+
+# API responses only ever show this many leaflets per candidate
+MAX_LEAFLETS = 4
+
+
+def snapshot_party(party):
+    if party is None:
+        return None
+    manifestos = tuple(
+        ManifestoSnapshot(
+            country=manifesto.country,
+            language=manifesto.language,
+            canonical_url=manifesto.canonical_url(),
+            pdf_url=manifesto.pdf_url,
+            easy_read_url=manifesto.easy_read_url,
+        )
+        for manifesto in getattr(party, "manifestos", ())
+    )
+    return PartySnapshot(
+        party_id=party.party_id,
+        party_name=party.party_name,
+        emblem_url=party.emblem_url,
+        is_independent=party.is_independent,
+        manifestos=manifestos,
+    )
+
+
+def snapshot_person(person):
+    return PersonSnapshot(
+        ynr_id=person.ynr_id,
+        name=person.name,
+        email=person.email,
+        photo_url=person.photo_url,
+        absolute_url=person.get_absolute_url(),
+        delisted=person.delisted,
+        ordered_leaflets=tuple(
+            LeafletSnapshot(
+                leaflet_id=leaflet.leaflet_id, thumb_url=leaflet.thumb_url
+            )
+            for leaflet in person.ordered_leaflets[:MAX_LEAFLETS]
+        ),
+    )
+
+
+def snapshot_candidacies(person_posts):
+    """
+    Returns a tuple of CandidacySnapshot for a PersonPost QuerySet, which
+    should already have the person, party, leaflets and previous party
+    affiliations selected or prefetched
+    """
+    return tuple(
+        CandidacySnapshot(
+            person=snapshot_person(person_post.person),
+            party=snapshot_party(person_post.party),
+            party_name=person_post.party_name,
+            party_display_name=person_post.party_description_text
+            or person_post.party_name,
+            list_position=person_post.list_position,
+            elected=person_post.elected,
+            votes_cast=person_post.votes_cast,
+            deselected=person_post.deselected,
+            deselected_source=person_post.deselected_source,
+            previous_party_affiliations=tuple(
+                snapshot_party(party)
+                for party in person_post.previous_party_affiliations.all()
+            ),
+        )
+        for person_post in person_posts
+    )
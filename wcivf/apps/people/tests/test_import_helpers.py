@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.db.models import QuerySet
-from elections.helpers import JsonPaginator
+from elections.helpers import PrefetchingJsonPaginator
+from elections.models import PostElection
 from people.import_helpers import YNRPersonImporter
 from people.models import Person
 
@@ -21,7 +22,9 @@ class TestYNRPersonImporter:
 
     def test_paginator(self):
         importer = YNRPersonImporter()
-        assert type(importer.paginator(url="foobar")) is JsonPaginator
+        assert (
+            type(importer.paginator(url="foobar")) is PrefetchingJsonPaginator
+        )
 
     def test_people_to_import(self, mocker):
         importer = YNRPersonImporter()
@@ -69,9 +72,20 @@ class TestYNRPersonImporter:
         mock_qs = mocker.MagicMock(spec=QuerySet)
         mock_qs.delete.return_value = 0, {}
         mocker.patch.object(Person.objects, "filter", return_value=mock_qs)
+        ballots = mocker.patch.object(PostElection.objects, "filter")
+        ballots.return_value.values_list.return_value = ["local.foo.2024-05-02"]
+        queue_purge = mocker.patch("people.import_helpers.queue_purge")
 
         importer = YNRPersonImporter()
         importer.delete_deleted_people()
 
         Person.objects.filter.assert_called_once_with(ynr_id__in=[1, 2, 3])
         mock_qs.delete.assert_called_once()
+        ballots.assert_any_call(personpost__person_id__in=[1, 2, 3])
+        ballots.return_value.bump_people_version.assert_called_once()
+        # Counted again once the people have been deleted
+        ballots.assert_called_with(pk__in=["local.foo.2024-05-02"])
+        ballots.return_value.update_candidate_counts.assert_called_once()
+        queue_purge.assert_called_once_with(
+            ["person:1", "person:2", "person:3", "ballot:local.foo.2024-05-02"]
+        )
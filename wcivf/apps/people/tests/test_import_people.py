@@ -1,8 +1,13 @@
+import json
+from io import BytesIO
+
 import pytest
+import requests
 from elections.models import PostElection
 from parties.models import Party
 from people.management.commands.import_people import Command
 from people.models import Person, PersonPost
+from people.tests.factories import PersonFactory
 
 
 class TestUpdateCandidacies:
@@ -150,3 +155,82 @@ class TestUpdateCandidacies:
             ]
         )
         delete.assert_called_once()
+
+
+@pytest.mark.django_db
+class TestFullImport:
+    @pytest.fixture
+    def command(self, tmp_path, mocker):
+        command = Command(stdout=mocker.MagicMock())
+        command.dirpath = str(tmp_path)
+        command.options = {"recently_updated": False, "since": None}
+        command.updated_ballots = set()
+        pages = [
+            {"next": "people-000002.json", "results": [{"id": 1}]},
+            {"next": None, "results": [{"id": 3}, {"id": 4}]},
+        ]
+        for number, page in enumerate(pages, start=1):
+            (tmp_path / f"people-{number:06d}.json").write_text(
+                json.dumps(page)
+            )
+        return command
+
+    def test_next_page_url(self, command, tmp_path):
+        assert (
+            command.next_page_url(tmp_path / "people-000001.json")
+            == "people-000002.json"
+        )
+        assert command.next_page_url(tmp_path / "people-000002.json") is None
+
+    def test_download_pages(self, command, tmp_path, settings, mocker):
+        settings.YNR_BASE = "https://ynr.example.com"
+        first = tmp_path / "people-000001.json"
+        pages = {
+            "https://ynr.example.com/media/cached-api/latest/people-000001.json": (
+                first.read_bytes()
+            ),
+            "people-000002.json": json.dumps(
+                {"next": None, "results": []}
+            ).encode(),
+        }
+        first.unlink()
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = BytesIO(pages[url])
+            return response
+
+        mock_get = mocker.patch(
+            "people.management.commands.import_people.upstream_client.get",
+            side_effect=get,
+        )
+
+        command.download_pages()
+
+        assert mock_get.call_count == 2
+        for call in mock_get.call_args_list:
+            assert call.kwargs["stream"] is True
+            assert call.kwargs["timeout"] == (
+                settings.UPSTREAM_CONNECT_TIMEOUT,
+                Command.DOWNLOAD_READ_TIMEOUT,
+            )
+        assert json.loads(first.read_text())["results"] == [{"id": 1}]
+
+    def test_add_to_db(self, command, mocker):
+        for ynr_id in (1, 2, 3):
+            PersonFactory(ynr_id=ynr_id)
+        imported = []
+
+        def import_people(people):
+            for person in people:
+                imported.append(person["id"])
+                command.seen_people.add(person["id"])
+
+        mocker.patch.object(command, "import_people", import_people)
+
+        command.add_to_db()
+
+        assert imported == [1, 3, 4]
+        # People that weren't in the import are deleted
+        assert list(Person.objects.values_list("pk", flat=True)) == [1, 3]
@@ -37,6 +37,27 @@ class PersonManagerTests(TestCase):
         person.save()
         assert PersonPost.objects.all().contains_delisted_person() is True
 
+    def test_update_or_create_from_ynr_renamed(self):
+        person = Person.objects.first()
+        person_data = {
+            "id": person.ynr_id,
+            "name": "Joe Renamed",
+            "sort_name": "",
+            "email": "",
+            "gender": "",
+            "birth_date": "",
+            "death_date": "",
+            "last_updated": "2021-01-13T00:00:00Z",
+            "statement_to_voters": "",
+            "identifiers": [],
+            "favourite_biscuit": None,
+        }
+
+        Person.objects.update_or_create_from_ynr(person_data)
+
+        person.refresh_from_db()
+        assert person.name_for_ordering == "Renamed"
+
 
 @pytest.mark.freeze_time("2021-01-13")
 class PersonPostManagerTests(TestCase):
@@ -1,4 +1,5 @@
 from django.test import TestCase
+from people.models import Person
 from people.tests.factories import PersonFactory
 from people.tests.helpers import create_person
 
@@ -292,6 +293,33 @@ class TestPersonModel(TestCase):
         self.person.refresh_from_db()
         self.assertIsNone(self.person.wikipedia_bio)
 
+    def test_save_sets_name_for_ordering(self):
+        self.person.name = "Jane Middle Smith"
+        self.person.sort_name = None
+        self.person.save()
+        self.assertEqual(self.person.name_for_ordering, "Smith")
+
+        self.person.sort_name = "Middle Smith"
+        self.person.save()
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.name_for_ordering, "Middle Smith")
+
+    def test_update_or_create_updates_name_for_ordering(self):
+        self.person.sort_name = None
+        self.person.save()
+
+        Person.objects.update_or_create(
+            ynr_id=self.person.ynr_id, defaults={"name": "Jane Renamed"}
+        )
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.name_for_ordering, "Renamed")
+
+        Person.objects.update_or_create(
+            ynr_id=self.person.ynr_id, defaults={"sort_name": "Other"}
+        )
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.name_for_ordering, "Other")
+
     def test_save_clears_wikipedia_bio_when_url_is_empty_string(self):
         self.person.wikipedia_url = "https://en.wikipedia.org/wiki/Test"
         self.person.wikipedia_bio = "A bio from Wikipedia."
@@ -332,7 +360,8 @@ class TestPersonModel(TestCase):
 
         ballot.update_candidate_ranks()
         candidate3.refresh_from_db()
-        results_rank_str = candidate3.get_results_rank
+        with self.assertNumQueries(0):
+            results_rank_str = candidate3.get_results_rank
         self.assertEqual(results_rank_str, "1st / 3 candidates")
 
     def test_get_results_rank_tied_candidates(self):
@@ -386,6 +386,7 @@ class PersonViewTests(TestCase):
             party=party,
             votes_cast=1000,
             rank=1,
+            ballot_candidate_count=1,
         )
         response = self.client.get(self.person_url, follow=True)
         self.assertTemplateUsed(
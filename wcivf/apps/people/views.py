@@ -1,4 +1,7 @@
-from django.db.models import Count, Prefetch, Q
+from core.cdn import SurrogateKeyMixin, person_key
+from core.mixins import ConditionalGetMixin
+from django.db.models import Count, DateTimeField, Max, Prefetch, Q, Sum
+from django.db.models.functions import Greatest
 from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse
 from django.views.generic import DetailView, RedirectView
@@ -49,9 +52,29 @@ class PersonMixin(object):
         # )[:3]
 
 
-class PersonView(DetailView, PersonMixin):
+class PersonView(
+    SurrogateKeyMixin, ConditionalGetMixin, DetailView, PersonMixin
+):
     model = Person
 
+    def get_surrogate_keys(self):
+        return [person_key(self.kwargs["pk"])]
+
+    def get_validators(self):
+        validators = Person.objects.filter(ynr_id=self.kwargs["pk"]).aggregate(
+            ynr_id=Max("ynr_id"),
+            candidacy_count=Count("personpost"),
+            people_version=Sum("personpost__post_election__people_version"),
+            last_modified=Greatest(
+                Max("last_updated"),
+                Max("personpost__post_election__modified"),
+                output_field=DateTimeField(),
+            ),
+        )
+        if validators["ynr_id"] is None:
+            return None
+        return tuple(validators.values()), validators["last_modified"]
+
     def get(self, request, *args, **kwargs):
         try:
             return super().get(request, *args, **kwargs)
@@ -172,6 +195,12 @@ class PersonView(DetailView, PersonMixin):
 
 
 class DummyPersonView(PersonView):
+    def get_surrogate_keys(self):
+        return []
+
+    def get_validators(self):
+        return None
+
     def get_template_names(self):
         return ["people/person_detail.html"]
 
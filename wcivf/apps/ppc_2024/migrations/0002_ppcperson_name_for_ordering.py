@@ -0,0 +1,42 @@
+# Generated by Django 5.2.15 on 2026-10-18 21:54
+
+import core.utils
+from django.db import migrations, models
+from django.db.models.functions import Trim
+
+
+def set_name_for_ordering(apps, schema_editor):
+    PPCPerson = apps.get_model("ppc_2024", "PPCPerson")
+    PPCPerson.objects.update(
+        name_for_ordering=core.utils.LastWord(Trim("person_name"))
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ppc_2024", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="ppcperson",
+            options={"ordering": ("constituency_name", "name_for_ordering")},
+        ),
+        migrations.AddField(
+            model_name="ppcperson",
+            name="name_for_ordering",
+            field=models.CharField(
+                blank=True,
+                help_text="The last word of the person's name. Set on save.",
+                max_length=255,
+            ),
+        ),
+        migrations.RunPython(set_name_for_ordering, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="ppcperson",
+            index=models.Index(
+                fields=["constituency_name", "name_for_ordering"],
+                name="ppc_2024_pp_constit_7cd081_idx",
+            ),
+        ),
+    ]
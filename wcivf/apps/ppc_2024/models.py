@@ -1,4 +1,4 @@
-from core.utils import LastWord
+from core.utils import last_word
 from django.db import models
 from django.db.models import Count, F
 from parties.models import Party
@@ -71,8 +71,20 @@ class PPCPerson(models.Model):
     constituency_name = models.CharField(max_length=255)
     region_name = models.CharField(max_length=255, blank=True)
     sheet_row = models.JSONField()
+    name_for_ordering = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="The last word of the person's name. Set on save.",
+    )
 
     objects = PPCPersonQuerySet.as_manager()
 
     class Meta:
-        ordering = ("constituency_name", LastWord("person_name"))
+        ordering = ("constituency_name", "name_for_ordering")
+        indexes = [
+            models.Index(fields=["constituency_name", "name_for_ordering"])
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name_for_ordering = last_word(self.person_name)
+        super().save(*args, **kwargs)
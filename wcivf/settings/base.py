@@ -293,6 +293,84 @@ DEVS_DC_BASE = os.environ.get(
     "DEVS_DC_BASE", "https://developers.democracyclub.org.uk"
 )
 DEVS_DC_API_KEY = os.environ.get("DEVS_DC_API_KEY", None)
+# How long (in seconds) a postcode or UPRN lookup is served from the cache
+# before being refreshed, and how long after that a stale copy may still be
+# served while a single worker refreshes it in the background.
+DEVS_DC_CACHE_TTL = int(os.environ.get("DEVS_DC_CACHE_TTL", 60 * 10))
+DEVS_DC_CACHE_STALE_TTL = int(
+    os.environ.get("DEVS_DC_CACHE_STALE_TTL", 60 * 60)
+)
+# A copy of each lookup is kept for DEVS_DC_CACHE_FALLBACK_TTL seconds, and
+# shown once those have passed if DevsDC can't be reached.
+DEVS_DC_CACHE_FALLBACK_TTL = int(
+    os.environ.get("DEVS_DC_CACHE_FALLBACK_TTL", 60 * 60 * 24 * 7)
+)
+# DevsDC lookups fail fast for DEVS_DC_BREAKER_RESET_TIMEOUT seconds once
+# DEVS_DC_BREAKER_FAILURE_RATE of the last DEVS_DC_BREAKER_WINDOW requests
+# (and at least DEVS_DC_BREAKER_MIN_CALLS) have failed or been slower than
+# DEVS_DC_BREAKER_SLOW_CALL_SECONDS. See core.circuit_breaker.
+DEVS_DC_BREAKER_WINDOW = int(os.environ.get("DEVS_DC_BREAKER_WINDOW", 20))
+DEVS_DC_BREAKER_MIN_CALLS = int(os.environ.get("DEVS_DC_BREAKER_MIN_CALLS", 10))
+DEVS_DC_BREAKER_FAILURE_RATE = float(
+    os.environ.get("DEVS_DC_BREAKER_FAILURE_RATE", 0.5)
+)
+DEVS_DC_BREAKER_SLOW_CALL_SECONDS = float(
+    os.environ.get("DEVS_DC_BREAKER_SLOW_CALL_SECONDS", 5)
+)
+DEVS_DC_BREAKER_RESET_TIMEOUT = float(
+    os.environ.get("DEVS_DC_BREAKER_RESET_TIMEOUT", 30)
+)
+# How long (in seconds) to remember that DevsDC said a postcode or UPRN is
+# invalid, so repeated lookups for it don't make a request. 0 turns this off.
+DEVS_DC_INVALID_CACHE_TTL = int(
+    os.environ.get("DEVS_DC_INVALID_CACHE_TTL", 60 * 60)
+)
+# How long (in seconds) a generated iCal feed is served from the cache. Feeds
+# are also discarded whenever ballots or hustings change.
+ICAL_FEED_CACHE_TTL = int(os.environ.get("ICAL_FEED_CACHE_TTL", 60 * 60))
+
+# Cache-Control for pages tagged with surrogate keys (see core.cdn). Ballot,
+# election and person pages are purged from the CDN when they're imported, so
+# can be cached for longer than postcode pages, which aren't. Cookies are part
+# of CloudFront's cache key, so a postcode page served by the CDN is one the
+# same visitor has just looked up, and isn't logged again.
+CDN_CACHE_TTL = int(os.environ.get("CDN_CACHE_TTL", 60 * 60))
+CDN_POSTCODE_CACHE_TTL = int(os.environ.get("CDN_POSTCODE_CACHE_TTL", 60 * 5))
+CDN_BROWSER_CACHE_TTL = int(os.environ.get("CDN_BROWSER_CACHE_TTL", 60))
+CDN_STALE_WHILE_REVALIDATE = int(
+    os.environ.get("CDN_STALE_WHILE_REVALIDATE", 60 * 10)
+)
+# The class `flush_cdn_purge_queue` sends queued purges to
+CDN_PURGER = os.environ.get("CDN_PURGER", "core.cdn.NoOpPurger")
+CLOUDFRONT_DISTRIBUTION_ID = os.environ.get("CLOUDFRONT_DISTRIBUTION_ID")
+
+# Shared HTTP client used for every call to EE, YNR, DevsDC and S3. Timeouts
+# are in seconds. Retries only apply to idempotent requests and are limited
+# per host by a retry budget, so an upstream outage doesn't get amplified.
+UPSTREAM_CONNECT_TIMEOUT = float(
+    os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 3.05)
+)
+UPSTREAM_READ_TIMEOUT = float(os.environ.get("UPSTREAM_READ_TIMEOUT", 10))
+UPSTREAM_MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", 2))
+UPSTREAM_RETRY_BACKOFF = float(os.environ.get("UPSTREAM_RETRY_BACKOFF", 0.2))
+UPSTREAM_POOL_MAXSIZE = int(os.environ.get("UPSTREAM_POOL_MAXSIZE", 10))
+
+# The importers download up to IMPORT_PREFETCH_PAGES pages of results at
+# once while the current page is written to the database. Keep this below
+# UPSTREAM_POOL_MAXSIZE.
+IMPORT_PREFETCH_PAGES = int(os.environ.get("IMPORT_PREFETCH_PAGES", 4))
+
+# When several workers miss the cache for the same postcode lookup or
+# candidate list at once, only one does the work (see core.single_flight).
+# The others wait up to SINGLE_FLIGHT_WAIT_TIMEOUT seconds for its result
+# before doing the work themselves. The lock expires after
+# SINGLE_FLIGHT_LOCK_TIMEOUT seconds in case the worker holding it dies.
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(
+    os.environ.get("SINGLE_FLIGHT_WAIT_TIMEOUT", 3)
+)
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(
+    os.environ.get("SINGLE_FLIGHT_LOCK_TIMEOUT", 30)
+)
 
 WDIV_BASE = "http://wheredoivote.co.uk"
 WDIV_API = "/api/beta"
@@ -364,11 +442,33 @@ if os.environ.get("DC_ENVIRONMENT"):
 LOGGER_ARN = os.environ.get("LOGGER_ARN", None)
 firehose_args = {"function_arn": LOGGER_ARN} if LOGGER_ARN else {"fake": True}
 POSTCODE_LOGGER = DCWidePostcodeLoggingClient(**firehose_args)
+if LOGGER_ARN:
+    # Send log entries in batches from a background thread, so logging never
+    # slows down the postcode page. When the queue is full entries are
+    # dropped, or with POSTCODE_LOGGER_OVERFLOW=spill, written to
+    # POSTCODE_LOGGER_SPILL_DIR. That must be a directory only this user can
+    # access, not a shared one like /tmp. See core.postcode_logging.
+    from core.postcode_logging import BufferedPostcodeLogger
+
+    POSTCODE_LOGGER = BufferedPostcodeLogger(
+        POSTCODE_LOGGER,
+        max_queue_size=int(os.environ.get("POSTCODE_LOGGER_QUEUE_SIZE", 10000)),
+        batch_size=int(os.environ.get("POSTCODE_LOGGER_BATCH_SIZE", 100)),
+        flush_interval=float(
+            os.environ.get("POSTCODE_LOGGER_FLUSH_INTERVAL", 5)
+        ),
+        overflow=os.environ.get("POSTCODE_LOGGER_OVERFLOW", "drop"),
+        spill_dir=os.environ.get("POSTCODE_LOGGER_SPILL_DIR"),
+    )
 
 SHOW_HUSTINGS_CTA = False
 ENABLE_LAYERS_OF_STATE_FEATURE = os.environ.get(
     "ENABLE_LAYERS_OF_STATE_FEATURE", False
 )
+# How long (in seconds) the postcode page will wait for the layers of state
+# lookups, which run alongside the ballot lookup. If they take longer the
+# page is rendered without the administrations panel.
+LAYERS_OF_STATE_DEADLINE = float(os.environ.get("LAYERS_OF_STATE_DEADLINE", 3))
 
 BASIC_AUTH_ALLOWLIST = ["/_status_check/", "/api/*"]
 